@@ -1,8 +1,14 @@
-from fastapi import Depends, HTTPException, status
+import hmac
+from typing import Optional
+
+from fastapi import Depends, Header, HTTPException, status
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
 from supabase import Client
 
+from api.exceptions import AdminTokenRequiredException
 from api.v1.models.user_model import CurrentUserModel
+from core.config import settings
+from core.security import token_verifier
 from core.supabase import get_supabase_client
 
 security = HTTPBearer()
@@ -14,7 +20,8 @@ async def get_current_user(
 ) -> CurrentUserModel:
     """
     Dependency to get the current user from a JWT token.
-    This verifies the JWT provided in the Authorization header against Supabase.
+    The JWT is verified locally against the project signing key, falling back
+    to Supabase Auth only when JWT_REMOTE_FALLBACK is enabled.
     """
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
@@ -26,12 +33,24 @@ async def get_current_user(
         if scheme.lower() != "bearer":
             raise credentials_exception
 
-        user = supabase_client.auth.get_user(token)
+        user = await token_verifier.verify(token, supabase_client)
 
-        if not user or not user.user:
+        if not user:
             raise credentials_exception
 
-        return CurrentUserModel(user=user.user, jwt_token=token)
+        return CurrentUserModel(user=user, jwt_token=token)
 
     except Exception as e:
         raise credentials_exception
+
+
+async def require_admin(x_admin_token: Optional[str] = Header(None)) -> None:
+    """
+    Dependency for the debug endpoints: the request must carry the
+    DEBUG_ADMIN_TOKEN in an X-Admin-Token header. Without a configured token
+    the endpoints are closed to everyone.
+    """
+    if not settings.DEBUG_ADMIN_TOKEN or not x_admin_token:
+        raise AdminTokenRequiredException()
+    if not hmac.compare_digest(x_admin_token.encode(), settings.DEBUG_ADMIN_TOKEN.encode()):
+        raise AdminTokenRequiredException()
@@ -42,4 +42,17 @@ class NewPasswordSameAsOldPasswordException(CustomAPIException):
 
 class NotFoodImageException(CustomAPIException):
     def __init__(self, detail):
-        super().__init__(status_code=status.HTTP_400_BAD_REQUEST, detail=detail)
\ No newline at end of file
+        super().__init__(status_code=status.HTTP_400_BAD_REQUEST, detail=detail)
+
+class AnalysisUnavailableException(CustomAPIException):
+    def __init__(
+        self,
+        detail="Food analysis is temporarily unavailable. Please try again later.",
+        retry_after: int = 30,
+    ):
+        super().__init__(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=detail)
+        self.headers = {"Retry-After": str(retry_after)}
+
+class AdminTokenRequiredException(CustomAPIException):
+    def __init__(self, detail="A valid admin token is required"):
+        super().__init__(status_code=status.HTTP_403_FORBIDDEN, detail=detail)
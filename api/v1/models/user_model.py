@@ -1,6 +1,7 @@
 from pydantic import BaseModel
-from gotrue.types import User
+
+from core.security import AuthenticatedUser
 
 class CurrentUserModel(BaseModel):
-    user: User
+    user: AuthenticatedUser
     jwt_token: str
\ No newline at end of file
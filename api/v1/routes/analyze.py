@@ -1,26 +1,102 @@
-import asyncio
-from typing import Optional
+from typing import Literal, Optional
 
-from fastapi import APIRouter, Depends, File, Form, UploadFile
-from supabase import Client
+from fastapi import APIRouter, Depends, File, Form, HTTPException, Query, UploadFile
+from fastapi.responses import JSONResponse, StreamingResponse
+from supabase import AsyncClient
 
 from api.dependencies import get_current_user
 from api.v1.models.user_model import CurrentUserModel
+from api.v1.schemas.analyze import AnalysisJobResponse, BatchAnalyzeResponse
 from api.v1.schemas.meals import MealResponse
-from api.v1.services.analyze_service import process_food_analysis
-from core.supabase import get_supabase_client
+from api.v1.services.analysis_jobs import analysis_job_queue
+from api.v1.services.analyze_service import (
+    process_food_analysis,
+    process_food_analysis_batch,
+    stream_food_analysis,
+)
+from core.supabase import get_async_supabase_client
 
 router = APIRouter()
 
 
-@router.post("/analyze", response_model=MealResponse)
+@router.post(
+    "/analyze",
+    response_model=MealResponse,
+    responses={202: {"model": AnalysisJobResponse}},
+)
 async def analyze_food(
     current_user: CurrentUserModel = Depends(get_current_user),
-    supabase_client: Client = Depends(get_supabase_client),
+    supabase_client: AsyncClient = Depends(get_async_supabase_client),
     description: Optional[str] = Form(None),
     file: UploadFile = File(...),
+    mode: Literal["sync", "async"] = Query("sync"),
 ):
-    """Endpoint to analyze food image."""
-    return await asyncio.to_thread(
-        process_food_analysis, file, current_user.user, supabase_client, description
+    """
+    Endpoint to analyze food image. With mode=async the analysis is queued and
+    the job is returned with 202 Accepted; poll /analyze/jobs/{job_id} for it.
+    """
+    data = await file.read()
+
+    if mode == "async":
+        job = await analysis_job_queue.submit(
+            data, file.content_type, current_user.user, description
+        )
+        return JSONResponse(
+            status_code=202,
+            content=job.model_dump(),
+            headers={"Location": f"/api/v1/analyze/jobs/{job.id}"},
+        )
+
+    return await process_food_analysis(
+        data, file.content_type, current_user.user, supabase_client, description
+    )
+
+
+@router.get("/analyze/jobs/{job_id}", response_model=AnalysisJobResponse)
+async def get_analysis_job(
+    job_id: str,
+    current_user: CurrentUserModel = Depends(get_current_user),
+):
+    """Endpoint to get the status and result of an async analysis job."""
+    job = await analysis_job_queue.get(job_id, current_user.user)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Analysis job not found.")
+    return job
+
+
+@router.post("/analyze/stream")
+async def analyze_food_stream(
+    current_user: CurrentUserModel = Depends(get_current_user),
+    supabase_client: AsyncClient = Depends(get_async_supabase_client),
+    description: Optional[str] = Form(None),
+    file: UploadFile = File(...),
+):
+    """
+    Endpoint to analyze food image, streaming progress as Server-Sent Events.
+    Events: validated, is_food, component (FoodComponent), meal (MealResponse)
+    and error ({"status_code", "detail"}).
+    """
+    data = await file.read()
+    return StreamingResponse(
+        stream_food_analysis(
+            data, file.content_type, current_user.user, supabase_client, description
+        ),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.post("/analyze/batch", response_model=BatchAnalyzeResponse)
+async def analyze_food_batch(
+    current_user: CurrentUserModel = Depends(get_current_user),
+    supabase_client: AsyncClient = Depends(get_async_supabase_client),
+    descriptions: Optional[list[str]] = Form(None),
+    files: list[UploadFile] = File(...),
+):
+    """
+    Endpoint to analyze several food images at once. descriptions, when given,
+    are matched to files by position.
+    """
+    return await process_food_analysis_batch(
+        files, current_user.user, supabase_client, descriptions
     )
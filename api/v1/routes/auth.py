@@ -1,11 +1,11 @@
 from fastapi import APIRouter, Depends
-from supabase import Client
+from supabase import Client, SupabaseAuthClient
 
 from api.dependencies import get_current_user
 from api.v1.models.user_model import CurrentUserModel
 from api.v1.schemas import auth as auth_schemas
 from api.v1.services import auth_service
-from core.supabase import get_supabase_client
+from core.supabase import get_supabase_auth_client, get_supabase_client
 
 router = APIRouter()
 
@@ -13,20 +13,20 @@ router = APIRouter()
 @router.post("/signup", response_model=auth_schemas.SignupResponse)
 async def signup_email_password(
     user_create: auth_schemas.UserCreate,
-    supabase_client: Client = Depends(get_supabase_client),
+    auth_client: SupabaseAuthClient = Depends(get_supabase_auth_client),
 ):
-    token_data = auth_service.signup_with_email_password(supabase_client, user_create)
+    token_data = auth_service.signup_with_email_password(auth_client, user_create)
     return token_data
 
 
 @router.post("/login", response_model=auth_schemas.LoginResponse)
 async def login_email_password(
     form_data: auth_schemas.UserLogin,
-    supabase_client: Client = Depends(get_supabase_client),
+    auth_client: SupabaseAuthClient = Depends(get_supabase_auth_client),
 ):
 
     token_data = auth_service.login_with_email_password(
-        supabase_client, form_data.email, form_data.password
+        auth_client, form_data.email, form_data.password
     )
     return token_data
 
@@ -34,11 +34,11 @@ async def login_email_password(
 @router.post("/refresh-token", response_model=auth_schemas.LoginResponse)
 async def refresh_token(
     form_data: auth_schemas.UserRefreshToken,
-    supabase_client: Client = Depends(get_supabase_client),
+    auth_client: SupabaseAuthClient = Depends(get_supabase_auth_client),
     current_user: CurrentUserModel = Depends(get_current_user),
 ):
 
-    token_data = auth_service.refresh_token(supabase_client, form_data.refresh_token)
+    token_data = auth_service.refresh_token(auth_client, form_data.refresh_token)
     return token_data
 
 
@@ -56,6 +56,7 @@ async def logout(
 async def change_password(
     from_data: auth_schemas.ChangePasswordRequest,
     supabase_client: Client = Depends(get_supabase_client),
+    auth_client: SupabaseAuthClient = Depends(get_supabase_auth_client),
     current_user: CurrentUserModel = Depends(get_current_user),
 ):
 
@@ -65,6 +66,7 @@ async def change_password(
 
     auth_service.change_password(
         supabase_client,
+        auth_client,
         current_user.user,
         old_password,
         new_password,
@@ -76,7 +78,7 @@ async def change_password(
 @router.post("/forgot-password")
 async def forgot_password(
     form_data: auth_schemas.ForgotPasswordRequest,
-    supabase_client: Client = Depends(get_supabase_client),
+    auth_client: SupabaseAuthClient = Depends(get_supabase_auth_client),
 ):
-    auth_service.forgot_password(supabase_client, form_data.email)
+    auth_service.forgot_password(auth_client, form_data.email)
     return {"message": "Password reset email sent."}
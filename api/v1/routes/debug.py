@@ -0,0 +1,45 @@
+import io
+import pstats
+from typing import Literal
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import FileResponse, PlainTextResponse
+
+from api.dependencies import require_admin
+from core.flight_recorder import flight_recorder
+from core.profiling import profile_store
+
+router = APIRouter(dependencies=[Depends(require_admin)])
+
+
+@router.get("/debug/profiles/{profile_id}")
+async def get_profile(
+    profile_id: str,
+    profile_format: Literal["text", "pstats"] = Query("text", alias="format"),
+    limit: int = Query(50, ge=1, le=1000),
+):
+    """
+    A request profile, as the slowest functions by cumulative time or as the
+    raw pstats file for snakeviz or python -m pstats.
+    """
+    path = profile_store.path(profile_id)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+
+    if profile_format == "pstats":
+        return FileResponse(
+            path, media_type="application/octet-stream", filename=path.name
+        )
+
+    report = io.StringIO()
+    pstats.Stats(str(path), stream=report).sort_stats("cumulative").print_stats(limit)
+    return PlainTextResponse(report.getvalue())
+
+
+@router.get("/debug/slow")
+async def get_slow_requests():
+    """
+    The slowest recent API requests and the latest ones over the threshold,
+    slowest and newest first, with their stage timings and Gemini usage.
+    """
+    return flight_recorder.snapshot()
@@ -1,42 +1,175 @@
-import asyncio
-from typing import Optional
+from typing import Callable, Literal, Optional
 
-from fastapi import APIRouter, Depends
-from supabase import Client
+from fastapi import APIRouter, Depends, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from supabase import AsyncClient, Client
 
 from api.dependencies import get_current_user
 from api.v1.models.user_model import CurrentUserModel
-from api.v1.schemas.meals import ListMealResponse, MealResponse
+from api.v1.schemas.meals import (
+    ListMealResponse,
+    MealResponse,
+    NutritionSummaryResponse,
+)
 from api.v1.services import meals_service
-from core.supabase import get_supabase_client
+from core.profiling import to_thread
+from core.security import AuthenticatedUser
+from core.supabase import get_async_supabase_client, get_supabase_client
+from utils.etag import etag_matches
+from utils.responses import ModelJSONResponse
 
 router = APIRouter()
 
+EXPORT_MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv; charset=utf-8",
+}
+
+
+async def _check_version(
+    request: Request,
+    response: Response,
+    user: AuthenticatedUser,
+    supabase_client: Client,
+) -> tuple[Response | None, int]:
+    """
+    Reads the user's meal version and sets the ETag built from it on the
+    response. Returns a 304 response if the client already has that version,
+    and the version, which the read must use too so the body matches the ETag.
+    Call it once the request parameters are known to be valid.
+    """
+    meal_version = await to_thread(meals_service.get_meal_version, user, supabase_client)
+    etag = meals_service.get_meals_etag(user, meal_version)
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers), meal_version
+
+    response.headers.update(headers)
+    return None, meal_version
+
+
+async def _respond(response: Response, read: Callable, *args) -> ModelJSONResponse:
+    """
+    Runs a meals_service read in a worker thread and renders its model there
+    too, so large listings are neither validated twice nor serialized on the
+    event loop.
+    """
+    return await to_thread(
+        lambda: ModelJSONResponse(read(*args), headers=dict(response.headers))
+    )
+
 
 @router.get("/meals/:id", response_model=MealResponse)
 async def get_meal_by_id(
     id: str,
+    request: Request,
+    response: Response,
     current_user: CurrentUserModel = Depends(get_current_user),
     supabase_client: Client = Depends(get_supabase_client),
 ):
-    return await asyncio.to_thread(
-        meals_service.get_meal_by_id, id, current_user.user, supabase_client
+    not_modified, meal_version = await _check_version(
+        request, response, current_user.user, supabase_client
+    )
+    if not_modified:
+        return not_modified
+
+    return await _respond(
+        response,
+        meals_service.get_meal_by_id,
+        id,
+        current_user.user,
+        supabase_client,
+        meal_version,
     )
 
 
 @router.get("/meals", response_model=ListMealResponse)
 async def get_meals_by_date(
+    request: Request,
+    response: Response,
     date: Optional[str] = None,
     timezone: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=100),
+    cursor: Optional[str] = None,
     current_user: CurrentUserModel = Depends(get_current_user),
     supabase_client: Client = Depends(get_supabase_client),
 ):
+    # Invalid parameters get a 400 even when the client's ETag is current.
+    day = meals_service.parse_day(date, timezone) if date and timezone else None
+    position = meals_service.decode_cursor(cursor) if cursor else None
 
-    if date and timezone:
-        return await asyncio.to_thread(
-            meals_service.get_meals_by_date, date, timezone, current_user.user, supabase_client
+    not_modified, meal_version = await _check_version(
+        request, response, current_user.user, supabase_client
+    )
+    if not_modified:
+        return not_modified
+
+    if day:
+        return await _respond(
+            response,
+            meals_service.get_meals_by_date,
+            day,
+            current_user.user,
+            supabase_client,
+            meal_version,
         )
 
-    return await asyncio.to_thread(
-        meals_service.get_all_meals, current_user.user, supabase_client
+    return await _respond(
+        response,
+        meals_service.get_meals_page,
+        current_user.user,
+        supabase_client,
+        meal_version,
+        limit,
+        position,
+    )
+
+
+@router.get("/meals/summary", response_model=NutritionSummaryResponse)
+async def get_nutrition_summary(
+    request: Request,
+    response: Response,
+    from_date: str = Query(..., alias="from"),
+    to_date: str = Query(..., alias="to"),
+    timezone: str = Query(...),
+    current_user: CurrentUserModel = Depends(get_current_user),
+    supabase_client: Client = Depends(get_supabase_client),
+):
+    """Daily nutrition totals between two local dates, inclusive."""
+    summary_range = meals_service.parse_summary_range(from_date, to_date, timezone)
+
+    not_modified, meal_version = await _check_version(
+        request, response, current_user.user, supabase_client
+    )
+    if not_modified:
+        return not_modified
+
+    return await _respond(
+        response,
+        meals_service.get_nutrition_summary,
+        summary_range,
+        current_user.user,
+        supabase_client,
+        meal_version,
+    )
+
+
+@router.get("/meals/export")
+async def export_meals(
+    export_format: Literal["ndjson", "csv"] = Query("ndjson", alias="format"),
+    current_user: CurrentUserModel = Depends(get_current_user),
+    supabase_client: AsyncClient = Depends(get_async_supabase_client),
+):
+    """Downloads the user's full meal history, newest first, as NDJSON or CSV."""
+    rows = await meals_service.export_meals(
+        export_format, current_user.user, supabase_client
+    )
+    return StreamingResponse(
+        rows,
+        media_type=EXPORT_MEDIA_TYPES[export_format],
+        headers={
+            "Content-Disposition": f'attachment; filename="meals.{export_format}"',
+            "Cache-Control": "no-store",
+        },
     )
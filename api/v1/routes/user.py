@@ -1,11 +1,23 @@
 from fastapi import APIRouter, Depends
+from supabase import Client
 
 from api.dependencies import get_current_user
 from api.v1.models.user_model import CurrentUserModel
+from api.v1.services import auth_service
+from core.profiling import to_thread
+from core.supabase import get_supabase_client
 
 router = APIRouter()
 
 
 @router.get("/me")
-async def read_users_me(current_user: CurrentUserModel = Depends(get_current_user)):
-    return current_user.user
+async def read_users_me(
+    current_user: CurrentUserModel = Depends(get_current_user),
+    supabase_client: Client = Depends(get_supabase_client),
+):
+    return await to_thread(
+        auth_service.get_user,
+        supabase_client,
+        current_user.user,
+        current_user.jwt_token,
+    )
@@ -1,7 +1,9 @@
-from typing import Optional
+from typing import Literal, Optional
 
 from pydantic import BaseModel
 
+from api.v1.schemas.meals import AnalyzedMeal, MealResponse
+
 
 # class AnalyzeResponse(BaseModel):
 #     id: str
@@ -12,3 +14,40 @@ from pydantic import BaseModel
 #     fat: int
 #     fiber: int
 #     sugar: int
+
+
+class FoodVerdict(BaseModel):
+    is_food: bool
+    message: Optional[str] = None
+
+
+# The structured output requested from Gemini: the verdict and the meal fields
+# of MealResponse. Pydantic puts the fields of the last base first, so is_food
+# leads the response and can be streamed before the meal.
+class FoodAnalysis(AnalyzedMeal, FoodVerdict):
+    pass
+
+
+class AnalyzeError(BaseModel):
+    status_code: int
+    detail: str
+
+
+class BatchAnalyzeResult(BaseModel):
+    index: int
+    filename: Optional[str] = None
+    meal: Optional[MealResponse] = None
+    error: Optional[AnalyzeError] = None
+
+
+class BatchAnalyzeResponse(BaseModel):
+    results: list[BatchAnalyzeResult]
+
+
+class AnalysisJobResponse(BaseModel):
+    id: str
+    status: Literal["queued", "running", "succeeded", "failed"]
+    result: Optional[MealResponse] = None
+    error: Optional[AnalyzeError] = None
+    created_at: str
+    updated_at: str
@@ -1,7 +1,11 @@
-from pydantic import BaseModel
+from typing import Optional
 
-class FoodComponent(BaseModel):
-    id: str
+from pydantic import BaseModel, ConfigDict
+
+# The fields Gemini fills in (see FoodAnalysis in schemas/analyze.py); the
+# models below add what the server assigns. Docstrings would end up in the
+# response schema sent to Gemini, hence comments.
+class AnalyzedFoodComponent(BaseModel):
     name_en: str
     name_th: str
     calories: int
@@ -11,20 +15,54 @@ class FoodComponent(BaseModel):
     fiber: int
     sugar: int
 
-class MealResponse(BaseModel):
+
+# With defaults so a non-food answer can omit them.
+class AnalyzedMeal(BaseModel):
+    food_name_en: str = ""
+    food_name_th: str = ""
+    food_components: list[AnalyzedFoodComponent] = []
+    total_calories: int = 0
+    total_protein: int = 0
+    total_carbohydrates: int = 0
+    total_fat: int = 0
+    total_fiber: int = 0
+    total_sugar: int = 0
+
+
+class FoodComponent(AnalyzedFoodComponent):
+    id: str
+
+
+class MealResponse(AnalyzedMeal):
+    # Responses always carry every field, defaults or not.
+    model_config = ConfigDict(json_schema_serialization_defaults_required=True)
+
     id: str
     image_url: str
-    food_name_en: str
-    food_name_th: str
     food_components: list[FoodComponent]
+    created_at: str
+
+
+class ListMealResponse(BaseModel):
+    meals: list[MealResponse]
+    next_cursor: Optional[str] = None
+
+
+class NutritionTotals(BaseModel):
+    meal_count: int
     total_calories: int
     total_protein: int
     total_carbohydrates: int
     total_fat: int
     total_fiber: int
     total_sugar: int
-    created_at: str
 
 
-class ListMealResponse(BaseModel):
-    meals: list[MealResponse]
+class DailyNutritionTotals(NutritionTotals):
+    date: str
+
+
+class NutritionSummaryResponse(BaseModel):
+    timezone: str
+    days: list[DailyNutritionTotals]
+    total: NutritionTotals
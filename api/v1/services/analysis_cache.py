@@ -0,0 +1,197 @@
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from core.config import settings
+from core.logging import logger
+
+# The 64-bit hash is split into bands. Two hashes within a Hamming distance
+# smaller than the number of bands must share at least one identical band, so
+# candidates are found by exact band lookups instead of scanning every entry.
+_BAND_COUNT = 8
+_BAND_BITS = 64 // _BAND_COUNT
+_BAND_MASK = (1 << _BAND_BITS) - 1
+
+CacheKey = tuple[str, int]
+
+
+def normalize_description(description: str | None) -> str:
+    return " ".join(description.lower().split()) if description else ""
+
+
+def _bands(image_hash: int) -> list[tuple[int, int]]:
+    return [
+        (band, (image_hash >> (band * _BAND_BITS)) & _BAND_MASK)
+        for band in range(_BAND_COUNT)
+    ]
+
+
+class AnalysisCache:
+    """
+    Caches Gemini analysis results keyed by the perceptual hash of the image
+    and the normalized description. Lookups match near-duplicate photos within
+    max_distance bits, entries are evicted by LRU and TTL, and the cache can be
+    persisted to a local SQLite file so it survives restarts.
+    """
+
+    def __init__(
+        self,
+        enabled: bool = True,
+        max_size: int = 5000,
+        ttl: float = 7 * 24 * 3600,
+        max_distance: int = 4,
+        sqlite_path: str | None = None,
+    ):
+        if max_distance >= _BAND_COUNT:
+            raise ValueError(f"max_distance must be smaller than {_BAND_COUNT}")
+
+        self.enabled = enabled
+        self.max_size = max_size
+        self.ttl = ttl
+        self.max_distance = max_distance
+        self.sqlite_path = sqlite_path
+
+        self._entries: OrderedDict[CacheKey, tuple[float, str]] = OrderedDict()
+        self._bands: dict[tuple[str, int, int], set[CacheKey]] = {}
+        self._lock = threading.Lock()
+        self._db: sqlite3.Connection | None = None
+
+    def open(self) -> None:
+        """Opens the SQLite file, if configured, and loads the unexpired entries."""
+        if not self.enabled or not self.sqlite_path or self._db is not None:
+            return
+
+        db = sqlite3.connect(self.sqlite_path, check_same_thread=False)
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute(
+            """
+            CREATE TABLE IF NOT EXISTS analysis_cache (
+                description TEXT NOT NULL,
+                image_hash INTEGER NOT NULL,
+                expires_at REAL NOT NULL,
+                result TEXT NOT NULL,
+                PRIMARY KEY (description, image_hash)
+            )
+            """
+        )
+        db.execute("DELETE FROM analysis_cache WHERE expires_at <= ?", (time.time(),))
+        db.commit()
+
+        rows = db.execute(
+            "SELECT description, image_hash, expires_at, result FROM analysis_cache "
+            "ORDER BY expires_at DESC LIMIT ?",
+            (self.max_size,),
+        ).fetchall()
+
+        with self._lock:
+            self._db = db
+            for description, image_hash, expires_at, result in reversed(rows):
+                # SQLite integers are signed; hashes are stored as two's complement.
+                self._insert((description, image_hash & (2**64 - 1)), expires_at, result)
+
+        logger.info(f"Loaded {len(rows)} cached analyses from {self.sqlite_path}")
+
+    def close(self) -> None:
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+            self._db = None
+
+    def get(self, image_hash: int, description: str | None) -> dict | None:
+        """Returns a copy of the cached result for this image, or a near-duplicate of it."""
+        if not self.enabled:
+            return None
+
+        normalized = normalize_description(description)
+        now = time.time()
+
+        with self._lock:
+            key = self._find(normalized, image_hash, now)
+            if key is None:
+                return None
+
+            self._entries.move_to_end(key)
+            result = self._entries[key][1]
+
+        return json.loads(result)
+
+    def put(self, image_hash: int, description: str | None, result: dict) -> None:
+        if not self.enabled:
+            return
+
+        key = (normalize_description(description), image_hash)
+        expires_at = time.time() + self.ttl
+        serialized = json.dumps(result, ensure_ascii=False)
+
+        with self._lock:
+            evicted = self._insert(key, expires_at, serialized)
+
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO analysis_cache VALUES (?, ?, ?, ?)",
+                    (key[0], _to_signed(key[1]), expires_at, serialized),
+                )
+                self._db.executemany(
+                    "DELETE FROM analysis_cache WHERE description = ? AND image_hash = ?",
+                    [(desc, _to_signed(evicted_hash)) for desc, evicted_hash in evicted],
+                )
+                self._db.commit()
+
+    def _find(self, description: str, image_hash: int, now: float) -> CacheKey | None:
+        best: CacheKey | None = None
+        best_distance = self.max_distance + 1
+
+        candidates: set[CacheKey] = set()
+        for band, value in _bands(image_hash):
+            candidates |= self._bands.get((description, band, value), set())
+
+        for key in candidates:
+            distance = (key[1] ^ image_hash).bit_count()
+            if distance < best_distance:
+                if self._entries[key][0] <= now:
+                    continue
+                best, best_distance = key, distance
+
+        return best
+
+    def _insert(self, key: CacheKey, expires_at: float, result: str) -> list[CacheKey]:
+        if key not in self._entries:
+            for band, value in _bands(key[1]):
+                self._bands.setdefault((key[0], band, value), set()).add(key)
+
+        self._entries[key] = (expires_at, result)
+        self._entries.move_to_end(key)
+
+        evicted = []
+        now = time.time()
+        while self._entries:
+            oldest, (oldest_expires_at, _) = next(iter(self._entries.items()))
+            if len(self._entries) <= self.max_size and oldest_expires_at > now:
+                break
+            self._remove(oldest)
+            evicted.append(oldest)
+        return evicted
+
+    def _remove(self, key: CacheKey) -> None:
+        del self._entries[key]
+        for band, value in _bands(key[1]):
+            band_keys = self._bands.get((key[0], band, value))
+            if band_keys is not None:
+                band_keys.discard(key)
+                if not band_keys:
+                    del self._bands[(key[0], band, value)]
+
+
+def _to_signed(value: int) -> int:
+    return value - 2**64 if value >= 2**63 else value
+
+
+analysis_cache = AnalysisCache(
+    enabled=settings.ANALYSIS_CACHE_ENABLED,
+    max_size=settings.ANALYSIS_CACHE_MAX_SIZE,
+    ttl=settings.ANALYSIS_CACHE_TTL,
+    max_distance=settings.ANALYSIS_CACHE_MAX_DISTANCE,
+    sqlite_path=settings.ANALYSIS_CACHE_SQLITE_PATH,
+)
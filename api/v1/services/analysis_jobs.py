@@ -0,0 +1,363 @@
+import asyncio
+import os
+import socket
+import sqlite3
+import threading
+from datetime import datetime, timedelta
+from typing import Optional
+from uuid import uuid4
+
+from fastapi import HTTPException
+from pytz import timezone
+
+from api.v1.schemas.analyze import AnalysisJobResponse, AnalyzeError
+from api.v1.schemas.meals import MealResponse
+from api.v1.services.analyze_service import process_food_analysis, to_analyze_error
+from core.config import settings
+from core.logging import logger
+from core.security import AuthenticatedUser
+from core.supabase import get_async_supabase_client
+
+
+def _now() -> str:
+    return datetime.now(timezone("UTC")).isoformat()
+
+
+def _ago(seconds: float) -> str:
+    return (datetime.now(timezone("UTC")) - timedelta(seconds=seconds)).isoformat()
+
+
+class AnalysisJobQueue:
+    """
+    Runs /analyze?mode=async jobs on a pool of in-process workers. Every job is
+    journaled in a local SQLite file together with its image, so queued and
+    interrupted jobs are picked up again after a restart. Each job runs
+    process_food_analysis exactly like a synchronous request.
+
+    Several processes may share the journal. A worker only runs a job after
+    claiming it with a conditional UPDATE, and renews the lease on its running
+    jobs while they run; running jobs whose lease has expired, because their
+    process died, are requeued. A job's owner is the process that submitted
+    or last claimed it.
+    """
+
+    def __init__(
+        self,
+        db_path: str = "analysis_jobs.db",
+        workers: int = 4,
+        max_queue_depth: int = 100,
+        retention: float = 24 * 3600,
+        lease: float = 300,
+    ):
+        self.db_path = db_path
+        self.workers = workers
+        self.max_queue_depth = max_queue_depth
+        self.retention = retention
+        self.lease = lease
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid4().hex[:8]}"
+
+        self._db: sqlite3.Connection | None = None
+        self._db_lock = threading.Lock()
+        self._queue: asyncio.Queue[str] | None = None
+        self._worker_tasks: list[asyncio.Task] = []
+        self._lease_task: asyncio.Task | None = None
+
+    async def start(self) -> None:
+        """
+        Opens the journal, requeues queued jobs and running jobs whose lease
+        has expired, and starts the workers.
+        """
+        if self._queue is not None:
+            return
+
+        pending = await asyncio.to_thread(self._open)
+
+        self._queue = asyncio.Queue()
+        for job_id in pending:
+            self._queue.put_nowait(job_id)
+
+        self._worker_tasks = [
+            asyncio.create_task(self._worker(), name=f"analysis-job-worker-{index}")
+            for index in range(self.workers)
+        ]
+        self._lease_task = asyncio.create_task(
+            self._renew_leases(), name="analysis-job-leases"
+        )
+
+        if pending:
+            logger.info(f"Requeued {len(pending)} unfinished analysis jobs")
+
+    async def stop(self) -> None:
+        """
+        Stops the workers and puts the jobs they were running back in the
+        queue, for the next start or another process to pick up.
+        """
+        tasks = [*self._worker_tasks, *([self._lease_task] if self._lease_task else [])]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._worker_tasks = []
+        self._lease_task = None
+        self._queue = None
+
+        await asyncio.to_thread(
+            self._execute,
+            "UPDATE analysis_jobs SET status = 'queued', updated_at = ? "
+            "WHERE owner = ? AND status = 'running'",
+            (_now(), self.owner),
+        )
+
+        with self._db_lock:
+            if self._db is not None:
+                self._db.close()
+            self._db = None
+
+    async def submit(
+        self,
+        data: bytes,
+        content_type: Optional[str],
+        user: AuthenticatedUser,
+        description: Optional[str] = None,
+    ) -> AnalysisJobResponse:
+        if self._queue is None:
+            raise HTTPException(status_code=503, detail="Analysis job queue is not running.")
+
+        if self._queue.qsize() >= self.max_queue_depth:
+            raise HTTPException(
+                status_code=503,
+                detail="Too many analysis jobs are queued. Please try again later.",
+                headers={"Retry-After": "30"},
+            )
+
+        job_id = str(uuid4())
+        created_at = _now()
+
+        await asyncio.to_thread(
+            self._execute,
+            "INSERT INTO analysis_jobs (id, user_id, user_json, status, description, "
+            "content_type, image, created_at, updated_at, owner) "
+            "VALUES (?, ?, ?, 'queued', ?, ?, ?, ?, ?, ?)",
+            (
+                job_id,
+                user.id,
+                user.model_dump_json(),
+                description,
+                content_type,
+                data,
+                created_at,
+                created_at,
+                self.owner,
+            ),
+        )
+        self._queue.put_nowait(job_id)
+
+        return AnalysisJobResponse(
+            id=job_id, status="queued", created_at=created_at, updated_at=created_at
+        )
+
+    async def get(
+        self, job_id: str, user: AuthenticatedUser
+    ) -> AnalysisJobResponse | None:
+        """Returns the job if it exists and belongs to the user."""
+        row = await asyncio.to_thread(
+            self._fetch_one,
+            "SELECT id, status, result, error, created_at, updated_at "
+            "FROM analysis_jobs WHERE id = ? AND user_id = ?",
+            (job_id, user.id),
+        )
+        if row is None:
+            return None
+
+        job_id, status, result, error, created_at, updated_at = row
+        return AnalysisJobResponse(
+            id=job_id,
+            status=status,
+            result=MealResponse.model_validate_json(result) if result else None,
+            error=AnalyzeError.model_validate_json(error) if error else None,
+            created_at=created_at,
+            updated_at=updated_at,
+        )
+
+    async def _worker(self) -> None:
+        assert self._queue is not None
+        while True:
+            job_id = await self._queue.get()
+            try:
+                await self._run(job_id)
+            except Exception as e:
+                logger.error(f"Analysis job {job_id} could not be processed: {e}")
+            finally:
+                self._queue.task_done()
+
+    async def _renew_leases(self) -> None:
+        """
+        Keeps the lease on this process's running jobs, and requeues the jobs
+        of other processes whose lease has expired.
+        """
+        assert self._queue is not None
+        while True:
+            await asyncio.sleep(self.lease / 3)
+            try:
+                await asyncio.to_thread(
+                    self._execute,
+                    "UPDATE analysis_jobs SET updated_at = ? "
+                    "WHERE owner = ? AND status = 'running'",
+                    (_now(), self.owner),
+                )
+                requeued = await asyncio.to_thread(self._requeue_stale)
+            except Exception as e:
+                logger.error(f"Failed to renew analysis job leases: {e}")
+                continue
+
+            for job_id in requeued:
+                self._queue.put_nowait(job_id)
+            if requeued:
+                logger.warning(f"Requeued {len(requeued)} analysis jobs with expired leases")
+
+    async def _run(self, job_id: str) -> None:
+        # Another worker, possibly in another process, may have claimed the job
+        # already; only the one whose UPDATE changes the row runs it.
+        claimed = await asyncio.to_thread(
+            self._execute,
+            "UPDATE analysis_jobs SET status = 'running', owner = ?, updated_at = ? "
+            "WHERE id = ? AND status = 'queued'",
+            (self.owner, _now(), job_id),
+        )
+        if claimed != 1:
+            return
+
+        row = await asyncio.to_thread(
+            self._fetch_one,
+            "SELECT user_json, description, content_type, image "
+            "FROM analysis_jobs WHERE id = ?",
+            (job_id,),
+        )
+        if row is None:
+            return
+
+        user_json, description, content_type, image = row
+
+        try:
+            meal = await process_food_analysis(
+                image,
+                content_type,
+                AuthenticatedUser.model_validate_json(user_json),
+                await get_async_supabase_client(),
+                description,
+            )
+        except Exception as e:
+            await asyncio.to_thread(
+                self._finish, job_id, "failed", None, to_analyze_error(e).model_dump_json()
+            )
+        else:
+            await asyncio.to_thread(
+                self._finish, job_id, "succeeded", meal.model_dump_json(), None
+            )
+
+    def _open(self) -> list[str]:
+        db = sqlite3.connect(self.db_path, check_same_thread=False)
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute(
+            """
+            CREATE TABLE IF NOT EXISTS analysis_jobs (
+                id TEXT PRIMARY KEY,
+                user_id TEXT NOT NULL,
+                user_json TEXT NOT NULL,
+                status TEXT NOT NULL,
+                description TEXT,
+                content_type TEXT,
+                image BLOB,
+                result TEXT,
+                error TEXT,
+                created_at TEXT NOT NULL,
+                updated_at TEXT NOT NULL,
+                owner TEXT NOT NULL
+            )
+            """
+        )
+        db.execute(
+            "CREATE INDEX IF NOT EXISTS idx_analysis_jobs_status "
+            "ON analysis_jobs (status, created_at)"
+        )
+        db.commit()
+
+        with self._db_lock:
+            self._db = db
+
+        self._purge_finished()
+        self._requeue_stale()
+        rows = self._fetch_all(
+            "SELECT id FROM analysis_jobs WHERE status = 'queued' ORDER BY created_at",
+            (),
+        )
+        return [job_id for (job_id,) in rows]
+
+    def _requeue_stale(self) -> list[str]:
+        """Requeues the running jobs whose lease has expired and returns them."""
+        cutoff = _ago(self.lease)
+        rows = self._fetch_all(
+            "SELECT id FROM analysis_jobs WHERE status = 'running' AND updated_at < ? "
+            "ORDER BY created_at",
+            (cutoff,),
+        )
+
+        requeued = []
+        for (job_id,) in rows:
+            # The lease may have been renewed since the SELECT.
+            if self._execute(
+                "UPDATE analysis_jobs SET status = 'queued', updated_at = ? "
+                "WHERE id = ? AND status = 'running' AND updated_at < ?",
+                (_now(), job_id, cutoff),
+            ):
+                requeued.append(job_id)
+        return requeued
+
+    def _finish(
+        self, job_id: str, status: str, result: str | None, error: str | None
+    ) -> None:
+        # The image is only needed until the job has run. A job that was
+        # requeued after its lease expired belongs to whoever claimed it next.
+        self._execute(
+            "UPDATE analysis_jobs SET status = ?, result = ?, error = ?, image = NULL, "
+            "updated_at = ? WHERE id = ? AND owner = ? AND status = 'running'",
+            (status, result, error, _now(), job_id, self.owner),
+        )
+        self._purge_finished()
+
+    def _purge_finished(self) -> None:
+        cutoff = _ago(self.retention)
+        self._execute(
+            "DELETE FROM analysis_jobs "
+            "WHERE status IN ('succeeded', 'failed') AND updated_at < ?",
+            (cutoff,),
+        )
+
+    def _execute(self, sql: str, params: tuple) -> int:
+        """Runs a statement and returns the number of rows it changed."""
+        with self._db_lock:
+            if self._db is None:
+                raise RuntimeError("Analysis job journal is closed.")
+            rowcount = self._db.execute(sql, params).rowcount
+            self._db.commit()
+            return rowcount
+
+    def _fetch_one(self, sql: str, params: tuple) -> tuple | None:
+        with self._db_lock:
+            if self._db is None:
+                raise RuntimeError("Analysis job journal is closed.")
+            return self._db.execute(sql, params).fetchone()
+
+    def _fetch_all(self, sql: str, params: tuple) -> list[tuple]:
+        with self._db_lock:
+            if self._db is None:
+                raise RuntimeError("Analysis job journal is closed.")
+            return self._db.execute(sql, params).fetchall()
+
+
+analysis_job_queue = AnalysisJobQueue(
+    db_path=settings.ANALYSIS_JOB_DB_PATH,
+    workers=settings.ANALYSIS_JOB_WORKERS,
+    max_queue_depth=settings.ANALYSIS_JOB_MAX_QUEUE_DEPTH,
+    retention=settings.ANALYSIS_JOB_RETENTION,
+    lease=settings.ANALYSIS_JOB_LEASE,
+)
@@ -1,163 +1,649 @@
-import json
+import asyncio
+import hashlib
+import time
+from contextlib import asynccontextmanager, contextmanager
+from dataclasses import dataclass
 from datetime import datetime
-from typing import Optional
+from typing import AsyncIterator, Callable, Coroutine, Iterator, Optional
 from uuid import uuid4
 
 from fastapi import HTTPException, UploadFile
-from gotrue.types import User
 from pytz import timezone
-from supabase import Client
+from supabase import AsyncClient
 
-from api.exceptions import NotFoodImageException
+from api.exceptions import AnalysisUnavailableException, NotFoodImageException
+from api.v1.schemas.analyze import (
+    AnalyzeError,
+    BatchAnalyzeResponse,
+    BatchAnalyzeResult,
+    FoodAnalysis,
+)
+from api.v1.services.analysis_cache import analysis_cache, normalize_description
 from api.v1.schemas.meals import FoodComponent, MealResponse
-from api.v1.services.gemini_service import analyze_image
-from utils.image_utils import (
-    cleanup_temp_file,
-    isImage,
-    reduce_image_size,
-    save_temp_file,
+from api.v1.services.gemini_service import analyze_image, analyze_image_stream
+from api.v1.services.meal_cache import meal_cache
+from core.config import settings
+from core.flight_recorder import record_image, record_stage, set_outcome
+from core.logging import logger
+from core.metrics import (
+    ANALYSES_IN_FLIGHT,
+    ANALYSIS_CACHE_LOOKUPS,
+    ANALYZE_STAGE_SECONDS,
+    NON_FOOD_REJECTIONS,
 )
+from core.process_pool import run_cpu_bound
+from core.profiling import to_thread
+from core.security import AuthenticatedUser
+from utils.image_utils import ImagePayload, load_image
+from utils.sse import format_sse
+
+BUCKET_NAME = "user-images"
+
+_analysis_semaphore = asyncio.Semaphore(settings.ANALYZE_MAX_CONCURRENCY)
+
+
+@dataclass
+class _Flight:
+    task: asyncio.Task
+    waiters: int = 0
+
+
+FlightKey = tuple[str, str, str]
+
+# Analyses in progress, keyed by user, image content and description, so that
+# identical concurrent uploads share one Gemini call and one stored meal,
+# whether they were sent to /analyze or /analyze/stream.
+_in_flight: dict[FlightKey, _Flight] = {}
+
+
+def _flight_key(
+    data: bytes, user: AuthenticatedUser, description: Optional[str]
+) -> FlightKey:
+    return (
+        str(user.id),
+        hashlib.blake2b(data, digest_size=16).hexdigest(),
+        normalize_description(description),
+    )
+
+
+def _start_flight(
+    key: FlightKey, analysis: Coroutine[None, None, MealResponse]
+) -> _Flight:
+    flight = _Flight(asyncio.create_task(analysis))
+    _in_flight[key] = flight
+    flight.task.add_done_callback(
+        lambda _: _in_flight.pop(key) if _in_flight.get(key) is flight else None
+    )
+    return flight
+
+
+@asynccontextmanager
+async def _waiting_for(flight: _Flight) -> AsyncIterator[None]:
+    flight.waiters += 1
+    try:
+        yield
+    finally:
+        flight.waiters -= 1
+        # Only give up on the analysis once every caller waiting for it has.
+        if flight.waiters == 0 and not flight.task.done():
+            flight.task.cancel()
 
 
-def process_food_analysis(
-    file: UploadFile,
-    user: User,
-    supabase_client: Client,
+async def process_food_analysis(
+    data: bytes,
+    content_type: Optional[str],
+    user: AuthenticatedUser,
+    supabase_client: AsyncClient,
     description: Optional[str] = None,
 ) -> MealResponse:
-    """Handles image processing, analysis, and database storage."""
+    """
+    Handles image processing, analysis, and database storage. A request for
+    the same image and description as one already in progress for this user
+    waits for that analysis and returns its meal.
+    """
+    key = _flight_key(data, user, description)
+    flight = _in_flight.get(key)
+    if flight is None:
+        flight = _start_flight(
+            key,
+            _process_food_analysis(data, content_type, user, supabase_client, description),
+        )
+    else:
+        logger.info(f"Joining in-flight analysis for user {user.id}")
+
+    async with _waiting_for(flight):
+        return await asyncio.shield(flight.task)
+
+
+async def _process_food_analysis(
+    data: bytes,
+    content_type: Optional[str],
+    user: AuthenticatedUser,
+    supabase_client: AsyncClient,
+    description: Optional[str] = None,
+) -> MealResponse:
+    async with _analysis_slot():
+        image = await _load_image(data, content_type)
+
+        try:
+            return await _analyze_and_store(image, user, supabase_client, description)
+
+        except NotFoodImageException as e:
+            raise NotFoodImageException(
+                detail=e.detail,
+            )
+        except AnalysisUnavailableException:
+            raise
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=str(e))
+
 
-    image_type = isImage(file)
-    if not image_type:
+async def process_food_analysis_batch(
+    files: list[UploadFile],
+    user: AuthenticatedUser,
+    supabase_client: AsyncClient,
+    descriptions: Optional[list[str]] = None,
+) -> BatchAnalyzeResponse:
+    """
+    Analyzes several images concurrently and saves every meal with a single
+    RPC call. Each image gets its own result or error, so one bad image does
+    not fail the batch.
+    """
+    if len(files) > settings.ANALYZE_BATCH_MAX_FILES:
         raise HTTPException(
             status_code=400,
-            detail="Invalid image file. Please upload a valid image (JPG, PNG).",
+            detail=(
+                f"Too many files. Upload at most "
+                f"{settings.ANALYZE_BATCH_MAX_FILES} images per batch."
+            ),
         )
 
-    temp_file_path = save_temp_file(file, image_type)
+    descriptions = descriptions or []
+    item_descriptions = [
+        (descriptions[index] or None) if index < len(descriptions) else None
+        for index in range(len(files))
+    ]
 
-    try:
-        response_dict = _analyze_image_and_parse_response(
-            temp_file_path, image_type, description
-        )
+    # Validate everything up front, before any Gemini call is made.
+    uploads = [(await file.read(), file.content_type) for file in files]
+    images = await asyncio.gather(
+        *(_load_image(data, content_type) for data, content_type in uploads),
+        return_exceptions=True,
+    )
+    del uploads
 
-        if response_dict.get("is_food", False):
-            for component in response_dict.get("food_components", []):
-                uuid4_str = str(uuid4())
-                component["id"] = uuid4_str
+    batch_limit = asyncio.Semaphore(settings.ANALYZE_BATCH_MAX_CONCURRENCY)
 
-            public_url, data_id, created_at = _store_image_and_metadata(
-                temp_file_path, image_type, user, supabase_client, response_dict
+    async def analyze(image: ImagePayload, description: Optional[str]):
+        async with batch_limit, _analysis_slot():
+            return await _analyze_and_upload(image, user, supabase_client, description)
+
+    pending = {
+        index: analyze(image, item_descriptions[index])
+        for index, image in enumerate(images)
+        if not isinstance(image, BaseException)
+    }
+    analyzed = dict(
+        zip(pending, await asyncio.gather(*pending.values(), return_exceptions=True))
+    )
+    outcomes: list = [analyzed.get(index, image) for index, image in enumerate(images)]
+
+    created_at = datetime.now(timezone("UTC")).isoformat()
+    meals: dict[int, MealResponse] = {}
+    rpc_rows = []
+    stored_filenames = []
+
+    for index, outcome in enumerate(outcomes):
+        if isinstance(outcome, BaseException):
+            continue
+
+        analysis, unique_filename, public_url = outcome
+        food_components = _assign_component_ids(analysis)
+        data_id = str(uuid4())
+
+        rpc_rows.append(
+            _meal_rpc_params(
+                user, public_url, analysis, food_components, data_id, created_at
             )
+        )
+        stored_filenames.append(unique_filename)
+        meals[index] = _build_analyze_response(
+            analysis, food_components, data_id, public_url, created_at
+        )
 
-            return _build_analyze_response(
-                response_dict, data_id, public_url, created_at
+    if rpc_rows:
+        try:
+            with _stage("db_insert"):
+                await supabase_client.rpc(
+                    "insert_food_analyses_with_components", {"_meals": rpc_rows}
+                ).execute()
+        except Exception as e:
+            await asyncio.gather(
+                *(_remove_image(name, supabase_client) for name in stored_filenames)
             )
-        else:
-            raise NotFoodImageException(
-                detail=response_dict.get(
-                    "message", "Invalid image. Please upload an image of food."
+            for index in meals:
+                outcomes[index] = e
+            meals = {}
+        finally:
+            meal_cache.invalidate(user.id)
+
+    return BatchAnalyzeResponse(
+        results=[
+            BatchAnalyzeResult(
+                index=index,
+                filename=files[index].filename,
+                meal=meals.get(index),
+                error=(
+                    to_analyze_error(outcome)
+                    if isinstance(outcome, BaseException) or index not in meals
+                    else None
                 ),
             )
+            for index, outcome in enumerate(outcomes)
+        ]
+    )
 
-    except NotFoodImageException as e:
-        raise NotFoodImageException(
-            detail=e.detail,
+
+def to_analyze_error(error: BaseException) -> AnalyzeError:
+    if isinstance(error, HTTPException):
+        return AnalyzeError(status_code=error.status_code, detail=str(error.detail))
+    return AnalyzeError(status_code=500, detail=str(error))
+
+
+async def stream_food_analysis(
+    data: bytes,
+    content_type: Optional[str],
+    user: AuthenticatedUser,
+    supabase_client: AsyncClient,
+    description: Optional[str] = None,
+) -> AsyncIterator[str]:
+    """
+    Runs the same pipeline as process_food_analysis and reports its progress
+    as Server-Sent Events: validated, is_food, one component event per food
+    component, and finally the persisted meal. Failures are sent as an error
+    event, since the response status has already been sent.
+
+    Like process_food_analysis, a request for an analysis already in progress
+    joins it; it then gets the is_food, component and meal events once the
+    meal is stored.
+    """
+    key = _flight_key(data, user, description)
+    flight = _in_flight.get(key)
+    events: asyncio.Queue[str | None] | None = None
+    if flight is None:
+        events = asyncio.Queue()
+        flight = _start_flight(
+            key,
+            _stream_food_analysis(
+                data, content_type, user, supabase_client, description, events.put_nowait
+            ),
         )
+    else:
+        logger.info(f"Joining in-flight analysis for user {user.id}")
+
+    try:
+        async with _waiting_for(flight):
+            if events is not None:
+                while (event := await events.get()) is not None:
+                    yield event
+
+            meal = await asyncio.shield(flight.task)
+
+            if events is None:
+                yield format_sse("is_food", {"is_food": True})
+                for component in meal.food_components:
+                    yield format_sse("component", component)
+
+        yield format_sse("meal", meal)
     except Exception as e:
+        yield format_sse("error", to_analyze_error(e))
+
+
+async def _stream_food_analysis(
+    data: bytes,
+    content_type: Optional[str],
+    user: AuthenticatedUser,
+    supabase_client: AsyncClient,
+    description: Optional[str],
+    emit: Callable[[str | None], None],
+) -> MealResponse:
+    """
+    The pipeline behind stream_food_analysis. Emits every event but the meal,
+    which it returns, then None once it is done either way.
+    """
+    try:
+        async with _analysis_slot():
+            image = await _load_image(data, content_type)
+            emit(format_sse("validated", {"width": image.width, "height": image.height}))
+
+            unique_filename = f"{user.id}_{uuid4()}.{image.extension}"
+            upload_task = asyncio.create_task(
+                _upload_image(image, unique_filename, supabase_client)
+            )
+
+            analysis = None
+            component_ids: list[str] = []
+            try:
+                async for event, value in _analyze_image_stream(image, description):
+                    if event == "is_food":
+                        emit(format_sse("is_food", {"is_food": value}))
+                    elif event == "component":
+                        component = FoodComponent(id=str(uuid4()), **value.model_dump())
+                        component_ids.append(component.id)
+                        emit(format_sse("component", component))
+                    else:
+                        analysis = value
+
+                if not analysis.is_food:
+                    NON_FOOD_REJECTIONS.inc()
+                    set_outcome("non_food")
+                    raise NotFoodImageException(
+                        detail=analysis.message
+                        or "Invalid image. Please upload an image of food.",
+                    )
+            except BaseException:
+                await _discard_upload(upload_task, unique_filename, supabase_client)
+                raise
+
+            public_url = await upload_task
+
+            food_components = [
+                FoodComponent(
+                    id=component_ids[index] if index < len(component_ids) else str(uuid4()),
+                    **component.model_dump(),
+                )
+                for index, component in enumerate(analysis.food_components)
+            ]
+
+            data_id = str(uuid4())
+            created_at = await _save_metadata_to_db(
+                user, supabase_client, public_url, analysis, food_components, data_id
+            )
+
+            return _build_analyze_response(
+                analysis, food_components, data_id, public_url, created_at
+            )
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        # Requests that joined this analysis get the same error as in
+        # _process_food_analysis.
         raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        emit(None)
+
 
+def _observe_stage(name: str, seconds: float) -> None:
+    """Records a stage duration in the metrics and the request's flight record."""
+    ANALYZE_STAGE_SECONDS.labels(name).observe(seconds)
+    record_stage(name, seconds)
+
+
+@contextmanager
+def _stage(name: str) -> Iterator[None]:
+    start = time.perf_counter()
+    try:
+        yield
     finally:
-        cleanup_temp_file(temp_file_path)
+        _observe_stage(name, time.perf_counter() - start)
 
 
-def _analyze_image_and_parse_response(
-    temp_file_path: str, image_type: str, description: Optional[str]
-) -> dict:
-    """Analyzes the image and parses the response."""
-    response_json = analyze_image(temp_file_path, image_type, description)
-    return json.loads(response_json)
-
-
-def _store_image_and_metadata(
-    temp_file_path: str,
-    image_type: str,
-    user: User,
-    supabase_client: Client,
-    response_dict: dict,
-) -> tuple[str, str, str]:
-    """Stores the image in the storage bucket and saves metadata in the database."""
-    bucket_name = "user-images"
-    unique_filename = (
-        f"{user.id}_{uuid4()}.{'jpg' if image_type == 'image/jpeg' else 'png'}"
-    )
+@asynccontextmanager
+async def _analysis_slot() -> AsyncIterator[None]:
+    """Waits for one of the ANALYZE_MAX_CONCURRENCY analysis slots."""
+    with _stage("queued"):
+        await _analysis_semaphore.acquire()
+    try:
+        with ANALYSES_IN_FLIGHT.track_inprogress():
+            yield
+    finally:
+        _analysis_semaphore.release()
 
-    reduce_image_size(temp_file_path)
 
-    with open(temp_file_path, "rb") as image_file:
-        supabase_client.storage.from_(bucket_name).upload(
-            unique_filename, image_file, {"content-type": image_type}
+async def _load_image(data: bytes, content_type: Optional[str]) -> ImagePayload:
+    """Validates and preprocesses the upload in the image process pool."""
+    with _stage("load_image"):
+        image = await run_cpu_bound(
+            load_image,
+            data,
+            content_type,
+            model_max_edge=settings.GEMINI_IMAGE_MAX_EDGE,
+            model_format=settings.GEMINI_IMAGE_FORMAT.upper(),
+            model_quality=settings.GEMINI_IMAGE_QUALITY,
         )
+    if not image:
+        raise HTTPException(
+            status_code=400,
+            detail="Invalid image file. Please upload a valid image (JPG, PNG).",
+        )
+    record_image(image.width, image.height)
+    return image
 
-    public_url = supabase_client.storage.from_(bucket_name).get_public_url(
-        unique_filename
+
+async def _analyze_and_store(
+    image: ImagePayload,
+    user: AuthenticatedUser,
+    supabase_client: AsyncClient,
+    description: Optional[str],
+) -> MealResponse:
+    """Analyzes and uploads the image, then saves the meal."""
+    analysis, _, public_url = await _analyze_and_upload(
+        image, user, supabase_client, description
     )
 
+    food_components = _assign_component_ids(analysis)
+
     data_id = str(uuid4())
-    current_time_utc = _save_metadata_to_db(
-        user, supabase_client, public_url, response_dict, data_id
+    created_at = await _save_metadata_to_db(
+        user, supabase_client, public_url, analysis, food_components, data_id
+    )
+
+    return _build_analyze_response(
+        analysis, food_components, data_id, public_url, created_at
+    )
+
+
+async def _analyze_and_upload(
+    image: ImagePayload,
+    user: AuthenticatedUser,
+    supabase_client: AsyncClient,
+    description: Optional[str],
+) -> tuple[FoodAnalysis, str, str]:
+    """
+    Runs the Gemini analysis and the storage upload concurrently. Returns the
+    analysis, the stored file name and its public URL.
+    """
+    unique_filename = f"{user.id}_{uuid4()}.{image.extension}"
+
+    analysis, upload_result = await asyncio.gather(
+        _analyze_image(image, description),
+        _upload_image(image, unique_filename, supabase_client),
+        return_exceptions=True,
+    )
+
+    if isinstance(analysis, BaseException) or not analysis.is_food:
+        if not isinstance(upload_result, BaseException):
+            await _remove_image(unique_filename, supabase_client)
+
+        if isinstance(analysis, BaseException):
+            raise analysis
+        NON_FOOD_REJECTIONS.inc()
+        set_outcome("non_food")
+        raise NotFoodImageException(
+            detail=analysis.message or "Invalid image. Please upload an image of food.",
+        )
+
+    if isinstance(upload_result, BaseException):
+        raise upload_result
+
+    return analysis, unique_filename, upload_result
+
+
+def _assign_component_ids(analysis: FoodAnalysis) -> list[FoodComponent]:
+    return [
+        FoodComponent(id=str(uuid4()), **component.model_dump())
+        for component in analysis.food_components
+    ]
+
+
+def _cached_analysis(
+    image: ImagePayload, description: Optional[str]
+) -> FoodAnalysis | None:
+    """Looks the image up in the analysis cache, counting the hit or miss."""
+    if not analysis_cache.enabled:
+        return None
+
+    cached = analysis_cache.get(image.perceptual_hash, description)
+    ANALYSIS_CACHE_LOOKUPS.labels("miss" if cached is None else "hit").inc()
+    return None if cached is None else FoodAnalysis.model_validate(cached)
+
+
+async def _analyze_image(
+    image: ImagePayload, description: Optional[str]
+) -> FoodAnalysis:
+    """Analyzes the image, reusing cached results for near-duplicates."""
+    cached = _cached_analysis(image, description)
+    if cached is not None:
+        return cached
+
+    with _stage("gemini"):
+        analysis = await analyze_image(
+            image.model_data, image.model_content_type, description
+        )
+
+    await to_thread(
+        analysis_cache.put, image.perceptual_hash, description, analysis.model_dump()
     )
+    return analysis
+
 
-    return public_url, data_id, current_time_utc
+async def _analyze_image_stream(
+    image: ImagePayload, description: Optional[str]
+) -> AsyncIterator[tuple[str, object]]:
+    """Streams the analysis events, replaying a cached result for near-duplicates."""
+    cached = _cached_analysis(image, description)
+    if cached is not None:
+        yield "is_food", cached.is_food
+        for component in cached.food_components:
+            yield "component", component
+        yield "analysis", cached
+        return
 
+    start = time.perf_counter()
+    async for event, value in analyze_image_stream(
+        image.model_data, image.model_content_type, description
+    ):
+        if event == "analysis":
+            _observe_stage("gemini", time.perf_counter() - start)
+            await to_thread(
+                analysis_cache.put, image.perceptual_hash, description, value.model_dump()
+            )
+        yield event, value
+
+
+async def _upload_image(
+    image: ImagePayload,
+    unique_filename: str,
+    supabase_client: AsyncClient,
+) -> str:
+    """Stores the reduced copy of the image in the storage bucket and returns its URL."""
+    with _stage("storage_upload"):
+        await supabase_client.storage.from_(BUCKET_NAME).upload(
+            unique_filename, image.thumbnail, {"content-type": image.content_type}
+        )
 
-def _save_metadata_to_db(
-    user: User,
-    supabase_client: Client,
+        return await supabase_client.storage.from_(BUCKET_NAME).get_public_url(
+            unique_filename
+        )
+
+
+async def _remove_image(unique_filename: str, supabase_client: AsyncClient) -> None:
+    """Removes an uploaded image whose analysis did not produce a meal."""
+    try:
+        await supabase_client.storage.from_(BUCKET_NAME).remove([unique_filename])
+    except Exception as e:
+        logger.warning(f"Failed to remove orphaned image {unique_filename}: {e}")
+
+
+async def _discard_upload(
+    upload_task: asyncio.Task, unique_filename: str, supabase_client: AsyncClient
+) -> None:
+    """Cancels or undoes an image upload whose analysis did not produce a meal."""
+    if not upload_task.done():
+        upload_task.cancel()
+    try:
+        await upload_task
+    except BaseException:
+        return
+    await _remove_image(unique_filename, supabase_client)
+
+
+async def _save_metadata_to_db(
+    user: AuthenticatedUser,
+    supabase_client: AsyncClient,
     public_url: str,
-    response_dict: dict,
+    analysis: FoodAnalysis,
+    food_components: list[FoodComponent],
     data_id: str,
 ) -> str:
     """Saves the metadata of the analyzed image to the database."""
 
     current_time_utc = datetime.now(timezone("UTC")).isoformat()
 
-    supabase_client.rpc(
-        "insert_food_analysis_with_components",
-        {
-            "_id": data_id,
-            "_user_id": user.id,
-            "_food_name_en": response_dict.get("food_name_en"),
-            "_food_name_th": response_dict.get("food_name_th"),
-            "_image_url": public_url,
-            "_created_at": current_time_utc,
-            "_food_components": response_dict.get("food_components", []),
-        },
-    ).execute()
+    try:
+        with _stage("db_insert"):
+            await supabase_client.rpc(
+                "insert_food_analysis_with_components",
+                _meal_rpc_params(
+                    user, public_url, analysis, food_components, data_id, current_time_utc
+                ),
+            ).execute()
+    finally:
+        # Even a failed call may have committed, so never keep serving old reads.
+        meal_cache.invalidate(user.id)
 
     return current_time_utc
 
 
+def _meal_rpc_params(
+    user: AuthenticatedUser,
+    public_url: str,
+    analysis: FoodAnalysis,
+    food_components: list[FoodComponent],
+    data_id: str,
+    created_at: str,
+) -> dict:
+    return {
+        "_id": data_id,
+        "_user_id": user.id,
+        "_food_name_en": analysis.food_name_en,
+        "_food_name_th": analysis.food_name_th,
+        "_image_url": public_url,
+        "_created_at": created_at,
+        "_food_components": [component.model_dump() for component in food_components],
+    }
+
+
 def _build_analyze_response(
-    response_dict: dict, data_id: str, image_url: str, created_at: str
+    analysis: FoodAnalysis,
+    food_components: list[FoodComponent],
+    data_id: str,
+    image_url: str,
+    created_at: str,
 ) -> MealResponse:
     """Builds the MealResponse object."""
-    food_components: list[FoodComponent] = [
-        FoodComponent(**component)
-        for component in response_dict.get("food_components", [])
-    ]
-
     return MealResponse(
         id=data_id,
         image_url=image_url,
-        food_name_en=response_dict.get("food_name_en", ""),
-        food_name_th=response_dict.get("food_name_th", ""),
+        food_name_en=analysis.food_name_en,
+        food_name_th=analysis.food_name_th,
         food_components=food_components,
-        total_calories=response_dict.get("total_calories", 0),
-        total_protein=response_dict.get("total_protein", 0),
-        total_carbohydrates=response_dict.get("total_carbohydrates", 0),
-        total_fat=response_dict.get("total_fat", 0),
-        total_fiber=response_dict.get("total_fiber", 0),
-        total_sugar=response_dict.get("total_sugar", 0),
+        total_calories=analysis.total_calories,
+        total_protein=analysis.total_protein,
+        total_carbohydrates=analysis.total_carbohydrates,
+        total_fat=analysis.total_fat,
+        total_fiber=analysis.total_fiber,
+        total_sugar=analysis.total_sugar,
         created_at=created_at,
     )
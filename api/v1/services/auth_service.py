@@ -1,6 +1,8 @@
+import time
+
 from fastapi import HTTPException
-from gotrue.types import User
-from supabase import Client
+from supabase import AuthApiError, Client, SupabaseAuthClient
+from supabase_auth.types import User
 
 from api.exceptions import (
     EmailNotConfirmedException,
@@ -11,16 +13,22 @@ from api.exceptions import (
     UserAlreadyExistsException,
 )
 from api.v1.schemas import auth as auth_schemas
+from core.config import settings
+from core.metrics import SUPABASE_AUTH_CALLS
+from core.security import AuthenticatedUser, ExpiringCache
+
+# Full users served by /me, per user id, kept as long as verified tokens are.
+_full_users: ExpiringCache[User] = ExpiringCache("user", settings.JWT_CACHE_MAX_SIZE)
 
 
 def signup_with_email_password(
-    supabase_client: Client, user_create: auth_schemas.UserCreate
+    auth_client: SupabaseAuthClient, user_create: auth_schemas.UserCreate
 ) -> auth_schemas.SignupResponse:
     """
     Signs up a user with email and password using Supabase Auth.
     """
     try:
-        response = supabase_client.auth.sign_up(
+        response = auth_client.sign_up(
             {"email": user_create.email, "password": user_create.password}
         )
 
@@ -43,13 +51,13 @@ def signup_with_email_password(
 
 
 def login_with_email_password(
-    supabase_client: Client, email: str, password: str
+    auth_client: SupabaseAuthClient, email: str, password: str
 ) -> auth_schemas.LoginResponse:
     """
     Logs in a user with email and password using Supabase Auth.
     """
     try:
-        response = supabase_client.auth.sign_in_with_password(
+        response = auth_client.sign_in_with_password(
             {"email": email, "password": password}
         )
         if response.session:
@@ -66,13 +74,13 @@ def login_with_email_password(
 
 
 def refresh_token(
-    supabase_client: Client, refresh_token: str
+    auth_client: SupabaseAuthClient, refresh_token: str
 ) -> auth_schemas.LoginResponse:
     """
     Logs in a user with email and password using Supabase Auth.
     """
     try:
-        response = supabase_client.auth.refresh_session(refresh_token)
+        response = auth_client.refresh_session(refresh_token)
         if response.session:
             return auth_schemas.LoginResponse(
                 access_token=response.session.access_token,
@@ -84,6 +92,29 @@ def refresh_token(
         raise InvalidCredentialsException()
 
 
+def get_user(supabase_client: Client, user: AuthenticatedUser, jwt_token: str) -> User:
+    """
+    Fetches the full user from Supabase Auth; the access token only carries
+    part of it. The result is cached per user for JWT_CACHE_TTL seconds.
+    """
+    full_user = _full_users.get(user.id)
+    if full_user is not None:
+        return full_user
+
+    SUPABASE_AUTH_CALLS.labels("get_user").inc()
+    try:
+        response = supabase_client.auth.get_user(jwt_token)
+    except AuthApiError:
+        raise InvalidCredentialsException()
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+    if not response or not response.user:
+        raise InvalidCredentialsException()
+    _full_users.put(user.id, response.user, time.time() + settings.JWT_CACHE_TTL)
+    return response.user
+
+
 def logout(supabase_client: Client, jwt_token: str) -> None:
     """
     Logs out a user using Supabase Auth.
@@ -96,7 +127,8 @@ def logout(supabase_client: Client, jwt_token: str) -> None:
 
 def change_password(
     supabase_client: Client,
-    user: User,
+    auth_client: SupabaseAuthClient,
+    user: AuthenticatedUser,
     old_password: str,
     new_password: str,
     confirm_password: str,
@@ -106,7 +138,7 @@ def change_password(
     """
     # Verify old password
     try:
-        login_with_email_password(supabase_client, user.email or "", old_password)
+        login_with_email_password(auth_client, user.email or "", old_password)
     except InvalidCredentialsException:
         raise OldPasswordIncorrectException()
 
@@ -115,7 +147,9 @@ def change_password(
         raise NewPasswordsDoNotMatchException()
 
     try:
-        supabase_client.auth.update_user({"password": new_password})
+        supabase_client.auth.admin.update_user_by_id(
+            user.id, {"password": new_password}
+        )
 
     except OldPasswordIncorrectException:
         raise OldPasswordIncorrectException()
@@ -124,11 +158,11 @@ def change_password(
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
     
-def forgot_password(supabase_client: Client, email: str) -> None:
+def forgot_password(auth_client: SupabaseAuthClient, email: str) -> None:
     """
     Sends a password reset email to the user.
     """
     try:
-        supabase_client.auth.reset_password_for_email(email)
+        auth_client.reset_password_for_email(email)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
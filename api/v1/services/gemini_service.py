@@ -1,56 +1,418 @@
+import asyncio
 import re
+import time
+from typing import Any, AsyncIterator
 
+import httpx
 from google import genai
-from google.genai import types
+from google.genai import errors, types
 
+from api.exceptions import AnalysisUnavailableException
+from api.v1.schemas.analyze import FoodAnalysis
+from api.v1.schemas.meals import AnalyzedFoodComponent
 from core.config import settings
+from core.flight_recorder import record_gemini_usage
+from core.logging import logger
+from core.metrics import (
+    CIRCUIT_STATES,
+    GEMINI_CALLS_IN_FLIGHT,
+    GEMINI_CIRCUIT_STATE,
+    GEMINI_CONCURRENCY_LIMIT,
+    GEMINI_ERRORS,
+    GEMINI_SLOTS_IN_USE,
+)
+from core.resilience import (
+    AdaptiveConcurrencyLimiter,
+    CircuitBreaker,
+    ResilientCaller,
+    ServiceUnavailable,
+)
 
 client = genai.Client(api_key=settings.GEMINI_API_KEY)
 
+BASE_PROMPT = "Look at the image provided very carefully and carefully analyze the food in the image and tell the nutritional information."
+DESCRIPTION_PROMPT = " From here on out, there will be more explanatory material to help you think and make better decisions: "
 
-def analyze_image(
-    file_path: str,
-    file_type: str,
-    description: str | None = None,
-    fast_mode: bool = True,
-) -> str:
-    """Uploads image to Gemini API and analyzes it."""
-    uploaded_file: types.File = client.files.upload(file=file_path)
-
-    contents = [
-        types.Content(
-            role="user",
-            parts=[
-                types.Part.from_text(
-                    text=f"Look at the image provided very carefully and carefully analyze the food in the image and tell the nutritional information.{" From here on out, there will be more explanatory material to help you think and make better decisions: " + description if description else ''}"
-                ),
-                types.Part.from_uri(
-                    file_uri=uploaded_file.uri or "", mime_type=file_type
-                ),
-            ],
-        )
-    ]
-
-    config = types.GenerateContentConfig(
+
+class SystemInstructionCache:
+    """
+    Keeps an explicit Gemini cached content entry holding the system
+    instruction and the static prompt prefix, and refreshes its TTL before it
+    expires. When caching is disabled or the entry can not be created (for
+    example because the model does not support it), name() returns None and
+    callers send the prompt inline instead.
+    """
+
+    def __init__(
+        self,
+        enabled: bool = True,
+        ttl: int = 3600,
+        refresh_margin: int = 300,
+        retry_after: int = 600,
+    ):
+        self.enabled = enabled
+        self.ttl = ttl
+        self.refresh_margin = min(refresh_margin, ttl // 2)
+        self.retry_after = retry_after
+
+        self._name: str | None = None
+        self._expires_at = 0.0
+        self._unavailable_until = 0.0
+        self._lock = asyncio.Lock()
+
+    async def name(self) -> str | None:
+        if not self.enabled:
+            return None
+
+        now = time.monotonic()
+        if self._name and now < self._expires_at - self.refresh_margin:
+            return self._name
+        if not self._name and now < self._unavailable_until:
+            return None
+
+        async with self._lock:
+            now = time.monotonic()
+            if self._name and now < self._expires_at - self.refresh_margin:
+                return self._name
+
+            try:
+                if self._name:
+                    try:
+                        await client.aio.caches.update(
+                            name=self._name,
+                            config=types.UpdateCachedContentConfig(ttl=f"{self.ttl}s"),
+                        )
+                    except errors.APIError:
+                        # The entry expired or was removed; create a new one.
+                        self._name = None
+
+                if not self._name:
+                    cached_content = await client.aio.caches.create(
+                        model=settings.MODEL_NAME,
+                        config=types.CreateCachedContentConfig(
+                            display_name="nutrition-system-instruction",
+                            system_instruction=settings.SYSTEM_INSTRUCTION,
+                            contents=[
+                                types.Content(
+                                    role="user",
+                                    parts=[types.Part.from_text(text=BASE_PROMPT)],
+                                )
+                            ],
+                            ttl=f"{self.ttl}s",
+                        ),
+                    )
+                    self._name = cached_content.name
+                self._expires_at = now + self.ttl
+            except Exception as e:
+                logger.warning(f"Gemini context caching unavailable, sending prompt inline: {e}")
+                self._name = None
+                self._unavailable_until = now + self.retry_after
+
+            return self._name
+
+    def invalidate(self, name: str) -> None:
+        """Forgets an entry that Gemini no longer accepts."""
+        if self._name == name:
+            self._name = None
+            self._expires_at = 0.0
+
+    async def delete(self) -> None:
+        if self._name:
+            try:
+                await client.aio.caches.delete(name=self._name)
+            except Exception as e:
+                logger.warning(f"Failed to delete Gemini cached content {self._name}: {e}")
+        self._name = None
+        self._expires_at = 0.0
+
+
+system_instruction_cache = SystemInstructionCache(
+    enabled=settings.GEMINI_CONTEXT_CACHE_ENABLED,
+    ttl=settings.GEMINI_CONTEXT_CACHE_TTL,
+)
+
+
+def _is_transient(e: BaseException) -> bool:
+    if isinstance(e, errors.APIError):
+        return e.code in (408, 429) or e.code >= 500
+    return isinstance(e, (TimeoutError, httpx.TransportError))
+
+
+def _is_throttled(e: BaseException) -> bool:
+    return isinstance(e, errors.APIError) and e.code == 429
+
+
+def _count_error(e: Exception) -> None:
+    if _is_throttled(e):
+        kind = "throttled"
+    elif _is_transient(e):
+        kind = "transient"
+    else:
+        kind = "rejected"
+    GEMINI_ERRORS.labels(kind).inc()
+
+
+def _export_state(caller: ResilientCaller) -> None:
+    stats = caller.stats()
+    GEMINI_CONCURRENCY_LIMIT.set(stats["limit"])
+    GEMINI_SLOTS_IN_USE.set(stats["in_flight"])
+    GEMINI_CIRCUIT_STATE.set(CIRCUIT_STATES[stats["circuit_state"]])
+
+
+gemini_caller = ResilientCaller(
+    limiter=AdaptiveConcurrencyLimiter(
+        initial_limit=settings.GEMINI_INITIAL_CONCURRENCY,
+        min_limit=settings.GEMINI_MIN_CONCURRENCY,
+        max_limit=settings.GEMINI_MAX_CONCURRENCY,
+        latency_target=settings.GEMINI_LATENCY_TARGET,
+    ),
+    breaker=CircuitBreaker(
+        failure_threshold=settings.GEMINI_CIRCUIT_FAILURE_THRESHOLD,
+        reset_timeout=settings.GEMINI_CIRCUIT_RESET_TIMEOUT,
+    ),
+    is_transient=_is_transient,
+    is_throttled=_is_throttled,
+    max_attempts=settings.GEMINI_MAX_ATTEMPTS,
+    deadline=settings.GEMINI_REQUEST_DEADLINE,
+    backoff_base=settings.GEMINI_RETRY_BACKOFF_BASE,
+    backoff_max=settings.GEMINI_RETRY_BACKOFF_MAX,
+    on_error=_count_error,
+    on_change=_export_state,
+)
+_export_state(gemini_caller)
+
+
+def _build_contents(
+    image_bytes: bytes,
+    mime_type: str,
+    description: str | None,
+    include_base_prompt: bool,
+) -> list[types.Content]:
+    prompt = BASE_PROMPT if include_base_prompt else ""
+    if description:
+        prompt += DESCRIPTION_PROMPT + description
+
+    parts = [types.Part.from_text(text=prompt.strip())] if prompt else []
+    parts.append(types.Part.from_bytes(data=image_bytes, mime_type=mime_type))
+
+    return [types.Content(role="user", parts=parts)]
+
+
+def _build_config(fast_mode: bool, cached_content: str | None) -> types.GenerateContentConfig:
+    thinking_budget = 0 if fast_mode else 24576
+
+    return types.GenerateContentConfig(
         temperature=0.7,
         top_p=0.95,
         top_k=64,
-        max_output_tokens=65536,
-        response_mime_type="text/plain",
+        # Thinking tokens count towards the output limit.
+        max_output_tokens=settings.GEMINI_MAX_OUTPUT_TOKENS + thinking_budget,
+        response_mime_type="application/json",
+        response_schema=FoodAnalysis,
         thinking_config=types.ThinkingConfig(
-            thinking_budget=(0 if fast_mode else 24576),
+            thinking_budget=thinking_budget,
         ),
-        system_instruction=[types.Part.from_text(text=settings.SYSTEM_INSTRUCTION)],
+        cached_content=cached_content,
+        system_instruction=(
+            None
+            if cached_content
+            else [types.Part.from_text(text=settings.SYSTEM_INSTRUCTION)]
+        ),
+    )
+
+
+def _is_cache_rejection(e: errors.ClientError) -> bool:
+    return e.code == 404 or "cached" in str(e).lower()
+
+
+async def _generate_content(
+    image_bytes: bytes, mime_type: str, description: str | None, fast_mode: bool
+) -> types.GenerateContentResponse:
+    cached_content = await system_instruction_cache.name()
+
+    if cached_content:
+        try:
+            return await client.aio.models.generate_content(
+                model=settings.MODEL_NAME,
+                contents=_build_contents(image_bytes, mime_type, description, False),  # type: ignore
+                config=_build_config(fast_mode, cached_content),
+            )
+        except errors.ClientError as e:
+            if not _is_cache_rejection(e):
+                raise
+            logger.warning(f"Gemini cached content rejected, retrying inline: {e}")
+            system_instruction_cache.invalidate(cached_content)
+
+    return await client.aio.models.generate_content(
+        model=settings.MODEL_NAME,
+        contents=_build_contents(image_bytes, mime_type, description, True),  # type: ignore
+        config=_build_config(fast_mode, None),
     )
 
-    response = client.models.generate_content(
-        model=settings.MODEL_NAME, contents=contents, config=config  # type: ignore
+
+async def _generate_content_stream(
+    image_bytes: bytes, mime_type: str, description: str | None, fast_mode: bool
+) -> AsyncIterator[types.GenerateContentResponse]:
+    cached_content = await system_instruction_cache.name()
+
+    if cached_content:
+        started = False
+        try:
+            stream = await client.aio.models.generate_content_stream(
+                model=settings.MODEL_NAME,
+                contents=_build_contents(image_bytes, mime_type, description, False),  # type: ignore
+                config=_build_config(fast_mode, cached_content),
+            )
+            async for chunk in stream:
+                started = True
+                yield chunk
+            return
+        except errors.ClientError as e:
+            if started or not _is_cache_rejection(e):
+                raise
+            logger.warning(f"Gemini cached content rejected, retrying inline: {e}")
+            system_instruction_cache.invalidate(cached_content)
+
+    stream = await client.aio.models.generate_content_stream(
+        model=settings.MODEL_NAME,
+        contents=_build_contents(image_bytes, mime_type, description, True),  # type: ignore
+        config=_build_config(fast_mode, None),
     )
+    async for chunk in stream:
+        yield chunk
+
+
+async def analyze_image(
+    image_bytes: bytes,
+    mime_type: str,
+    description: str | None = None,
+    fast_mode: bool = True,
+) -> FoodAnalysis:
+    """Sends the image inline to Gemini API and analyzes it."""
+    try:
+        with GEMINI_CALLS_IN_FLIGHT.track_inprogress():
+            response = await gemini_caller.call(
+                lambda: _generate_content(image_bytes, mime_type, description, fast_mode)
+            )
+    except ServiceUnavailable as e:
+        logger.warning(f"Gemini unavailable: {e}")
+        GEMINI_ERRORS.labels("unavailable").inc()
+        raise AnalysisUnavailableException(retry_after=e.retry_after)
+
+    record_gemini_usage(response.usage_metadata)
+
+    if not response.text:
+        raise ValueError("Gemini returned an empty response.")
+
+    return FoodAnalysis.model_validate_json(response.text)
+
+
+async def analyze_image_stream(
+    image_bytes: bytes,
+    mime_type: str,
+    description: str | None = None,
+    fast_mode: bool = True,
+) -> AsyncIterator[tuple[str, Any]]:
+    """
+    Streams the analysis from Gemini API. Yields ("is_food", bool) as soon as
+    it is known, ("component", AnalyzedFoodComponent) for each food component
+    as soon as it is complete, and finally ("analysis", FoodAnalysis).
+    """
+    parser = AnalysisStreamParser()
+    usage = None
+
+    try:
+        with GEMINI_CALLS_IN_FLIGHT.track_inprogress():
+            async for chunk in gemini_caller.stream(
+                lambda: _generate_content_stream(
+                    image_bytes, mime_type, description, fast_mode
+                )
+            ):
+                # Every chunk carries the usage so far; the last one the totals.
+                usage = chunk.usage_metadata or usage
+                if chunk.text:
+                    for event in parser.feed(chunk.text):
+                        yield event
+    except ServiceUnavailable as e:
+        logger.warning(f"Gemini unavailable: {e}")
+        GEMINI_ERRORS.labels("unavailable").inc()
+        raise AnalysisUnavailableException(retry_after=e.retry_after)
+
+    record_gemini_usage(usage)
+    yield "analysis", parser.result()
+
+
+class AnalysisStreamParser:
+    """
+    Incrementally scans the FoodAnalysis JSON produced by Gemini and reports
+    the is_food flag and each complete object of the food_components array
+    before the whole document has arrived.
+    """
+
+    _IS_FOOD = re.compile(r'"is_food"\s*:\s*(true|false)')
+
+    def __init__(self):
+        self._text = ""
+        self._position = 0
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+        self._string_start = 0
+        self._last_string = ""
+        self._key = ""
+        self._in_components = False
+        self._component_start: int | None = None
+        self._is_food: bool | None = None
+
+    def feed(self, text: str) -> list[tuple[str, Any]]:
+        self._text += text
+        events: list[tuple[str, Any]] = []
+
+        if self._is_food is None:
+            match = self._IS_FOOD.search(self._text)
+            if match:
+                self._is_food = match.group(1) == "true"
+                events.append(("is_food", self._is_food))
+
+        for index in range(self._position, len(self._text)):
+            char = self._text[index]
+
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == "\\":
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+                    self._last_string = self._text[self._string_start + 1 : index]
+                continue
 
-    if uploaded_file.name:
-        client.files.delete(name=uploaded_file.name)
+            if char == '"':
+                self._in_string = True
+                self._string_start = index
+            elif char == ":" and self._depth == 1:
+                self._key = self._last_string
+            elif char in "{[":
+                self._depth += 1
+                if char == "[" and self._depth == 2 and self._key == "food_components":
+                    self._in_components = True
+                elif char == "{" and self._in_components and self._depth == 3:
+                    self._component_start = index
+            elif char in "}]":
+                if char == "}" and self._in_components and self._depth == 3:
+                    component = AnalyzedFoodComponent.model_validate_json(
+                        self._text[self._component_start : index + 1]
+                    )
+                    events.append(("component", component))
+                    self._component_start = None
+                elif char == "]" and self._in_components and self._depth == 2:
+                    self._in_components = False
+                self._depth -= 1
 
-    text = response.text.strip("```").replace("json", "") if response.text else ""
-    response_text = re.sub(r'\s*\(.*?\)', '', text)
+        self._position = len(self._text)
+        return events
 
-    return response_text
+    def result(self) -> FoodAnalysis:
+        if not self._text:
+            raise ValueError("Gemini returned an empty response.")
+        return FoodAnalysis.model_validate_json(self._text)
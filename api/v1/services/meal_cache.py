@@ -0,0 +1,119 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, TypeVar
+
+from core.config import settings
+from core.metrics import MEAL_CACHE_ENTRIES, MEAL_CACHE_INVALIDATIONS, MEAL_CACHE_LOOKUPS
+
+T = TypeVar("T")
+
+CacheKey = tuple[str, Hashable]
+
+
+class MealReadCache:
+    """
+    Caches meal reads (single meals, listings and summaries) per user, with
+    LRU and TTL eviction. A user's meals only change when they analyze a new
+    image, so the analyze service calls invalidate() right after it writes,
+    dropping every entry of that user.
+
+    While reads of a user are loading, the user has a generation that
+    invalidate() bumps; a read that started before the write finished is not
+    stored, so it can not bring stale data back into the cache. Generations
+    are dropped with the user's last load, so there are never more of them
+    than loads in progress.
+    """
+
+    def __init__(self, enabled: bool = True, max_size: int = 10000, ttl: float = 300):
+        self.enabled = enabled
+        self.max_size = max_size
+        self.ttl = ttl
+
+        self._entries: OrderedDict[CacheKey, tuple[float, Any]] = OrderedDict()
+        self._user_keys: dict[str, set[CacheKey]] = {}
+        self._generations: dict[str, int] = {}
+        self._loads: dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def get_or_load(self, user_id: str, key: Hashable, load: Callable[[], T]) -> T:
+        """Returns the cached value for this user and key, or loads and caches it."""
+        if not self.enabled:
+            return load()
+
+        user_id = str(user_id)
+        cache_key = (user_id, key)
+        now = time.monotonic()
+
+        with self._lock:
+            entry = self._entries.get(cache_key)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(cache_key)
+                MEAL_CACHE_LOOKUPS.labels("hit").inc()
+                return entry[1]
+            MEAL_CACHE_LOOKUPS.labels("miss").inc()
+            generation = self._generations.get(user_id, 0)
+            self._loads[user_id] = self._loads.get(user_id, 0) + 1
+
+        try:
+            value = load()
+            with self._lock:
+                if self._generations.get(user_id, 0) == generation:
+                    self._insert(cache_key, now + self.ttl, value)
+            return value
+        finally:
+            with self._lock:
+                self._loads[user_id] -= 1
+                if not self._loads[user_id]:
+                    del self._loads[user_id]
+                    self._generations.pop(user_id, None)
+
+    def invalidate(self, user_id: str) -> None:
+        """Drops every cached read of this user."""
+        user_id = str(user_id)
+        with self._lock:
+            if user_id in self._loads:
+                self._generations[user_id] = self._generations.get(user_id, 0) + 1
+            for cache_key in self._user_keys.pop(user_id, set()):
+                self._entries.pop(cache_key, None)
+            MEAL_CACHE_INVALIDATIONS.inc()
+            MEAL_CACHE_ENTRIES.set(len(self._entries))
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._user_keys.clear()
+            # Loads in progress must not store what they read before the clear.
+            self._generations = {
+                user_id: self._generations.get(user_id, 0) + 1 for user_id in self._loads
+            }
+            MEAL_CACHE_ENTRIES.set(0)
+
+    def _insert(self, cache_key: CacheKey, expires_at: float, value: Any) -> None:
+        self._entries[cache_key] = (expires_at, value)
+        self._entries.move_to_end(cache_key)
+        self._user_keys.setdefault(cache_key[0], set()).add(cache_key)
+
+        now = time.monotonic()
+        while self._entries:
+            oldest, (oldest_expires_at, _) = next(iter(self._entries.items()))
+            if len(self._entries) <= self.max_size and oldest_expires_at > now:
+                break
+            self._remove(oldest)
+
+        MEAL_CACHE_ENTRIES.set(len(self._entries))
+
+    def _remove(self, cache_key: CacheKey) -> None:
+        del self._entries[cache_key]
+        user_keys = self._user_keys.get(cache_key[0])
+        if user_keys is not None:
+            user_keys.discard(cache_key)
+            if not user_keys:
+                del self._user_keys[cache_key[0]]
+
+
+meal_cache = MealReadCache(
+    enabled=settings.MEAL_CACHE_ENABLED,
+    max_size=settings.MEAL_CACHE_MAX_SIZE,
+    ttl=settings.MEAL_CACHE_TTL,
+)
@@ -1,58 +1,133 @@
-from datetime import datetime, timedelta
+import base64
+import csv
+import functools
+import io
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+from typing import Any, AsyncIterator, Callable, Literal, Optional
+from uuid import UUID
 
 import pytz
 from fastapi import HTTPException
-from gotrue.types import User
-from supabase import Client
+from pydantic import TypeAdapter
+from supabase import AsyncClient, Client
 
 from api.exceptions import InvalidCredentialsException
-from api.v1.schemas.meals import ListMealResponse, MealResponse
+from api.v1.schemas.meals import (
+    DailyNutritionTotals,
+    FoodComponent,
+    ListMealResponse,
+    MealResponse,
+    NutritionSummaryResponse,
+    NutritionTotals,
+)
+from api.v1.services.meal_cache import meal_cache
+from core.logging import logger
+from core.metrics import SUPABASE_RPC_SECONDS
+from core.security import AuthenticatedUser
+from utils.etag import make_etag
 
+SUMMARY_MAX_DAYS = 366
 
-def is_meal_owner(meal: dict, user: User) -> bool:
+EXPORT_PAGE_SIZE = 500
+
+EXPORT_CSV_COLUMNS = [
+    "id",
+    "created_at",
+    "food_name_en",
+    "food_name_th",
+    "image_url",
+    "total_calories",
+    "total_protein",
+    "total_carbohydrates",
+    "total_fat",
+    "total_fiber",
+    "total_sugar",
+    "food_components",
+]
+
+# Part of every meal ETag; change it when the response format changes.
+ETAG_FORMAT_VERSION = 1
+
+# The read RPCs already return rows in the response shape, so each payload is
+# validated once, in a single pass through pydantic-core, and the models are
+# what the meal cache keeps.
+_meal_adapter = TypeAdapter(MealResponse)
+_meals_adapter = TypeAdapter(list[MealResponse])
+_components_adapter = TypeAdapter(list[FoodComponent])
+_daily_totals_adapter = TypeAdapter(list[DailyNutritionTotals])
+
+
+def is_meal_owner(meal: dict, user: AuthenticatedUser) -> bool:
     return meal["user_id"] == user.id
 
 
+def get_meal_version(user: AuthenticatedUser, supabase_client: Client) -> int:
+    """
+    Returns the user's meal version, which the database bumps on every write
+    to their meals, so checking it needs no aggregation. Both the ETag and the
+    meal cache entries of a response are tied to it.
+    """
+    try:
+        with SUPABASE_RPC_SECONDS.labels("meal_versions").time():
+            response = (
+                supabase_client.table("meal_versions")
+                .select("version")
+                .eq("user_id", user.id)
+                .limit(1)
+                .execute()
+            )
+    except Exception:
+        logger.exception("Error retrieving meal version")
+        raise HTTPException(status_code=500, detail="Error retrieving meals.")
+
+    return response.data[0]["version"] if response.data else 0
+
+
+def get_meals_etag(user: AuthenticatedUser, meal_version: int) -> str:
+    """Returns the ETag shared by all of the user's meal responses for a given URL."""
+    return make_etag(ETAG_FORMAT_VERSION, user.id, meal_version)
+
+
 def get_meal_by_id(
     id: str,
-    user: User,
+    user: AuthenticatedUser,
     supabase_client: Client,
+    meal_version: int,
 ) -> MealResponse:
-    try:
-        response = supabase_client.rpc(
-            "get_food_analysis_result", {"p_id": id}
-        ).execute()
+    def parse(data: Optional[dict]) -> Optional[MealResponse]:
+        # ETags are built from the requesting user's meal version, so only
+        # their own meals can be served.
+        if data is None or not is_meal_owner(data, user):
+            return None
+        return _meal_adapter.validate_python(data)
 
-        response_data = response.data
-
-        return MealResponse(
-            id=response_data.get("id"),
-            image_url=response_data.get("image_url"),
-            food_name_en=response_data.get("food_name_en"),
-            food_name_th=response_data.get("food_name_th"),
-            food_components=response_data.get("food_components", []),
-            total_calories=response_data.get("total_calories"),
-            total_protein=response_data.get("total_protein"),
-            total_carbohydrates=response_data.get("total_carbohydrates"),
-            total_fat=response_data.get("total_fat"),
-            total_fiber=response_data.get("total_fiber"),
-            total_sugar=response_data.get("total_sugar"),
-            created_at=response_data.get("created_at"),
+    try:
+        meal = _read_rpc(
+            user,
+            supabase_client,
+            meal_version,
+            "get_food_analysis_result",
+            {"p_id": id},
+            parse,
         )
-
     except InvalidCredentialsException:
         raise
     except Exception as e:
         print(f"Error retrieving meal by ID: {e}")
         raise HTTPException(status_code=404, detail="Meal not found")
 
+    if meal is None:
+        raise HTTPException(status_code=404, detail="Meal not found")
 
-def get_meals_by_date(
-    date: str,
-    timezone: str,
-    user,
-    supabase_client: Client,
-) -> ListMealResponse:
+    return meal
+
+
+def parse_day(date: str, timezone: str) -> tuple[str, str]:
+    """
+    Returns the start and the end of a local day as UTC timestamps, or raises
+    a 400 for an invalid date or timezone.
+    """
     try:
         local_date = datetime.strptime(date, "%Y-%m-%d")
     except ValueError:
@@ -74,79 +149,300 @@ def get_meals_by_date(
             status_code=400, detail="Invalid timezone. Use a valid timezone string."
         )
 
+    return start_of_day_utc, end_of_day_utc
+
+
+def get_meals_by_date(
+    day: tuple[str, str],
+    user,
+    supabase_client: Client,
+    meal_version: int,
+) -> ListMealResponse:
+    """Returns the user's meals of a day given by parse_day."""
+    start_of_day_utc, end_of_day_utc = day
+
     try:
-        response = supabase_client.rpc(
+        meals = _read_rpc(
+            user,
+            supabase_client,
+            meal_version,
             "get_food_analysis_results_by_user_and_date",
             {
                 "p_user_id": user.id,
                 "p_start_date": start_of_day_utc,
                 "p_end_date": end_of_day_utc,
             },
-        ).execute()
-
-        response_data = response.data
-
-        return ListMealResponse(
-            meals=(
-                [
-                    MealResponse(
-                        id=meal.get("id"),
-                        image_url=meal.get("image_url"),
-                        food_name_en=meal.get("food_name_en"),
-                        food_name_th=meal.get("food_name_th"),
-                        food_components=meal.get("food_components", []),
-                        total_calories=meal.get("total_calories"),
-                        total_protein=meal.get("total_protein"),
-                        total_carbohydrates=meal.get("total_carbohydrates"),
-                        total_fat=meal.get("total_fat"),
-                        total_fiber=meal.get("total_fiber"),
-                        total_sugar=meal.get("total_sugar"),
-                        created_at=meal.get("created_at"),
-                    )
-                    for meal in response_data
-                ]
-                if response_data
-                else []
-            )
+            _parse_meals,
         )
-
     except Exception as e:
         print(f"Error retrieving meals: {e}")
         raise HTTPException(status_code=500, detail="Error retrieving meals.")
 
+    return ListMealResponse(meals=meals)
+
 
-def get_all_meals(
-    user: User,
+def get_meals_page(
+    user: AuthenticatedUser,
     supabase_client: Client,
+    meal_version: int,
+    limit: int,
+    cursor: Optional[tuple[str, str]] = None,
 ) -> ListMealResponse:
+    """
+    Returns one page of the user's meals, newest first. next_cursor is set
+    when there are more meals; pass it back, through decode_cursor, as cursor
+    to get the next page.
+    """
+    cursor_created_at, cursor_id = cursor or (None, None)
+
     try:
-        response = supabase_client.rpc(
-            "get_food_analysis_results_by_user", {"p_user_id": user.id}
-        ).execute()
-        response_data = response.data
-
-        return ListMealResponse(
-            meals=(
-                [
-                    MealResponse(
-                        id=meal.get("id"),
-                        image_url=meal.get("image_url"),
-                        food_name_en=meal.get("food_name_en"),
-                        food_name_th=meal.get("food_name_th"),
-                        food_components=meal.get("food_components", []),
-                        total_calories=meal.get("total_calories"),
-                        total_protein=meal.get("total_protein"),
-                        total_carbohydrates=meal.get("total_carbohydrates"),
-                        total_fat=meal.get("total_fat"),
-                        total_fiber=meal.get("total_fiber"),
-                        total_sugar=meal.get("total_sugar"),
-                        created_at=meal.get("created_at"),
-                    )
-                    for meal in response_data
-                ]
-                if response_data
-                else []
-            )
+        # Ask for one extra row to know whether another page follows.
+        meals = _read_rpc(
+            user,
+            supabase_client,
+            meal_version,
+            "get_food_analysis_results_page",
+            {
+                "p_user_id": user.id,
+                "p_limit": limit + 1,
+                "p_cursor_created_at": cursor_created_at,
+                "p_cursor_id": cursor_id,
+            },
+            _parse_meals,
         )
-    except Exception as e:
+    except Exception:
+        logger.exception("Error retrieving meals")
         raise HTTPException(status_code=500, detail="Error retrieving meals.")
+
+    next_cursor = None
+    if len(meals) > limit:
+        meals = meals[:limit]
+        next_cursor = encode_cursor(meals[-1].created_at, meals[-1].id)
+
+    return ListMealResponse(meals=meals, next_cursor=next_cursor)
+
+
+@dataclass(frozen=True)
+class SummaryRange:
+    start: date
+    end: date
+    timezone: str
+    rollup_timezone: str
+
+
+def parse_summary_range(from_date: str, to_date: str, timezone: str) -> SummaryRange:
+    """
+    Checks the dates and the timezone of a summary request, and raises a 400
+    if they are invalid or the range is too long.
+    """
+    try:
+        start = datetime.strptime(from_date, "%Y-%m-%d").date()
+        end = datetime.strptime(to_date, "%Y-%m-%d").date()
+    except ValueError:
+        raise HTTPException(
+            status_code=400, detail="Invalid date format. Use YYYY-MM-DD."
+        )
+
+    if end < start:
+        raise HTTPException(status_code=400, detail="'from' must not be after 'to'.")
+    if (end - start).days >= SUMMARY_MAX_DAYS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Date range is too long. Request at most {SUMMARY_MAX_DAYS} days.",
+        )
+
+    try:
+        rollup_timezone = _rollup_timezone(timezone)
+    except Exception:
+        raise HTTPException(
+            status_code=400, detail="Invalid timezone. Use a valid timezone string."
+        )
+
+    return SummaryRange(start, end, timezone, rollup_timezone)
+
+
+def get_nutrition_summary(
+    summary_range: SummaryRange,
+    user: AuthenticatedUser,
+    supabase_client: Client,
+    meal_version: int,
+) -> NutritionSummaryResponse:
+    """
+    Returns the user's nutrition totals for each local day of the range
+    (inclusive), read from the daily rollup table.
+    """
+    try:
+        days = _read_rpc(
+            user,
+            supabase_client,
+            meal_version,
+            "get_daily_nutrition_totals",
+            {
+                "p_user_id": user.id,
+                "p_timezone": summary_range.rollup_timezone,
+                "p_from": summary_range.start.isoformat(),
+                "p_to": summary_range.end.isoformat(),
+            },
+            lambda data: _daily_totals_adapter.validate_python(data or []),
+        )
+    except Exception:
+        logger.exception("Error retrieving nutrition summary")
+        raise HTTPException(status_code=500, detail="Error retrieving nutrition summary.")
+
+    total = NutritionTotals(
+        **{
+            field: sum(getattr(day, field) for day in days)
+            for field in NutritionTotals.model_fields
+        }
+    )
+
+    return NutritionSummaryResponse(
+        timezone=summary_range.timezone, days=days, total=total
+    )
+
+
+@functools.cache
+def _zones_by_rules() -> dict[bytes, str]:
+    """Maps the compiled tz database rules of each common timezone to its name."""
+    zones: dict[bytes, str] = {}
+    for name in sorted(pytz.common_timezones):
+        with pytz.open_resource(name) as rules:
+            zones.setdefault(rules.read(), name)
+    return zones
+
+
+def _rollup_timezone(timezone: str) -> str:
+    """
+    Returns the name the nutrition rollups of a timezone are kept under. Any
+    spelling of a name, its aliases (Asia/Saigon for Asia/Ho_Chi_Minh) and
+    zones with the same rules share one rollup instead of building their own.
+    """
+    zone = pytz.timezone(timezone).zone
+    with pytz.open_resource(zone) as rules:
+        return _zones_by_rules().get(rules.read(), zone)
+
+
+async def export_meals(
+    export_format: Literal["ndjson", "csv"],
+    user: AuthenticatedUser,
+    supabase_client: AsyncClient,
+) -> AsyncIterator[str]:
+    """
+    Returns a stream of all of the user's meals, newest first, as NDJSON lines
+    or CSV rows. The first page is read before returning, so a failing
+    database still gets a 500 response instead of an empty file.
+    """
+    try:
+        first_page = await _read_export_page(user, supabase_client, None)
+    except Exception:
+        logger.exception("Error exporting meals")
+        raise HTTPException(status_code=500, detail="Error exporting meals.")
+
+    return _export_rows(export_format, user, supabase_client, first_page)
+
+
+async def _export_rows(
+    export_format: Literal["ndjson", "csv"],
+    user: AuthenticatedUser,
+    supabase_client: AsyncClient,
+    page: list[MealResponse],
+) -> AsyncIterator[str]:
+    # Only one page of meals is held at a time, so memory use does not grow
+    # with the size of the history. Pages are read straight from the
+    # database, bypassing the meal cache.
+    if export_format == "csv":
+        # The BOM lets spreadsheet apps detect UTF-8 for the Thai names.
+        yield "\ufeff" + _format_csv_rows([EXPORT_CSV_COLUMNS])
+
+    while True:
+        if export_format == "csv":
+            yield _format_csv_rows(_csv_row(meal) for meal in page)
+        else:
+            yield "".join(meal.model_dump_json() + "\n" for meal in page)
+
+        if len(page) < EXPORT_PAGE_SIZE:
+            return
+
+        # The response has already started; a failure from here on aborts it,
+        # so the client sees an incomplete download rather than a short file.
+        page = await _read_export_page(
+            user, supabase_client, (page[-1].created_at, page[-1].id)
+        )
+
+
+async def _read_export_page(
+    user: AuthenticatedUser,
+    supabase_client: AsyncClient,
+    cursor: Optional[tuple[str, str]],
+) -> list[MealResponse]:
+    cursor_created_at, cursor_id = cursor or (None, None)
+    with SUPABASE_RPC_SECONDS.labels("get_food_analysis_results_page").time():
+        response = await supabase_client.rpc(
+            "get_food_analysis_results_page",
+            {
+                "p_user_id": user.id,
+                "p_limit": EXPORT_PAGE_SIZE,
+                "p_cursor_created_at": cursor_created_at,
+                "p_cursor_id": cursor_id,
+            },
+        ).execute()
+    return _parse_meals(response.data)
+
+
+def _csv_row(meal: MealResponse) -> list:
+    row = meal.model_dump(exclude={"food_components"})
+    # Components stay nested, as a JSON array in their own column.
+    row["food_components"] = _components_adapter.dump_json(meal.food_components).decode()
+    return [row[column] for column in EXPORT_CSV_COLUMNS]
+
+
+def _format_csv_rows(rows) -> str:
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(rows)
+    return buffer.getvalue()
+
+
+def _read_rpc(
+    user: AuthenticatedUser,
+    supabase_client: Client,
+    meal_version: int,
+    name: str,
+    params: dict,
+    parse: Callable[[Any], Any],
+):
+    """
+    Runs a read RPC for the user and parses its payload, served from the meal
+    cache when possible. Entries are keyed by the meal version the response's
+    ETag was built from, so a write made by another worker or outside the app
+    is never answered with a body cached before it.
+    """
+
+    def load():
+        with SUPABASE_RPC_SECONDS.labels(name).time():
+            data = supabase_client.rpc(name, params).execute().data
+        return parse(data)
+
+    return meal_cache.get_or_load(
+        user.id, (meal_version, name, tuple(sorted(params.items()))), load
+    )
+
+
+def _parse_meals(data: Optional[list]) -> list[MealResponse]:
+    return _meals_adapter.validate_python(data or [])
+
+
+def encode_cursor(created_at: str, id: str) -> str:
+    raw = f"{created_at}|{id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[str, str]:
+    """Returns the (created_at, id) of a cursor, or raises a 400 if it is invalid."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        created_at, id = raw.split("|")
+        datetime.fromisoformat(created_at)
+        UUID(id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor.")
+    return created_at, id
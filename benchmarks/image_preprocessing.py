@@ -0,0 +1,111 @@
+"""
+Micro-benchmark for the model preprocessing stage in utils.image_utils.
+
+Compares sending the original upload to Gemini (full-resolution decode for
+validation and thumbnailing, original bytes on the wire) against load_image
+(draft-mode decode, downscaled re-encode without EXIF).
+
+    python -m benchmarks.image_preprocessing [photo.jpg ...] [--uplink-mbps 10]
+
+Without paths, synthetic phone-sized photos are generated.
+"""
+
+import argparse
+import statistics
+import time
+from io import BytesIO
+from pathlib import Path
+
+from PIL import Image, ImageFilter
+
+from core.config import settings
+from utils.image_utils import load_image
+
+
+def _synthetic_photo(width: int, height: int, seed: int) -> bytes:
+    """A noisy gradient, which compresses roughly like a real photo."""
+    noise = Image.effect_noise((width, height), 64 + seed).filter(
+        ImageFilter.GaussianBlur(1)
+    )
+    gradient = Image.linear_gradient("L").resize((width, height))
+    mirrored = noise.transpose(Image.Transpose.FLIP_LEFT_RIGHT)
+    image = Image.merge("RGB", (noise, gradient, mirrored))
+    buffer = BytesIO()
+    image.save(buffer, format="JPEG", quality=92)
+    return buffer.getvalue()
+
+
+def _baseline(data: bytes) -> bytes:
+    """The previous path: full decode and 256px thumbnail, original bytes sent."""
+    with Image.open(BytesIO(data)) as img:
+        img.load()
+        image_format = img.format
+        img.thumbnail((256, 256))
+        img.save(BytesIO(), format=image_format)
+    return data
+
+
+def _time_ms(func, *args, repeat: int, **kwargs) -> tuple[float, object]:
+    timings = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(*args, **kwargs)
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings), result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("paths", nargs="*", type=Path)
+    parser.add_argument("--uplink-mbps", type=float, default=10.0)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--max-edge", type=int, default=settings.GEMINI_IMAGE_MAX_EDGE)
+    parser.add_argument("--format", default=settings.GEMINI_IMAGE_FORMAT.upper())
+    parser.add_argument("--quality", type=int, default=settings.GEMINI_IMAGE_QUALITY)
+    args = parser.parse_args()
+
+    if args.paths:
+        images = [(path.name, path.read_bytes()) for path in args.paths]
+    else:
+        images = [
+            (f"synthetic_{w}x{h}.jpg", _synthetic_photo(w, h, i))
+            for i, (w, h) in enumerate([(1920, 1080), (3024, 4032), (4000, 3000)])
+        ]
+
+    bytes_per_ms = args.uplink_mbps * 1_000_000 / 8 / 1000
+
+    print(
+        f"{'image':<28}{'orig KB':>10}{'model KB':>10}{'saved KB':>10}"
+        f"{'base ms':>10}{'prep ms':>10}{'upload ms saved':>17}{'net ms saved':>14}"
+    )
+    for name, data in images:
+        content_type = "image/png" if name.lower().endswith(".png") else "image/jpeg"
+
+        baseline_ms, _ = _time_ms(_baseline, data, repeat=args.repeat)
+        prep_ms, payload = _time_ms(
+            load_image,
+            data,
+            content_type,
+            repeat=args.repeat,
+            model_max_edge=args.max_edge,
+            model_format=args.format,
+            model_quality=args.quality,
+        )
+        if payload is None:
+            print(f"{name:<28}not a valid image")
+            continue
+
+        saved_bytes = len(data) - len(payload.model_data)
+        upload_saved_ms = saved_bytes / bytes_per_ms
+        net_saved_ms = upload_saved_ms + baseline_ms - prep_ms
+
+        print(
+            f"{name:<28}{len(data) / 1024:>10.1f}{len(payload.model_data) / 1024:>10.1f}"
+            f"{saved_bytes / 1024:>10.1f}{baseline_ms:>10.1f}{prep_ms:>10.1f}"
+            f"{upload_saved_ms:>17.1f}{net_saved_ms:>14.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,358 @@
+"""
+Offline load test of the API against local stand-ins for Gemini and Supabase.
+
+    python -m benchmarks.load [--scenario mixed] [--concurrency 16]
+        [--duration 30] [--output run.json] [--baseline previous.json]
+
+The app runs in-process behind an ASGI transport, with its lifespan, process
+pool and middleware, but genai.Client is replaced by FakeGemini and the
+Supabase HTTP clients by FakeSupabase, so no quota is spent and no project is
+touched. A fixed number of workers send requests back to back; throughput and
+p50/p95/p99 latency are reported per endpoint as JSON. With --baseline, the
+run exits with status 1 when an endpoint's p95 latency or throughput is worse
+than in the baseline report by more than --max-regression.
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import os
+import sys
+import tempfile
+import time
+from collections import Counter, defaultdict
+from dataclasses import asdict
+from datetime import datetime, timedelta, timezone
+from io import BytesIO
+from random import Random
+
+SCENARIOS = {
+    "analyze": {"analyze": 1},
+    "meals": {"meals_page": 4, "meals_by_date": 2, "meals_summary": 2, "meal_by_id": 2},
+    "auth": {"login": 2, "me": 3, "signup": 1},
+    "mixed": {
+        "analyze": 2,
+        "meals_page": 4,
+        "meals_by_date": 2,
+        "meals_summary": 2,
+        "meal_by_id": 2,
+        "login": 1,
+        "me": 2,
+    },
+}
+
+PASSWORD = "Benchmark-password-1"
+
+
+def _configure_environment() -> None:
+    # Settings are read when core.config is imported, so this runs before any
+    # app module is loaded. Values already set in the environment win.
+    state_dir = tempfile.mkdtemp(prefix="load-test-")
+    defaults = {
+        "SUPABASE_URL": "http://supabase.local",
+        "SUPABASE_KEY": "load-test-service-key",
+        "SUPABASE_JWT_SECRET": "load-test-jwt-secret-0123456789abcdef",
+        "GEMINI_API_KEY": "load-test-gemini-key",
+        "ANALYSIS_JOB_DB_PATH": os.path.join(state_dir, "analysis_jobs.db"),
+        # Every analyze request should reach Gemini, not the result cache.
+        "ANALYSIS_CACHE_ENABLED": "false",
+    }
+    for name, value in defaults.items():
+        os.environ.setdefault(name, value)
+
+
+def _synthetic_images(count: int, rng: Random) -> list[bytes]:
+    """Distinct phone-photo-sized JPEGs, so no two uploads share an analysis."""
+    from PIL import Image, ImageDraw
+
+    images = []
+    for _ in range(count):
+        image = Image.effect_noise((1600, 1200), 48).convert("RGB")
+        draw = ImageDraw.Draw(image)
+        for _ in range(12):
+            x, y = rng.randrange(1400), rng.randrange(1000)
+            color = tuple(rng.randrange(256) for _ in range(3))
+            draw.ellipse((x, y, x + rng.randrange(50, 400), y + rng.randrange(50, 400)), fill=color)
+        buffer = BytesIO()
+        image.save(buffer, format="JPEG", quality=85)
+        images.append(buffer.getvalue())
+    return images
+
+
+class LoadTest:
+    """Holds the users, their tokens and meals, and the request mix to send."""
+
+    def __init__(self, client, fake_supabase, args: argparse.Namespace):
+        self.client = client
+        self.fake_supabase = fake_supabase
+        self.rng = Random(args.seed)
+        self.weights = SCENARIOS[args.scenario]
+        self.images = _synthetic_images(args.images, self.rng) if "analyze" in self.weights else []
+
+        self.users = []
+        for index in range(args.users):
+            email = f"load-{index}@example.com"
+            user_id = fake_supabase.create_user(email, PASSWORD)
+            fake_supabase.seed_meals(user_id, args.meals_per_user)
+            token = fake_supabase.access_token(email, ttl=24 * 3600)
+            self.users.append(
+                {
+                    "email": email,
+                    "headers": {"Authorization": f"Bearer {token}"},
+                    "meal_ids": [meal["id"] for meal in fake_supabase.meals[user_id]],
+                }
+            )
+        self.signups = 0
+
+    async def send(self, name: str):
+        user = self.rng.choice(self.users)
+        headers = user["headers"]
+
+        if name == "analyze":
+            image = self.rng.choice(self.images)
+            return await self.client.post(
+                "/api/v1/analyze",
+                headers=headers,
+                files={"file": ("meal.jpg", image, "image/jpeg")},
+            )
+        if name == "meals_page":
+            return await self.client.get("/api/v1/meals", headers=headers, params={"limit": 20})
+        if name == "meals_by_date":
+            day = datetime.now(timezone.utc) - timedelta(days=self.rng.randrange(90))
+            return await self.client.get(
+                "/api/v1/meals",
+                headers=headers,
+                params={"date": day.strftime("%Y-%m-%d"), "timezone": "Asia/Bangkok"},
+            )
+        if name == "meals_summary":
+            today = datetime.now(timezone.utc).date()
+            return await self.client.get(
+                "/api/v1/meals/summary",
+                headers=headers,
+                params={
+                    "from": (today - timedelta(days=29)).isoformat(),
+                    "to": today.isoformat(),
+                    "timezone": "Asia/Bangkok",
+                },
+            )
+        if name == "meal_by_id":
+            return await self.client.get(
+                "/api/v1/meals/:id",
+                headers=headers,
+                params={"id": self.rng.choice(user["meal_ids"])},
+            )
+        if name == "login":
+            return await self.client.post(
+                "/api/v1/login", json={"email": user["email"], "password": PASSWORD}
+            )
+        if name == "me":
+            return await self.client.get("/api/v1/me", headers=headers)
+        if name == "signup":
+            self.signups += 1
+            return await self.client.post(
+                "/api/v1/signup",
+                json={"email": f"signup-{self.signups}@example.com", "password": PASSWORD},
+            )
+        raise ValueError(f"Unknown request {name!r}")
+
+    async def run(self, concurrency: int, duration: float, requests: int | None) -> dict:
+        names = list(self.weights)
+        weights = list(self.weights.values())
+        timings: dict[str, list[float]] = defaultdict(list)
+        statuses: dict[str, Counter] = defaultdict(Counter)
+        sent = 0
+        deadline = time.perf_counter() + duration
+
+        async def worker():
+            nonlocal sent
+            while (sent < requests) if requests else (time.perf_counter() < deadline):
+                sent += 1
+                name = self.rng.choices(names, weights)[0]
+                start = time.perf_counter()
+                try:
+                    status = (await self.send(name)).status_code
+                except Exception as e:
+                    status = type(e).__name__
+                timings[name].append((time.perf_counter() - start) * 1000)
+                statuses[name][status] += 1
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+
+        endpoints = {
+            name: _summarize(timings[name], statuses[name], elapsed) for name in sorted(timings)
+        }
+        total = _summarize(
+            [timing for values in timings.values() for timing in values],
+            sum(statuses.values(), Counter()),
+            elapsed,
+        )
+        return {"elapsed_s": round(elapsed, 3), "total": total, "endpoints": endpoints}
+
+
+def _percentile(ordered: list[float], q: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    return ordered[max(0, math.ceil(q * len(ordered)) - 1)]
+
+
+def _summarize(timings: list[float], statuses: Counter, elapsed: float) -> dict:
+    ordered = sorted(timings)
+    # Server errors and failed requests count as errors; a 4xx such as a
+    # non-food rejection is an expected answer.
+    errors = sum(
+        count
+        for status, count in statuses.items()
+        if not isinstance(status, int) or status >= 500
+    )
+    return {
+        "requests": len(ordered),
+        "errors": errors,
+        "statuses": {str(status): count for status, count in sorted(statuses.items(), key=str)},
+        "throughput_rps": round(len(ordered) / elapsed, 2),
+        "latency_ms": {
+            "p50": round(_percentile(ordered, 0.50), 2),
+            "p95": round(_percentile(ordered, 0.95), 2),
+            "p99": round(_percentile(ordered, 0.99), 2),
+            "mean": round(sum(ordered) / len(ordered), 2),
+            "max": round(ordered[-1], 2),
+        },
+    }
+
+
+def _regressions(report: dict, baseline: dict, max_regression: float) -> list[str]:
+    """Lists the endpoints whose p95 or throughput got worse than allowed."""
+    found = []
+    for name, current in report["endpoints"].items():
+        previous = baseline.get("endpoints", {}).get(name)
+        if previous is None:
+            continue
+        p95, previous_p95 = current["latency_ms"]["p95"], previous["latency_ms"]["p95"]
+        if p95 > previous_p95 * (1 + max_regression):
+            found.append(f"{name}: p95 {previous_p95:.1f} -> {p95:.1f} ms")
+        rps, previous_rps = current["throughput_rps"], previous["throughput_rps"]
+        if rps < previous_rps * (1 - max_regression):
+            found.append(f"{name}: throughput {previous_rps:.1f} -> {rps:.1f} req/s")
+    return found
+
+
+def _print_table(report: dict) -> None:
+    print(
+        f"{'endpoint':<16}{'requests':>10}{'errors':>8}{'req/s':>9}"
+        f"{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}",
+        file=sys.stderr,
+    )
+    rows = {**report["endpoints"], "total": report["total"]}
+    for name, row in rows.items():
+        latency = row["latency_ms"]
+        print(
+            f"{name:<16}{row['requests']:>10}{row['errors']:>8}{row['throughput_rps']:>9.1f}"
+            f"{latency['p50']:>9.1f}{latency['p95']:>9.1f}{latency['p99']:>9.1f}",
+            file=sys.stderr,
+        )
+
+
+async def _run(args: argparse.Namespace) -> dict:
+    import httpx
+
+    from api.v1.services import gemini_service
+    from benchmarks.load.fake_gemini import FakeGemini, parse_latency
+    from benchmarks.load.fake_supabase import FakeSupabase
+    from core.logging import log_listener
+    from main import app, lifespan
+
+    # One JSON log line per request would dominate the run otherwise.
+    devnull = open(os.devnull, "w")
+    for handler in log_listener.handlers:
+        handler.setStream(devnull)
+
+    fake_gemini = FakeGemini(
+        latency=parse_latency(args.gemini_latency),
+        throttle_rate=args.gemini_throttle_rate,
+        error_rate=args.gemini_error_rate,
+        non_food_rate=args.non_food_rate,
+        seed=args.seed,
+    )
+    gemini_service.client = fake_gemini
+    fake_supabase = FakeSupabase(latency=parse_latency(args.supabase_latency), seed=args.seed)
+    fake_supabase.install()
+
+    async with lifespan(app):
+        async with httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=app), base_url="http://load-test", timeout=None
+        ) as client:
+            load_test = LoadTest(client, fake_supabase, args)
+            for _ in range(args.warmup):
+                await load_test.send(load_test.rng.choice(list(load_test.weights)))
+            results = await load_test.run(args.concurrency, args.duration, args.requests)
+
+    return {
+        "scenario": args.scenario,
+        "concurrency": args.concurrency,
+        "config": {
+            "users": args.users,
+            "meals_per_user": args.meals_per_user,
+            "gemini_latency": args.gemini_latency,
+            "gemini_throttle_rate": args.gemini_throttle_rate,
+            "gemini_error_rate": args.gemini_error_rate,
+            "non_food_rate": args.non_food_rate,
+            "supabase_latency": args.supabase_latency,
+            "seed": args.seed,
+        },
+        "started_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        **results,
+        "fakes": {
+            "gemini": asdict(fake_gemini.stats),
+            "supabase_calls": dict(sorted(fake_supabase.calls.items())),
+        },
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--scenario", choices=sorted(SCENARIOS), default="mixed")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=30, help="seconds to run")
+    parser.add_argument("--requests", type=int, help="stop after this many requests instead")
+    parser.add_argument("--warmup", type=int, default=20, help="unrecorded requests sent first")
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--meals-per-user", type=int, default=500)
+    parser.add_argument("--images", type=int, default=32, help="distinct images to upload")
+    parser.add_argument(
+        "--gemini-latency",
+        default="lognormal:2.5,0.4",
+        help="fixed:S, uniform:LOW,HIGH, normal:MEAN,STDDEV or lognormal:MEDIAN,SIGMA",
+    )
+    parser.add_argument("--gemini-throttle-rate", type=float, default=0.0)
+    parser.add_argument("--gemini-error-rate", type=float, default=0.0)
+    parser.add_argument("--non-food-rate", type=float, default=0.05)
+    parser.add_argument("--supabase-latency", default="lognormal:0.01,0.5")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="-", help="where to write the JSON report")
+    parser.add_argument("--baseline", help="JSON report of an earlier run to compare with")
+    parser.add_argument("--max-regression", type=float, default=0.2)
+    args = parser.parse_args()
+
+    _configure_environment()
+    report = asyncio.run(_run(args))
+    _print_table(report)
+
+    output = json.dumps(report, indent=2)
+    if args.output == "-":
+        print(output)
+    else:
+        with open(args.output, "w") as file:
+            file.write(output + "\n")
+
+    if args.baseline:
+        with open(args.baseline) as file:
+            regressions = _regressions(report, json.load(file), args.max_regression)
+        for regression in regressions:
+            print(f"Regression: {regression}", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
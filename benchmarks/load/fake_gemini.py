@@ -0,0 +1,181 @@
+"""
+Stand-in for genai.Client that answers like Gemini without calling it.
+
+Only the calls gemini_service makes are implemented: generate_content,
+generate_content_stream and the cached content calls of client.aio.
+"""
+
+import asyncio
+import json
+import math
+from dataclasses import dataclass, field
+from random import Random
+from typing import AsyncIterator, Callable
+
+from google.genai import errors
+
+Latency = Callable[[Random], float]
+
+
+def parse_latency(spec: str) -> Latency:
+    """
+    Parses a latency distribution in seconds:
+    fixed:S, uniform:LOW,HIGH, normal:MEAN,STDDEV or lognormal:MEDIAN,SIGMA.
+    """
+    kind, _, args = spec.partition(":")
+    try:
+        values = [float(value) for value in args.split(",")] if args else []
+        if kind == "fixed" and len(values) == 1:
+            return lambda rng: values[0]
+        if kind == "uniform" and len(values) == 2:
+            return lambda rng: rng.uniform(values[0], values[1])
+        if kind == "normal" and len(values) == 2:
+            return lambda rng: max(0.0, rng.gauss(values[0], values[1]))
+        if kind == "lognormal" and len(values) == 2:
+            return lambda rng: rng.lognormvariate(math.log(values[0]), values[1])
+    except ValueError:
+        pass
+    raise ValueError(f"Invalid latency distribution: {spec!r}")
+
+
+@dataclass
+class FakeGeminiStats:
+    calls: int = 0
+    throttled: int = 0
+    server_errors: int = 0
+    non_food: int = 0
+
+
+@dataclass
+class FakeGemini:
+    """
+    Samples a latency for every call, then fails it with a 429 or a 503 at the
+    configured rates, or answers with a random food (or non-food) analysis.
+    """
+
+    latency: Latency = field(default_factory=lambda: parse_latency("lognormal:2.5,0.4"))
+    throttle_rate: float = 0.0
+    error_rate: float = 0.0
+    non_food_rate: float = 0.0
+    seed: int = 0
+
+    def __post_init__(self):
+        self.rng = Random(self.seed)
+        self.stats = FakeGeminiStats()
+        self.aio = _Aio(_Models(self), _Caches())
+
+    def _outcome(self) -> tuple[float, Exception | None]:
+        self.stats.calls += 1
+        delay = self.latency(self.rng)
+        roll = self.rng.random()
+        if roll < self.throttle_rate:
+            self.stats.throttled += 1
+            # Throttling is answered quickly.
+            return delay / 10, errors.ClientError(
+                429, {"error": {"code": 429, "message": "Resource exhausted.", "status": "RESOURCE_EXHAUSTED"}}
+            )
+        if roll < self.throttle_rate + self.error_rate:
+            self.stats.server_errors += 1
+            return delay, errors.ServerError(
+                503, {"error": {"code": 503, "message": "The model is overloaded.", "status": "UNAVAILABLE"}}
+            )
+        return delay, None
+
+    def _analysis(self) -> str:
+        if self.rng.random() < self.non_food_rate:
+            self.stats.non_food += 1
+            return json.dumps({"is_food": False, "message": "This is not food."})
+
+        components = [
+            {
+                "name_en": f"Component {index}",
+                "name_th": f"ส่วนประกอบ {index}",
+                "calories": self.rng.randint(20, 600),
+                "protein": self.rng.randint(0, 40),
+                "carbohydrates": self.rng.randint(0, 80),
+                "fat": self.rng.randint(0, 30),
+                "fiber": self.rng.randint(0, 10),
+                "sugar": self.rng.randint(0, 20),
+            }
+            for index in range(self.rng.randint(1, 5))
+        ]
+        analysis = {
+            "is_food": True,
+            "food_name_en": "Fried rice with pork",
+            "food_name_th": "ข้าวผัดหมู",
+            "food_components": components,
+        }
+        for nutrient in ("calories", "protein", "carbohydrates", "fat", "fiber", "sugar"):
+            analysis[f"total_{nutrient}"] = sum(c[nutrient] for c in components)
+        return json.dumps(analysis, ensure_ascii=False)
+
+
+@dataclass
+class _UsageMetadata:
+    prompt_token_count: int
+    candidates_token_count: int
+    total_token_count: int
+
+
+@dataclass
+class _Response:
+    text: str
+    usage_metadata: _UsageMetadata | None = None
+
+
+def _usage(text: str) -> _UsageMetadata:
+    # An image is about 258 tokens, plus the prompt; roughly 4 characters a token.
+    output_tokens = len(text) // 4
+    return _UsageMetadata(300, output_tokens, 300 + output_tokens)
+
+
+@dataclass
+class _CachedContent:
+    name: str
+
+
+class _Models:
+    def __init__(self, gemini: FakeGemini):
+        self.gemini = gemini
+
+    async def generate_content(self, model, contents, config) -> _Response:
+        delay, error = self.gemini._outcome()
+        await asyncio.sleep(delay)
+        if error is not None:
+            raise error
+        text = self.gemini._analysis()
+        return _Response(text, _usage(text))
+
+    async def generate_content_stream(self, model, contents, config) -> AsyncIterator[_Response]:
+        delay, error = self.gemini._outcome()
+        text = self.gemini._analysis() if error is None else ""
+        return self._stream(delay, error, text)
+
+    @staticmethod
+    async def _stream(delay: float, error: Exception | None, text: str) -> AsyncIterator[_Response]:
+        # About a third of the time passes before the first token.
+        await asyncio.sleep(delay / 3)
+        if error is not None:
+            raise error
+
+        chunks = [text[index : index + 64] for index in range(0, len(text), 64)]
+        for index, chunk in enumerate(chunks):
+            await asyncio.sleep(delay * 2 / 3 / len(chunks))
+            yield _Response(chunk, _usage(text) if index == len(chunks) - 1 else None)
+
+
+class _Caches:
+    async def create(self, model, config) -> _CachedContent:
+        return _CachedContent("cachedContents/benchmark")
+
+    async def update(self, name, config) -> _CachedContent:
+        return _CachedContent(name)
+
+    async def delete(self, name) -> None:
+        return None
+
+
+@dataclass
+class _Aio:
+    models: _Models
+    caches: _Caches
@@ -0,0 +1,314 @@
+"""
+In-memory stand-in for the Supabase project, served over httpx mock
+transports so the real supabase clients, and everything the services do with
+them, run unchanged.
+
+Covers the auth, storage and PostgREST calls the API makes: sign up, sign in,
+token refresh, sign out and user lookup; image upload and removal; the meal
+RPCs and the meal_versions table.
+"""
+
+import asyncio
+import json
+import threading
+import time
+import uuid
+from bisect import bisect_left, insort
+from collections import defaultdict
+from datetime import date, datetime, timedelta, timezone
+from random import Random
+from urllib.parse import parse_qs
+from zoneinfo import ZoneInfo
+
+import httpx
+import jwt
+
+from benchmarks.load.fake_gemini import Latency, parse_latency
+from core import supabase as core_supabase
+from core.config import settings
+
+NUTRIENTS = ("calories", "protein", "carbohydrates", "fat", "fiber", "sugar")
+
+
+def _meal_key(meal: dict) -> tuple[str, str]:
+    return meal["created_at"], meal["id"]
+
+
+class FakeSupabase:
+    """
+    Keeps users, sessions, stored images and meals in memory. Every request
+    waits for a latency sampled from the given distribution before it is
+    answered, on a thread for the sync client and on the event loop for the
+    async one, like a network round trip would.
+    """
+
+    def __init__(self, latency: Latency | None = None, seed: int = 0):
+        self.latency = latency or parse_latency("lognormal:0.01,0.5")
+        self.rng = Random(seed)
+        self.jwt_secret = settings.SUPABASE_JWT_SECRET
+
+        self.users: dict[str, dict] = {}
+        self.passwords: dict[str, str] = {}
+        self.refresh_tokens: dict[str, str] = {}
+        self.objects: dict[str, int] = {}
+        # Each user's meals, oldest first, ordered like the database index.
+        self.meals: dict[str, list[dict]] = defaultdict(list)
+        self.meals_by_id: dict[str, dict] = {}
+        self.versions: dict[str, int] = defaultdict(int)
+        self.calls: dict[str, int] = defaultdict(int)
+
+        self._lock = threading.Lock()
+
+    def install(self) -> None:
+        """Makes core.supabase build its HTTP clients on this fake."""
+        core_supabase._build_http_client = lambda: httpx.Client(
+            transport=httpx.MockTransport(self._handle_sync),
+            timeout=settings.SUPABASE_TIMEOUT,
+        )
+        core_supabase._build_async_http_client = lambda: httpx.AsyncClient(
+            transport=httpx.MockTransport(self._handle_async),
+            timeout=settings.SUPABASE_TIMEOUT,
+        )
+
+    def create_user(self, email: str, password: str) -> str:
+        with self._lock:
+            return self._create_user(email, password)
+
+    def _create_user(self, email: str, password: str) -> str:
+        user = {
+            "id": str(uuid.uuid4()),
+            "aud": "authenticated",
+            "role": "authenticated",
+            "email": email,
+            "app_metadata": {"provider": "email", "providers": ["email"]},
+            "user_metadata": {"email": email, "email_verified": True},
+            "identities": [],
+            "created_at": datetime.now(timezone.utc).isoformat(),
+        }
+        self.users[email] = user
+        self.passwords[email] = password
+        return user["id"]
+
+    def access_token(self, email: str, ttl: int = 3600) -> str:
+        user = self.users[email]
+        now = int(time.time())
+        return jwt.encode(
+            {
+                "sub": user["id"],
+                "aud": "authenticated",
+                "role": "authenticated",
+                "email": email,
+                "app_metadata": user["app_metadata"],
+                "user_metadata": user["user_metadata"],
+                "iat": now,
+                "exp": now + ttl,
+            },
+            self.jwt_secret,
+            algorithm="HS256",
+        )
+
+    def seed_meals(self, user_id: str, count: int, days: int = 90) -> None:
+        """Adds count meals to the user, spread over the last `days` days."""
+        now = datetime.now(timezone.utc)
+        with self._lock:
+            for _ in range(count):
+                created_at = now - timedelta(seconds=self.rng.uniform(0, days * 86400))
+                components = [
+                    {
+                        "id": str(uuid.uuid4()),
+                        "name_en": f"Component {index}",
+                        "name_th": f"ส่วนประกอบ {index}",
+                        **{nutrient: self.rng.randint(0, 200) for nutrient in NUTRIENTS},
+                    }
+                    for index in range(self.rng.randint(1, 5))
+                ]
+                self._insert_meal(
+                    {
+                        "_id": str(uuid.uuid4()),
+                        "_user_id": user_id,
+                        "_food_name_en": "Fried rice with pork",
+                        "_food_name_th": "ข้าวผัดหมู",
+                        "_image_url": "https://example.com/seeded.jpg",
+                        "_created_at": created_at.isoformat(),
+                        "_food_components": components,
+                    }
+                )
+
+    def _handle_sync(self, request: httpx.Request) -> httpx.Response:
+        time.sleep(self.latency(self.rng))
+        return self._handle(request)
+
+    async def _handle_async(self, request: httpx.Request) -> httpx.Response:
+        await asyncio.sleep(self.latency(self.rng))
+        return self._handle(request)
+
+    def _handle(self, request: httpx.Request) -> httpx.Response:
+        path = request.url.path
+        query = {key: values[0] for key, values in parse_qs(request.url.query.decode()).items()}
+        route = f"{request.method} {path}"
+
+        with self._lock:
+            # Stored object names are unique, so storage calls share one count.
+            self.calls[route.split("/user-images")[0]] += 1
+            if path.startswith("/auth/v1/"):
+                return self._auth(request, path.removeprefix("/auth/v1/"), query)
+            if path.startswith("/storage/v1/object/"):
+                return self._storage(request, path.removeprefix("/storage/v1/object/"))
+            if path.startswith("/rest/v1/rpc/"):
+                return self._rpc(path.removeprefix("/rest/v1/rpc/"), json.loads(request.content or b"{}"))
+            if route == "GET /rest/v1/meal_versions":
+                user_id = query.get("user_id", "").removeprefix("eq.")
+                version = self.versions.get(user_id)
+                return httpx.Response(200, json=[{"version": version}] if version else [])
+
+        return _error(404, f"No fake for {route}")
+
+    def _auth(self, request: httpx.Request, endpoint: str, query: dict) -> httpx.Response:
+        if endpoint == "signup":
+            body = json.loads(request.content)
+            if body["email"] in self.users:
+                # Supabase answers a repeated sign up with an obfuscated user.
+                return httpx.Response(200, json={**self.users[body["email"]], "user_metadata": {}})
+            self._create_user(body["email"], body["password"])
+            return httpx.Response(200, json=self.users[body["email"]])
+
+        if endpoint == "token":
+            body = json.loads(request.content)
+            if query.get("grant_type") == "password":
+                email = body.get("email")
+                if email not in self.users or self.passwords[email] != body.get("password"):
+                    return _auth_error(400, "invalid_credentials", "Invalid login credentials")
+            else:
+                email = self.refresh_tokens.pop(body.get("refresh_token"), None)
+                if email is None:
+                    return _auth_error(400, "refresh_token_not_found", "Invalid Refresh Token")
+            return httpx.Response(200, json=self._session(email))
+
+        if endpoint == "logout":
+            return httpx.Response(204)
+
+        if endpoint == "user":
+            token = request.headers.get("authorization", "").removeprefix("Bearer ")
+            try:
+                claims = jwt.decode(token, self.jwt_secret, algorithms=["HS256"], audience="authenticated")
+            except jwt.PyJWTError:
+                return _auth_error(401, "bad_jwt", "invalid JWT")
+            return httpx.Response(200, json=self.users[claims["email"]])
+
+        return _error(404, f"No fake for auth endpoint {endpoint}")
+
+    def _session(self, email: str) -> dict:
+        refresh_token = uuid.uuid4().hex
+        self.refresh_tokens[refresh_token] = email
+        return {
+            "access_token": self.access_token(email),
+            "refresh_token": refresh_token,
+            "token_type": "bearer",
+            "expires_in": 3600,
+            "expires_at": int(time.time()) + 3600,
+            "user": self.users[email],
+        }
+
+    def _storage(self, request: httpx.Request, path: str) -> httpx.Response:
+        if request.method == "POST":
+            self.objects[path] = len(request.content)
+            return httpx.Response(200, json={"Key": path, "Id": str(uuid.uuid4())})
+        if request.method == "DELETE":
+            bucket = path.strip("/")
+            removed = []
+            for name in json.loads(request.content)["prefixes"]:
+                if self.objects.pop(f"{bucket}/{name}", None) is not None:
+                    removed.append({"name": name, "bucket_id": bucket})
+            return httpx.Response(200, json=removed)
+        return _error(404, f"No fake for storage {request.method}")
+
+    def _rpc(self, name: str, params: dict) -> httpx.Response:
+        if name == "insert_food_analysis_with_components":
+            self._insert_meal(params)
+            return httpx.Response(200, json=None)
+
+        if name == "insert_food_analyses_with_components":
+            for meal in params["_meals"]:
+                self._insert_meal(meal)
+            return httpx.Response(200, json=None)
+
+        if name == "get_food_analysis_result":
+            return httpx.Response(200, json=self.meals_by_id.get(params["p_id"]))
+
+        if name == "get_food_analysis_results_page":
+            meals = self.meals[params["p_user_id"]]
+            end = len(meals)
+            if params.get("p_cursor_created_at"):
+                end = bisect_left(
+                    meals,
+                    (params["p_cursor_created_at"], params["p_cursor_id"]),
+                    key=_meal_key,
+                )
+            start = max(0, end - params["p_limit"])
+            return httpx.Response(200, json=meals[start:end][::-1])
+
+        if name == "get_food_analysis_results_by_user_and_date":
+            meals = self._between(
+                params["p_user_id"], params["p_start_date"], params["p_end_date"]
+            )
+            return httpx.Response(200, json=meals[::-1])
+
+        if name == "get_daily_nutrition_totals":
+            return httpx.Response(200, json=self._daily_totals(params))
+
+        return _error(404, f"No fake for RPC {name}")
+
+    def _insert_meal(self, params: dict) -> None:
+        components = params["_food_components"]
+        meal = {
+            "id": params["_id"],
+            "user_id": params["_user_id"],
+            "image_url": params["_image_url"],
+            "food_name_en": params["_food_name_en"],
+            "food_name_th": params["_food_name_th"],
+            "food_components": components,
+            **{
+                f"total_{nutrient}": sum(component[nutrient] for component in components)
+                for nutrient in NUTRIENTS
+            },
+            "created_at": params["_created_at"],
+        }
+        insort(self.meals[meal["user_id"]], meal, key=_meal_key)
+        self.meals_by_id[meal["id"]] = meal
+        self.versions[meal["user_id"]] += 1
+
+    def _between(self, user_id: str, start: str, end: str) -> list[dict]:
+        # Timestamps are stored as UTC ISO strings, which sort chronologically.
+        meals = self.meals[user_id]
+        low = bisect_left(meals, start, key=lambda meal: meal["created_at"])
+        high = bisect_left(meals, end, key=lambda meal: meal["created_at"])
+        return meals[low:high]
+
+    def _daily_totals(self, params: dict) -> list[dict]:
+        tz = ZoneInfo(params["p_timezone"])
+        first = date.fromisoformat(params["p_from"])
+        last = date.fromisoformat(params["p_to"])
+        start = datetime.combine(first, datetime.min.time(), tz).astimezone(timezone.utc)
+        end = datetime.combine(last + timedelta(days=1), datetime.min.time(), tz).astimezone(timezone.utc)
+
+        days: dict[str, dict] = {}
+        for meal in self._between(params["p_user_id"], start.isoformat(), end.isoformat()):
+            day = datetime.fromisoformat(meal["created_at"]).astimezone(tz).date().isoformat()
+            totals = days.setdefault(
+                day,
+                {"date": day, "meal_count": 0, **{f"total_{n}": 0 for n in NUTRIENTS}},
+            )
+            totals["meal_count"] += 1
+            for nutrient in NUTRIENTS:
+                totals[f"total_{nutrient}"] += meal[f"total_{nutrient}"]
+        return [days[day] for day in sorted(days)]
+
+
+def _error(status_code: int, message: str) -> httpx.Response:
+    return httpx.Response(status_code, json={"message": message, "code": str(status_code)})
+
+
+def _auth_error(status_code: int, code: str, message: str) -> httpx.Response:
+    return httpx.Response(
+        status_code, json={"code": status_code, "error_code": code, "msg": message}
+    )
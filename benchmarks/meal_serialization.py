@@ -0,0 +1,170 @@
+"""
+Micro-benchmark for turning a meal listing RPC payload into a response body.
+
+Compares the previous path (a MealResponse built field by field from dicts,
+then validated and serialized again by FastAPI against response_model)
+with the current one (one TypeAdapter pass, rendered by ModelJSONResponse).
+
+    python -m benchmarks.meal_serialization [--sizes 1000 10000 100000]
+
+The legacy path is measured both with the response_model handling of the
+installed FastAPI and with the jsonable_encoder + json.dumps path of older
+releases. "current (cached)" renders models the meal cache already holds.
+If orjson is installed, dumping the raw payload is shown as the floor that
+passing the jsonb through untouched could reach.
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+import uuid
+from random import Random
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_model_field
+
+from api.v1.schemas.meals import ListMealResponse, MealResponse
+from api.v1.services.meals_service import _parse_meals
+from utils.responses import ModelJSONResponse
+
+
+def _payload(rng: Random, count: int, components: int) -> list[dict]:
+    """Rows shaped like the output of get_food_analysis_results_page."""
+    meals = []
+    for index in range(count):
+        food_components = [
+            {
+                "id": str(uuid.UUID(int=rng.getrandbits(128), version=4)),
+                "name_en": f"Component {c}",
+                "name_th": f"ส่วนประกอบ {c}",
+                "calories": rng.randint(0, 600),
+                "protein": rng.randint(0, 40),
+                "carbohydrates": rng.randint(0, 80),
+                "fat": rng.randint(0, 30),
+                "fiber": rng.randint(0, 10),
+                "sugar": rng.randint(0, 20),
+            }
+            for c in range(components)
+        ]
+        meal = {
+            "id": str(uuid.UUID(int=rng.getrandbits(128), version=4)),
+            "user_id": "00000000-0000-0000-0000-000000000001",
+            "image_url": f"https://example.com/meals/{index}.jpg",
+            "food_name_en": f"Meal {index}",
+            "food_name_th": f"มื้อ {index}",
+            "food_components": food_components,
+            "created_at": f"2024-01-01T{index % 24:02d}:00:00+00:00",
+        }
+        for field in ("calories", "protein", "carbohydrates", "fat", "fiber", "sugar"):
+            meal[f"total_{field}"] = sum(c[field] for c in food_components)
+        meals.append(meal)
+    return meals
+
+
+def _build_field_by_field(payload: list[dict]) -> ListMealResponse:
+    """The previous meals_service code."""
+    return ListMealResponse(
+        meals=[
+            MealResponse(
+                id=meal.get("id"),
+                image_url=meal.get("image_url"),
+                food_name_en=meal.get("food_name_en"),
+                food_name_th=meal.get("food_name_th"),
+                food_components=meal.get("food_components", []),
+                total_calories=meal.get("total_calories"),
+                total_protein=meal.get("total_protein"),
+                total_carbohydrates=meal.get("total_carbohydrates"),
+                total_fat=meal.get("total_fat"),
+                total_fiber=meal.get("total_fiber"),
+                total_sugar=meal.get("total_sugar"),
+                created_at=meal.get("created_at"),
+            )
+            for meal in payload
+        ]
+    )
+
+
+def _legacy_response_model(payload: list[dict]) -> bytes:
+    content = asyncio.run(
+        serialize_response(
+            field=_RESPONSE_FIELD,
+            response_content=_build_field_by_field(payload),
+            dump_json=True,
+        )
+    )
+    return content
+
+
+def _legacy_json_encoder(payload: list[dict]) -> bytes:
+    content = jsonable_encoder(_build_field_by_field(payload))
+    return JSONResponse(content).body
+
+
+def _current(payload: list[dict]) -> bytes:
+    return ModelJSONResponse(ListMealResponse(meals=_parse_meals(payload))).body
+
+
+def _current_cached(meals: list[MealResponse]) -> bytes:
+    return ModelJSONResponse(ListMealResponse(meals=meals)).body
+
+
+def _orjson_passthrough(payload: list[dict]) -> bytes:
+    import orjson
+
+    return orjson.dumps({"meals": payload, "next_cursor": None})
+
+
+_RESPONSE_FIELD = create_model_field(name="Response", type_=ListMealResponse)
+
+
+def _time_ms(func, payload, repeat: int) -> tuple[float, bytes]:
+    timings = []
+    body = b""
+    for _ in range(repeat):
+        start = time.perf_counter()
+        body = func(payload)
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings), body
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", nargs="+", type=int, default=[1000, 10000, 100000])
+    parser.add_argument("--components", type=int, default=4, help="components per meal")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    paths = [
+        ("legacy (response_model)", _legacy_response_model),
+        ("legacy (jsonable_encoder)", _legacy_json_encoder),
+        ("current", _current),
+        ("current (cached)", _current_cached),
+    ]
+    try:
+        import orjson  # noqa: F401
+
+        paths.append(("orjson pass-through", _orjson_passthrough))
+    except ImportError:
+        pass
+
+    rng = Random(args.seed)
+    print(f"{'meals':>8}  {'path':<28}{'median ms':>12}{'body KiB':>12}")
+    for size in args.sizes:
+        payload = _payload(rng, size, args.components)
+        expected = _current(payload)
+        for name, func in paths:
+            data = _parse_meals(payload) if name == "current (cached)" else payload
+            func(data)  # warm up
+            median, body = _time_ms(func, data, args.repeat)
+            if name != "orjson pass-through":
+                # Every path must produce the same document.
+                assert body == expected
+            print(f"{size:>8}  {name:<28}{median:>12.1f}{len(body) / 1024:>12.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+"""
+Benchmark of the per-request overhead of the request timing middleware.
+
+Compares the previous BaseHTTPMiddleware version, which formatted and wrote
+its three log lines on the event loop, with RequestTimingMiddleware in
+core.middleware, which logs one JSON line through the queue listener.
+
+    python -m benchmarks.middleware_overhead [--requests 20000]
+
+Requests are driven straight through the ASGI interface, without a server
+or sockets, and log output goes to /dev/null, so the numbers are the
+middleware and logging cost alone. Each version is also timed on a
+streaming response.
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import statistics
+import time
+
+from fastapi import FastAPI, Request
+from fastapi.responses import StreamingResponse
+from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.responses import JSONResponse
+
+from core.logging import log_listener
+from core.middleware import RequestTimingMiddleware
+
+legacy_logger = logging.getLogger("benchmarks.legacy_middleware")
+
+
+class LegacyMiddleware(BaseHTTPMiddleware):
+    """The previous core.middleware.CustomMiddleware."""
+
+    async def dispatch(self, request: Request, call_next):
+        start_time = time.time()
+
+        legacy_logger.info(
+            f"Incoming request: {request.client} {request.method} {request.url.path}"
+        )
+        legacy_logger.debug(f"Request headers: {dict(request.headers)}")
+
+        try:
+            response = await call_next(request)
+        except Exception as e:
+            legacy_logger.error(f"Error processing request: {str(e)}")
+            response = JSONResponse(
+                status_code=500, content={"detail": "Internal Server Error"}
+            )
+
+        process_time = time.time() - start_time
+
+        legacy_logger.info(f"Response status: {response.status_code}")
+        legacy_logger.info(f"Request processed in: {process_time:.4f} seconds")
+
+        response.headers["X-Processing-Time"] = str(process_time)
+
+        return response
+
+
+def _app(middleware) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/health")
+    async def health():
+        return {"status": "UP"}
+
+    @app.get("/stream")
+    async def stream():
+        async def chunks():
+            for index in range(20):
+                yield f"{index}\n"
+
+        return StreamingResponse(chunks(), media_type="text/plain")
+
+    if middleware is not None:
+        app.add_middleware(middleware)
+    return app
+
+
+def _scope(path: str) -> dict:
+    return {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "root_path": "",
+        "query_string": b"",
+        "headers": [
+            (b"host", b"localhost"),
+            (b"user-agent", b"benchmark"),
+            (b"accept", b"application/json"),
+        ],
+        "client": ("127.0.0.1", 50000),
+        "server": ("localhost", 8000),
+    }
+
+
+async def _request(app, path: str) -> None:
+    messages = [{"type": "http.request", "body": b"", "more_body": False}]
+    disconnected = asyncio.Event()
+
+    async def receive():
+        if messages:
+            return messages.pop()
+        # Like a server, block until the client goes away.
+        await disconnected.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        pass
+
+    await app(_scope(path), receive, send)
+
+
+async def _time_us(app, path: str, requests: int) -> list[float]:
+    for _ in range(200):  # warm up
+        await _request(app, path)
+
+    timings = []
+    for _ in range(requests):
+        start = time.perf_counter_ns()
+        await _request(app, path)
+        timings.append((time.perf_counter_ns() - start) / 1000)
+    return timings
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=20000)
+    args = parser.parse_args()
+
+    devnull = open(os.devnull, "w")
+
+    legacy_handler = logging.StreamHandler(devnull)
+    legacy_handler.setFormatter(
+        logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    )
+    legacy_logger.addHandler(legacy_handler)
+    legacy_logger.propagate = False
+
+    for handler in log_listener.handlers:
+        handler.setStream(devnull)
+
+    versions = [
+        ("none", _app(None)),
+        ("legacy", _app(LegacyMiddleware)),
+        ("current", _app(RequestTimingMiddleware)),
+    ]
+
+    print(f"{'path':<10}{'middleware':<12}{'p50 us':>10}{'p99 us':>10}{'overhead us':>14}")
+    for path in ("/health", "/stream"):
+        baseline = None
+        for name, app in versions:
+            timings = sorted(asyncio.run(_time_us(app, path, args.requests)))
+            p50 = statistics.median(timings)
+            p99 = timings[int(len(timings) * 0.99)]
+            baseline = p50 if baseline is None else baseline
+            print(f"{path:<10}{name:<12}{p50:>10.1f}{p99:>10.1f}{p50 - baseline:>14.1f}")
+
+
+if __name__ == "__main__":
+    main()
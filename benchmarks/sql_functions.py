@@ -0,0 +1,241 @@
+"""
+Benchmark of the meal read and insert functions in initial_schema.sql against
+their previous versions (benchmarks/sql/legacy_functions.sql).
+
+    python -m benchmarks.sql_functions --dsn postgresql://postgres@localhost/bench
+
+Point --dsn at a throwaway database: the script installs the schema, replaces
+its food tables with seeded data and leaves them there. A local server is
+enough, for example:
+
+    docker run --rm -p 5432:5432 -e POSTGRES_HOST_AUTH_METHOD=trust postgres:16
+
+Needs psycopg 3 (pip install "psycopg[binary]"). With --plans, the plans of
+the statements inside each function are printed through auto_explain, which
+needs a superuser connection.
+"""
+
+import argparse
+import json
+import statistics
+import time
+import uuid
+from pathlib import Path
+from random import Random
+
+ROOT = Path(__file__).resolve().parent.parent
+SCHEMA = ROOT / "initial_schema.sql"
+LEGACY = Path(__file__).resolve().parent / "sql" / "legacy_functions.sql"
+
+SETUP = """
+create schema if not exists auth;
+create table if not exists auth.users (id uuid primary key);
+"""
+
+SEED = """
+truncate food_components, food_analysis_results;
+
+insert into auth.users (id)
+select ('00000000-0000-0000-0000-' || lpad(to_hex(u), 12, '0'))::uuid
+from generate_series(1, %(users)s) u
+on conflict do nothing;
+
+select setseed(%(seed)s);
+
+insert into food_analysis_results (user_id, image_url, food_name_en, food_name_th, created_at, deleted_at)
+select
+  ('00000000-0000-0000-0000-' || lpad(to_hex(u), 12, '0'))::uuid,
+  'https://example.com/' || u || '/' || m || '.jpg',
+  'Meal ' || m,
+  'มื้อ ' || m,
+  timestamptz '2024-01-01' + m * interval '6 hours' + random() * interval '5 hours',
+  case when random() < 0.02 then now() end
+from generate_series(1, %(users)s) u, generate_series(1, %(meals)s) m;
+
+insert into food_components (far_id, name_en, name_th, calories, protein, carbohydrates, fat, fiber, sugar)
+select
+  far.id,
+  'Component ' || c,
+  'ส่วนประกอบ ' || c,
+  (random() * 600)::int,
+  (random() * 40)::int,
+  (random() * 80)::int,
+  (random() * 30)::int,
+  (random() * 10)::int,
+  (random() * 20)::int
+from food_analysis_results far, generate_series(1, %(components)s) c;
+
+analyze food_analysis_results;
+analyze food_components;
+"""
+
+
+def _user_id(index: int) -> str:
+    return f"00000000-0000-0000-0000-{index:012x}"
+
+
+def _components(rng: Random, count: int) -> str:
+    return json.dumps(
+        [
+            {
+                "id": str(uuid.UUID(int=rng.getrandbits(128), version=4)),
+                "name_en": f"Component {index}",
+                "name_th": f"ส่วนประกอบ {index}",
+                "calories": rng.randint(0, 600),
+                "protein": rng.randint(0, 40),
+                "carbohydrates": rng.randint(0, 80),
+                "fat": rng.randint(0, 30),
+                "fiber": rng.randint(0, 10),
+                "sugar": rng.randint(0, 20),
+            }
+            for index in range(count)
+        ]
+    )
+
+
+def _cases(conn, args, rng: Random) -> list[tuple[str, str, list[tuple]]]:
+    """(name, sql with a {fn} placeholder, parameter sets) for each function."""
+    meal_ids = [
+        row[0]
+        for row in conn.execute(
+            "select id from food_analysis_results where deleted_at is null "
+            "order by id limit 200"
+        )
+    ]
+    users = [_user_id(rng.randint(1, args.users)) for _ in range(args.repeat)]
+    days = [(user, f"2024-01-{rng.randint(2, 28):02d}") for user in users]
+
+    return [
+        (
+            "get_food_analysis_result",
+            "select {fn}(%s)",
+            [(rng.choice(meal_ids),) for _ in range(args.repeat)],
+        ),
+        (
+            "get_food_analysis_results_by_user",
+            "select {fn}(%s)",
+            [(user,) for user in users],
+        ),
+        (
+            "get_food_analysis_results_by_user_and_date",
+            "select {fn}(%s, %s::timestamptz, %s::timestamptz + interval '1 day')",
+            [(user, day, day) for user, day in days],
+        ),
+        (
+            "insert_food_analysis_with_components",
+            "select {fn}(%s, %s, 'Meal', 'มื้อ', 'https://example.com/x.jpg', now(), %s::jsonb)",
+            [
+                (str(uuid.uuid4()), user, _components(rng, args.components))
+                for user in users
+            ],
+        ),
+    ]
+
+
+def _run(conn, sql: str, params: list[tuple]) -> list[float]:
+    timings = []
+    for values in params:
+        # Inserts are rolled back so both versions see the same data.
+        with conn.transaction(force_rollback=True):
+            start = time.perf_counter()
+            conn.execute(sql, values).fetchall()
+            timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+def _buffers(conn, sql: str, values: tuple) -> int:
+    """Shared buffers touched by one call, including the function's statements."""
+    with conn.transaction(force_rollback=True):
+        plan = conn.execute(
+            "explain (analyze, buffers, format json) " + sql, values
+        ).fetchone()[0][0]["Plan"]
+    return plan.get("Shared Hit Blocks", 0) + plan.get("Shared Read Blocks", 0)
+
+
+def _print_plans(conn, sql: str, values: tuple) -> None:
+    messages: list[str] = []
+
+    def collect(notice) -> None:
+        messages.append(notice.message_primary)
+
+    conn.add_notice_handler(collect)
+    try:
+        with conn.transaction(force_rollback=True):
+            conn.execute("load 'auto_explain'")
+            conn.execute("set local auto_explain.log_min_duration = 0")
+            conn.execute("set local auto_explain.log_analyze = on")
+            conn.execute("set local auto_explain.log_buffers = on")
+            conn.execute("set local auto_explain.log_nested_statements = on")
+            conn.execute("set local client_min_messages = log")
+            conn.execute(sql, values).fetchall()
+    finally:
+        conn.remove_notice_handler(collect)
+
+    for message in messages:
+        if "plan:" in message:
+            print(message)
+            print()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--dsn", default="postgresql://postgres@localhost/postgres")
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--meals", type=int, default=1000, help="meals per user")
+    parser.add_argument("--components", type=int, default=5, help="components per meal")
+    parser.add_argument("--repeat", type=int, default=30)
+    parser.add_argument("--seed", type=float, default=0.42)
+    parser.add_argument("--plans", action="store_true")
+    parser.add_argument("--skip-seed", action="store_true")
+    args = parser.parse_args()
+
+    try:
+        import psycopg
+    except ImportError:
+        raise SystemExit('This benchmark needs psycopg: pip install "psycopg[binary]"')
+
+    with psycopg.connect(args.dsn, autocommit=True) as conn:
+        conn.execute(SETUP)
+        conn.execute(SCHEMA.read_text())
+        conn.execute(LEGACY.read_text())
+
+        if not args.skip_seed:
+            start = time.perf_counter()
+            # Several statements with parameters need client-side binding.
+            psycopg.ClientCursor(conn).execute(
+                SEED,
+                {
+                    "users": args.users,
+                    "meals": args.meals,
+                    "components": args.components,
+                    "seed": args.seed,
+                },
+            )
+            print(
+                f"Seeded {args.users} users x {args.meals} meals x "
+                f"{args.components} components in {time.perf_counter() - start:.1f}s\n"
+            )
+
+        print(
+            f"{'function':<46}{'version':>8}{'p50 ms':>10}{'p95 ms':>10}{'buffers':>10}"
+        )
+        for name, template, params in _cases(conn, args, Random(args.seed)):
+            for version, fn in (("legacy", f"{name}_legacy"), ("current", name)):
+                sql = template.format(fn=fn)
+                _run(conn, sql, params[:3])  # warm up
+                timings = sorted(_run(conn, sql, params))
+                p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+                print(
+                    f"{name:<46}{version:>8}{statistics.median(timings):>10.2f}"
+                    f"{p95:>10.2f}{_buffers(conn, sql, params[0]):>10}"
+                )
+                if args.plans:
+                    try:
+                        _print_plans(conn, sql, params[0])
+                    except psycopg.Error as e:
+                        print(f"Can not print plans, auto_explain is not available: {e}")
+                        args.plans = False
+
+
+if __name__ == "__main__":
+    main()
@@ -11,7 +11,66 @@ class Settings(BaseSettings):
 
     SUPABASE_URL: str | None = os.getenv("SUPABASE_URL")
     SUPABASE_KEY: str | None = os.getenv("SUPABASE_KEY")
+    SUPABASE_MAX_CONNECTIONS: int = int(os.getenv("SUPABASE_MAX_CONNECTIONS", "50"))
+    SUPABASE_MAX_KEEPALIVE_CONNECTIONS: int = int(
+        os.getenv("SUPABASE_MAX_KEEPALIVE_CONNECTIONS", "20")
+    )
+    SUPABASE_KEEPALIVE_EXPIRY: float = float(
+        os.getenv("SUPABASE_KEEPALIVE_EXPIRY", "30")
+    )
+    SUPABASE_TIMEOUT: float = float(os.getenv("SUPABASE_TIMEOUT", "30"))
+    SUPABASE_JWT_SECRET: str | None = os.getenv("SUPABASE_JWT_SECRET")
+    SUPABASE_JWKS_URL: str | None = os.getenv("SUPABASE_JWKS_URL")
+    SUPABASE_JWT_AUDIENCE: str = os.getenv("SUPABASE_JWT_AUDIENCE", "authenticated")
+    JWT_CACHE_MAX_SIZE: int = int(os.getenv("JWT_CACHE_MAX_SIZE", "10000"))
+    JWT_CACHE_TTL: float = float(os.getenv("JWT_CACHE_TTL", "300"))
+    JWT_REMOTE_FALLBACK: bool = os.getenv("JWT_REMOTE_FALLBACK", "false").lower() == "true"
+    JWKS_REFRESH_INTERVAL: float = float(os.getenv("JWKS_REFRESH_INTERVAL", "600"))
+    JWKS_MIN_REFETCH_INTERVAL: float = float(os.getenv("JWKS_MIN_REFETCH_INTERVAL", "30"))
     GEMINI_API_KEY: str | None = os.getenv("GEMINI_API_KEY")
+    GEMINI_MAX_OUTPUT_TOKENS: int = int(os.getenv("GEMINI_MAX_OUTPUT_TOKENS", "2048"))
+    GEMINI_CONTEXT_CACHE_ENABLED: bool = os.getenv("GEMINI_CONTEXT_CACHE_ENABLED", "true").lower() == "true"
+    GEMINI_CONTEXT_CACHE_TTL: int = int(os.getenv("GEMINI_CONTEXT_CACHE_TTL", "3600"))
+    GEMINI_INITIAL_CONCURRENCY: int = int(os.getenv("GEMINI_INITIAL_CONCURRENCY", "16"))
+    GEMINI_MIN_CONCURRENCY: int = int(os.getenv("GEMINI_MIN_CONCURRENCY", "1"))
+    GEMINI_MAX_CONCURRENCY: int = int(os.getenv("GEMINI_MAX_CONCURRENCY", "64"))
+    GEMINI_LATENCY_TARGET: float = float(os.getenv("GEMINI_LATENCY_TARGET", "30"))
+    GEMINI_MAX_ATTEMPTS: int = int(os.getenv("GEMINI_MAX_ATTEMPTS", "4"))
+    GEMINI_REQUEST_DEADLINE: float = float(os.getenv("GEMINI_REQUEST_DEADLINE", "90"))
+    GEMINI_RETRY_BACKOFF_BASE: float = float(os.getenv("GEMINI_RETRY_BACKOFF_BASE", "0.5"))
+    GEMINI_RETRY_BACKOFF_MAX: float = float(os.getenv("GEMINI_RETRY_BACKOFF_MAX", "8"))
+    GEMINI_CIRCUIT_FAILURE_THRESHOLD: int = int(os.getenv("GEMINI_CIRCUIT_FAILURE_THRESHOLD", "5"))
+    GEMINI_CIRCUIT_RESET_TIMEOUT: float = float(os.getenv("GEMINI_CIRCUIT_RESET_TIMEOUT", "30"))
+    ANALYZE_MAX_CONCURRENCY: int = int(os.getenv("ANALYZE_MAX_CONCURRENCY", "32"))
+    ANALYZE_BATCH_MAX_FILES: int = int(os.getenv("ANALYZE_BATCH_MAX_FILES", "20"))
+    ANALYZE_BATCH_MAX_CONCURRENCY: int = int(os.getenv("ANALYZE_BATCH_MAX_CONCURRENCY", "4"))
+    IMAGE_PROCESS_WORKERS: int = int(os.getenv("IMAGE_PROCESS_WORKERS", "2"))
+    GEMINI_IMAGE_MAX_EDGE: int = int(os.getenv("GEMINI_IMAGE_MAX_EDGE", "768"))
+    GEMINI_IMAGE_FORMAT: str = os.getenv("GEMINI_IMAGE_FORMAT", "JPEG")
+    GEMINI_IMAGE_QUALITY: int = int(os.getenv("GEMINI_IMAGE_QUALITY", "85"))
+    ANALYSIS_CACHE_ENABLED: bool = os.getenv("ANALYSIS_CACHE_ENABLED", "true").lower() == "true"
+    ANALYSIS_CACHE_MAX_SIZE: int = int(os.getenv("ANALYSIS_CACHE_MAX_SIZE", "5000"))
+    ANALYSIS_CACHE_TTL: float = float(os.getenv("ANALYSIS_CACHE_TTL", "604800"))
+    ANALYSIS_CACHE_MAX_DISTANCE: int = int(os.getenv("ANALYSIS_CACHE_MAX_DISTANCE", "4"))
+    ANALYSIS_CACHE_SQLITE_PATH: str | None = os.getenv("ANALYSIS_CACHE_SQLITE_PATH")
+    ANALYSIS_JOB_WORKERS: int = int(os.getenv("ANALYSIS_JOB_WORKERS", "4"))
+    ANALYSIS_JOB_MAX_QUEUE_DEPTH: int = int(os.getenv("ANALYSIS_JOB_MAX_QUEUE_DEPTH", "100"))
+    ANALYSIS_JOB_DB_PATH: str = os.getenv("ANALYSIS_JOB_DB_PATH", "analysis_jobs.db")
+    ANALYSIS_JOB_RETENTION: float = float(os.getenv("ANALYSIS_JOB_RETENTION", "86400"))
+    ANALYSIS_JOB_LEASE: float = float(os.getenv("ANALYSIS_JOB_LEASE", "300"))
+    MEAL_CACHE_ENABLED: bool = os.getenv("MEAL_CACHE_ENABLED", "true").lower() == "true"
+    MEAL_CACHE_MAX_SIZE: int = int(os.getenv("MEAL_CACHE_MAX_SIZE", "10000"))
+    MEAL_CACHE_TTL: float = float(os.getenv("MEAL_CACHE_TTL", "300"))
+    DEBUG_ADMIN_TOKEN: str | None = os.getenv("DEBUG_ADMIN_TOKEN")
+    FLIGHT_RECORDER_ENABLED: bool = os.getenv("FLIGHT_RECORDER_ENABLED", "true").lower() == "true"
+    FLIGHT_RECORDER_SLOWEST: int = int(os.getenv("FLIGHT_RECORDER_SLOWEST", "50"))
+    FLIGHT_RECORDER_THRESHOLD_MS: float = float(os.getenv("FLIGHT_RECORDER_THRESHOLD_MS", "10000"))
+    FLIGHT_RECORDER_MAX_OVER_THRESHOLD: int = int(os.getenv("FLIGHT_RECORDER_MAX_OVER_THRESHOLD", "200"))
+    FLIGHT_RECORDER_WINDOW: float = float(os.getenv("FLIGHT_RECORDER_WINDOW", "3600"))
+    PROFILING_ENABLED: bool = os.getenv("PROFILING_ENABLED", "false").lower() == "true"
+    PROFILING_SAMPLE_RATE: float = float(os.getenv("PROFILING_SAMPLE_RATE", "0"))
+    PROFILING_DIR: str = os.getenv("PROFILING_DIR", "profiles")
+    PROFILING_MAX_FILES: int = int(os.getenv("PROFILING_MAX_FILES", "100"))
     MODEL_NAME: str = os.getenv(
         "MODEL_NAME", "gemini-2.5-flash-preview-05-20"
     ) 
@@ -0,0 +1,192 @@
+import heapq
+import itertools
+import time
+from collections import deque
+from contextvars import ContextVar, Token
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Any
+
+from starlette.types import Scope
+
+from core.config import settings
+
+GEMINI_USAGE_FIELDS = {
+    "prompt": "prompt_token_count",
+    "cached": "cached_content_token_count",
+    "output": "candidates_token_count",
+    "thoughts": "thoughts_token_count",
+    "total": "total_token_count",
+}
+
+
+@dataclass(slots=True)
+class RequestTrace:
+    """What is known about one request, filled in while it runs."""
+
+    method: str
+    path: str
+    started_at: float
+    payload_bytes: int | None = None
+    duration_ms: float = 0.0
+    status: int = 0
+    outcome: str | None = None
+    # Summed over every image of a batch.
+    stages_ms: dict[str, float] = field(default_factory=dict)
+    gemini_tokens: dict[str, int] = field(default_factory=dict)
+    images: list[tuple[int, int]] = field(default_factory=list)
+    context_token: Token | None = field(default=None, repr=False)
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "method": self.method,
+            "path": self.path,
+            "started_at": datetime.fromtimestamp(self.started_at, timezone.utc).isoformat(
+                timespec="milliseconds"
+            ),
+            "duration_ms": round(self.duration_ms, 1),
+            "status": self.status,
+            "outcome": self.outcome,
+            "payload_bytes": self.payload_bytes,
+            "images": [{"width": width, "height": height} for width, height in self.images],
+            "stages_ms": {name: round(ms, 1) for name, ms in self.stages_ms.items()},
+            "gemini_tokens": self.gemini_tokens,
+        }
+
+
+_current_trace: ContextVar[RequestTrace | None] = ContextVar("current_trace", default=None)
+
+
+def record_stage(name: str, seconds: float) -> None:
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.stages_ms[name] = trace.stages_ms.get(name, 0.0) + seconds * 1000
+
+
+def record_image(width: int, height: int) -> None:
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.images.append((width, height))
+
+
+def record_gemini_usage(usage: Any) -> None:
+    """Adds the token counts of a Gemini response's usage_metadata."""
+    trace = _current_trace.get()
+    if trace is None or usage is None:
+        return
+    for name, attribute in GEMINI_USAGE_FIELDS.items():
+        count = getattr(usage, attribute, None)
+        if count:
+            trace.gemini_tokens[name] = trace.gemini_tokens.get(name, 0) + count
+
+
+def set_outcome(outcome: str) -> None:
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.outcome = outcome
+
+
+def _outcome_for_status(status: int) -> str:
+    if status < 400:
+        return "ok"
+    if status == 503:
+        return "unavailable"
+    if status >= 500:
+        return "error"
+    return "rejected"
+
+
+class FlightRecorder:
+    """
+    Keeps the slowest requests of the current and the previous window, and
+    the latest requests over threshold_ms, in fixed-size structures.
+
+    Requests are traced from the ASGI middleware and read by an async
+    endpoint, both on the event loop thread, so recording takes no locks. A
+    request that is neither among the slowest nor over the threshold costs
+    one comparison.
+    """
+
+    def __init__(
+        self,
+        enabled: bool = True,
+        slowest: int = 50,
+        threshold_ms: float = 10000,
+        max_over_threshold: int = 200,
+        window: float = 3600,
+        path_prefix: str = "/api/",
+    ):
+        self.enabled = enabled
+        self.slowest = slowest
+        self.threshold_ms = threshold_ms
+        self.window = window
+        self.path_prefix = path_prefix
+
+        # Min-heaps of (duration_ms, sequence, trace); the root is the fastest kept.
+        self._current: list[tuple[float, int, RequestTrace]] = []
+        self._previous: list[tuple[float, int, RequestTrace]] = []
+        self._window_started = time.monotonic()
+        self._over_threshold: deque[RequestTrace] = deque(maxlen=max_over_threshold)
+        self._sequence = itertools.count()
+
+    def start(self, scope: Scope) -> RequestTrace | None:
+        """Starts tracing a request, or returns None if it is not recorded."""
+        if not self.enabled or not scope["path"].startswith(self.path_prefix):
+            return None
+
+        content_length = next(
+            (value for key, value in scope["headers"] if key == b"content-length"), b""
+        )
+        trace = RequestTrace(
+            scope["method"],
+            scope["path"],
+            time.time(),
+            int(content_length) if content_length.isdigit() else None,
+        )
+        trace.context_token = _current_trace.set(trace)
+        return trace
+
+    def finish(self, trace: RequestTrace, status: int, duration_ms: float) -> None:
+        _current_trace.reset(trace.context_token)
+        trace.context_token = None
+        trace.status = status
+        trace.duration_ms = duration_ms
+        trace.outcome = trace.outcome or _outcome_for_status(status)
+
+        now = time.monotonic()
+        if now - self._window_started >= self.window:
+            recent = now - self._window_started < 2 * self.window
+            self._previous = self._current if recent else []
+            self._current = []
+            self._window_started = now
+
+        if duration_ms >= self.threshold_ms:
+            self._over_threshold.append(trace)
+
+        if len(self._current) < self.slowest:
+            heapq.heappush(self._current, (duration_ms, next(self._sequence), trace))
+        elif self._current and duration_ms > self._current[0][0]:
+            heapq.heapreplace(self._current, (duration_ms, next(self._sequence), trace))
+
+    def snapshot(self) -> dict[str, Any]:
+        slowest = heapq.nlargest(self.slowest, self._current + self._previous)
+        return {
+            "threshold_ms": self.threshold_ms,
+            "window_seconds": self.window,
+            "slowest": [trace.to_dict() for _, _, trace in slowest],
+            "over_threshold": [trace.to_dict() for trace in reversed(self._over_threshold)],
+        }
+
+    def clear(self) -> None:
+        self._current = []
+        self._previous = []
+        self._over_threshold.clear()
+
+
+flight_recorder = FlightRecorder(
+    enabled=settings.FLIGHT_RECORDER_ENABLED,
+    slowest=settings.FLIGHT_RECORDER_SLOWEST,
+    threshold_ms=settings.FLIGHT_RECORDER_THRESHOLD_MS,
+    max_over_threshold=settings.FLIGHT_RECORDER_MAX_OVER_THRESHOLD,
+    window=settings.FLIGHT_RECORDER_WINDOW,
+)
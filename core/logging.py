@@ -1,16 +1,67 @@
+import atexit
+import json
 import logging
+import queue
+import sys
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    Formats each record as a single line of JSON. Structured fields passed as
+    extra={"fields": {...}} are added to the object.
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(
+                timespec="milliseconds"
+            ),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        entry.update(getattr(record, "fields", {}))
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class LogQueueHandler(QueueHandler):
+    """Puts records on the log queue without formatting them first."""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Resolve the message now, as its arguments may change later; the
+        # formatting itself is left to the listener thread.
+        record.msg = record.getMessage()
+        record.args = None
+        return record
 
 
 def setup_logging():
     """
     Set up logging configuration for the application.
+
+    Records are put on a queue by the thread that logs them, and formatted and
+    written by a listener thread, so logging never blocks the event loop.
     """
-    logging.basicConfig(
-        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
-        level=logging.INFO,
-    )
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+
+    handler = logging.StreamHandler(sys.stderr)
+    handler.setFormatter(JsonFormatter())
+
+    root = logging.getLogger()
+    root.handlers = [LogQueueHandler(log_queue)]
+    root.setLevel(logging.INFO)
+
+    listener = QueueListener(log_queue, handler, respect_handler_level=True)
+    listener.start()
+    # Flushes the records still on the queue at exit.
+    atexit.register(listener.stop)
+
     logger = logging.getLogger(__name__)
-    return logger
+    return logger, listener
 
 
-logger = setup_logging()
+logger, log_listener = setup_logging()
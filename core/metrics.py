@@ -0,0 +1,135 @@
+import os
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+)
+from prometheus_client import multiprocess
+
+# With several uvicorn workers, set PROMETHEUS_MULTIPROC_DIR to an empty
+# directory shared by all of them: every worker then writes its samples
+# there, and /metrics aggregates them whichever worker serves the scrape.
+MULTIPROCESS = "PROMETHEUS_MULTIPROC_DIR" in os.environ
+
+STAGE_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60)
+
+ANALYZE_STAGE_SECONDS = Histogram(
+    "analyze_stage_duration_seconds",
+    "Duration of each stage of the food analysis pipeline.",
+    ["stage"],
+    buckets=STAGE_BUCKETS,
+)
+
+SUPABASE_RPC_SECONDS = Histogram(
+    "supabase_rpc_duration_seconds",
+    "Duration of the Supabase reads made by the meal endpoints.",
+    ["rpc"],
+)
+
+HTTP_REQUESTS_IN_FLIGHT = Gauge(
+    "http_requests_in_flight",
+    "HTTP requests being processed.",
+    multiprocess_mode="livesum",
+)
+
+ANALYSES_IN_FLIGHT = Gauge(
+    "analyze_in_flight",
+    "Food analyses being processed.",
+    multiprocess_mode="livesum",
+)
+
+GEMINI_CALLS_IN_FLIGHT = Gauge(
+    "gemini_calls_in_flight",
+    "Gemini analysis calls in progress, retries included.",
+    multiprocess_mode="livesum",
+)
+
+GEMINI_CONCURRENCY_LIMIT = Gauge(
+    "gemini_concurrency_limit",
+    "Current adaptive limit on concurrent Gemini calls.",
+    multiprocess_mode="liveall",
+)
+
+GEMINI_SLOTS_IN_USE = Gauge(
+    "gemini_concurrency_slots_in_use",
+    "Gemini calls holding a slot of the adaptive limit.",
+    multiprocess_mode="livesum",
+)
+
+GEMINI_CIRCUIT_STATE = Gauge(
+    "gemini_circuit_state",
+    "State of the Gemini circuit breaker: 0 closed, 1 half-open, 2 open.",
+    multiprocess_mode="livemax",
+)
+
+CIRCUIT_STATES = {"closed": 0, "half_open": 1, "open": 2}
+
+GEMINI_ERRORS = Counter(
+    "gemini_errors",
+    "Failed Gemini attempts by kind: throttled, transient, rejected, or "
+    "unavailable when a request was given up on.",
+    ["kind"],
+)
+
+ANALYSIS_CACHE_LOOKUPS = Counter(
+    "analysis_cache_lookups",
+    "Analysis cache lookups by result: hit or miss.",
+    ["result"],
+)
+
+AUTH_CACHE_LOOKUPS = Counter(
+    "auth_cache_lookups",
+    "Auth cache lookups by cache (token: verified access tokens, user: users "
+    "served by /me) and result: hit or miss.",
+    ["cache", "result"],
+)
+
+SUPABASE_AUTH_CALLS = Counter(
+    "supabase_auth_calls",
+    "Calls to Supabase Auth by call: verify when a token can not be checked "
+    "locally, get_user to fetch the user for /me.",
+    ["call"],
+)
+
+MEAL_CACHE_LOOKUPS = Counter(
+    "meal_cache_lookups",
+    "Meal read cache lookups by result: hit or miss.",
+    ["result"],
+)
+
+MEAL_CACHE_INVALIDATIONS = Counter(
+    "meal_cache_invalidations",
+    "Times a user's cached meal reads were dropped after a new analysis.",
+)
+
+MEAL_CACHE_ENTRIES = Gauge(
+    "meal_cache_entries",
+    "Meal reads held in the cache.",
+    multiprocess_mode="livesum",
+)
+
+NON_FOOD_REJECTIONS = Counter(
+    "analyze_non_food_rejections",
+    "Analyzed images rejected because they do not show food.",
+)
+
+
+def generate_metrics() -> bytes:
+    """Renders all metrics in the Prometheus text format."""
+    if MULTIPROCESS:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry)
+    return generate_latest(REGISTRY)
+
+
+def mark_process_dead() -> None:
+    """Drops this worker's live gauges from the aggregate when it exits."""
+    if MULTIPROCESS:
+        multiprocess.mark_process_dead(os.getpid())
+
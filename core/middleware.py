@@ -1,39 +1,97 @@
+import logging
 import time
 
-from fastapi import FastAPI, Request
-from starlette.middleware.base import BaseHTTPMiddleware
+from fastapi import FastAPI
+from starlette.datastructures import MutableHeaders
 from starlette.middleware.cors import CORSMiddleware
 from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
 
+from core.config import settings
+from core.flight_recorder import flight_recorder
 from core.logging import logger
+from core.metrics import HTTP_REQUESTS_IN_FLIGHT
+from core.profiling import ProfilingMiddleware, profile_store
 
 
-class CustomMiddleware(BaseHTTPMiddleware):
-    async def dispatch(self, request: Request, call_next):
-        start_time = time.time()
+class RequestTimingMiddleware:
+    """
+    Times every HTTP request and logs one structured line when it ends.
 
-        logger.info(f"Incoming request: {request.client} {request.method} {request.url.path}")
-        logger.debug(f"Request headers: {dict(request.headers)}")
+    A plain ASGI middleware rather than BaseHTTPMiddleware, so responses,
+    streaming ones included, pass through without an extra task or stream
+    wrapper. X-Processing-Time is the time until the response headers were
+    sent; duration_ms in the log covers the whole body.
+    """
 
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter_ns()
+        status_code = 500
+        response_started = False
+
+        if logger.isEnabledFor(logging.DEBUG):
+            headers = {key.decode(): value.decode() for key, value in scope["headers"]}
+            logger.debug("Request headers", extra={"fields": {"headers": headers}})
+
+        async def send_with_timing(message: Message) -> None:
+            nonlocal status_code, response_started
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                response_started = True
+                headers = MutableHeaders(scope=message)
+                headers["X-Processing-Time"] = str((time.perf_counter_ns() - start) / 1e9)
+            await send(message)
+
+        trace = flight_recorder.start(scope)
+
+        HTTP_REQUESTS_IN_FLIGHT.inc()
         try:
-            response = await call_next(request)
+            await self.app(scope, receive, send_with_timing)
         except Exception as e:
-            logger.error(f"Error processing request: {str(e)}")
+            logger.exception(f"Error processing request: {str(e)}")
+            if response_started:
+                raise
             response = JSONResponse(
                 status_code=500, content={"detail": "Internal Server Error"}
             )
-
-        process_time = time.time() - start_time
-
-        logger.info(f"Response status: {response.status_code}")
-        logger.info(f"Request processed in: {process_time:.4f} seconds")
-
-        response.headers["X-Processing-Time"] = str(process_time)
-
-        return response
+            await response(scope, receive, send_with_timing)
+        finally:
+            HTTP_REQUESTS_IN_FLIGHT.dec()
+            duration_ms = (time.perf_counter_ns() - start) / 1e6
+            if trace is not None:
+                flight_recorder.finish(trace, status_code, duration_ms)
+            client = scope.get("client")
+            logger.info(
+                "Request processed",
+                extra={
+                    "fields": {
+                        "method": scope["method"],
+                        "path": scope["path"],
+                        "status": status_code,
+                        "duration_ms": duration_ms,
+                        "client": f"{client[0]}:{client[1]}" if client else None,
+                    }
+                },
+            )
 
 
 def add_middleware(app: FastAPI):
+    # Added first so it is the innermost middleware and profiles the app only.
+    # When disabled it is not installed at all.
+    if settings.PROFILING_ENABLED:
+        app.add_middleware(
+            ProfilingMiddleware,
+            store=profile_store,
+            admin_token=settings.DEBUG_ADMIN_TOKEN,
+            sample_rate=settings.PROFILING_SAMPLE_RATE,
+        )
     app.add_middleware(
         CORSMiddleware,
         allow_origins=["*"],
@@ -41,4 +99,4 @@ def add_middleware(app: FastAPI):
         allow_methods=["*"],
         allow_headers=["*"],
     )
-    app.add_middleware(CustomMiddleware)
+    app.add_middleware(RequestTimingMiddleware)
@@ -0,0 +1,81 @@
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import partial
+from typing import Any, Callable, TypeVar
+
+from core.config import settings
+from core.logging import logger
+from core.profiling import to_thread
+
+T = TypeVar("T")
+
+_process_pool: ProcessPoolExecutor | None = None
+
+
+def init_process_pool() -> None:
+    """Starts the process pool for CPU-bound work. Called once from the app lifespan."""
+    global _process_pool
+
+    if _process_pool is not None or settings.IMAGE_PROCESS_WORKERS <= 0:
+        return
+
+    _process_pool = _new_process_pool()
+
+
+def _new_process_pool() -> ProcessPoolExecutor:
+    # Spawned workers only import what the submitted function needs, and do
+    # not inherit the event loop or open sockets from the server process.
+    return ProcessPoolExecutor(
+        max_workers=settings.IMAGE_PROCESS_WORKERS,
+        mp_context=multiprocessing.get_context("spawn"),
+    )
+
+
+def _replace_broken_pool(broken: ProcessPoolExecutor) -> None:
+    """Replaces the pool after one of its workers died, unless already done."""
+    global _process_pool
+
+    if _process_pool is not broken:
+        return
+
+    logger.warning("A process pool worker died; starting a new pool")
+    broken.shutdown(wait=False, cancel_futures=True)
+    _process_pool = _new_process_pool()
+
+
+def close_process_pool() -> None:
+    """Shuts the process pool down. Called once on app shutdown."""
+    global _process_pool
+
+    if _process_pool is not None:
+        _process_pool.shutdown(wait=True, cancel_futures=True)
+
+    _process_pool = None
+
+
+async def run_cpu_bound(func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """
+    Runs CPU-bound work in the process pool, or in a worker thread when the
+    pool is disabled (IMAGE_PROCESS_WORKERS=0) or not started.
+
+    A worker that dies (killed for memory, or crashed in native code) breaks
+    the whole pool, so the pool is replaced and the work is tried once more.
+    """
+    if _process_pool is None:
+        return await to_thread(func, *args, **kwargs)
+
+    call = partial(func, *args, **kwargs)
+    try:
+        return await _run_in_pool(_process_pool, call)
+    except BrokenProcessPool:
+        return await _run_in_pool(_process_pool, call)
+
+
+async def _run_in_pool(pool: ProcessPoolExecutor, call: Callable[[], T]) -> T:
+    try:
+        return await asyncio.get_running_loop().run_in_executor(pool, call)
+    except BrokenProcessPool:
+        _replace_broken_pool(pool)
+        raise
@@ -0,0 +1,175 @@
+import asyncio
+import cProfile
+import hmac
+import pstats
+import random
+import re
+import sys
+import threading
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable, TypeVar
+from uuid import uuid4
+
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from core.config import settings
+from core.logging import logger
+
+T = TypeVar("T")
+
+PROFILE_NAME = re.compile(r"^[A-Za-z0-9-]+$")
+
+# Before 3.12, cProfile only sees the thread it was enabled on, so worker
+# threads need profiles of their own. From 3.12 on it is built on the
+# process-wide sys.monitoring: the loop profile already sees every thread, and
+# enabling a second profiler raises.
+PER_THREAD_PROFILES = sys.version_info < (3, 12)
+
+
+class RequestProfile:
+    """
+    cProfile data for one request: its event loop work, plus the work of every
+    worker thread it started through to_thread (collected separately before
+    Python 3.12).
+    """
+
+    def __init__(self):
+        self.loop_profile = cProfile.Profile()
+        self._thread_profiles: list[cProfile.Profile] = []
+        self._lock = threading.Lock()
+
+    def run_in_thread(self, func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        profile = cProfile.Profile()
+        profile.enable()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            profile.disable()
+            with self._lock:
+                self._thread_profiles.append(profile)
+
+    def stats(self) -> pstats.Stats:
+        stats = pstats.Stats(self.loop_profile)
+        with self._lock:
+            for profile in self._thread_profiles:
+                stats.add(profile)
+        return stats
+
+
+_active_profile: ContextVar[RequestProfile | None] = ContextVar(
+    "active_profile", default=None
+)
+
+
+async def to_thread(func: Callable[..., T], /, *args: Any, **kwargs: Any) -> T:
+    """
+    asyncio.to_thread, except that the work done in the worker thread is added
+    to the profile of the calling request when it is being profiled.
+    """
+    profile = _active_profile.get() if PER_THREAD_PROFILES else None
+    if profile is None:
+        return await asyncio.to_thread(func, *args, **kwargs)
+    return await asyncio.to_thread(profile.run_in_thread, func, *args, **kwargs)
+
+
+class ProfileStore:
+    """
+    Keeps request profiles as pstats files in a directory, deleting the oldest
+    ones beyond max_files.
+    """
+
+    def __init__(self, directory: str, max_files: int = 100):
+        self.directory = Path(directory)
+        self.max_files = max_files
+
+    def save(self, name: str, profile: RequestProfile) -> None:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        profile.stats().dump_stats(self.directory / f"{name}.prof")
+
+        # Names start with the UTC time, so they sort oldest first.
+        files = sorted(self.directory.glob("*.prof"))
+        for path in files[: max(0, len(files) - self.max_files)]:
+            path.unlink(missing_ok=True)
+
+    def path(self, name: str) -> Path | None:
+        if not PROFILE_NAME.match(name):
+            return None
+        path = self.directory / f"{name}.prof"
+        return path if path.is_file() else None
+
+
+class ProfilingMiddleware:
+    """
+    Profiles the requests that carry the debug admin token in an X-Profile
+    header, and a random sample_rate share of all requests, with cProfile.
+
+    Requests asked for with the header get an X-Profile-Id response header
+    naming the profile, which /debug/profiles/{id} returns. Only one request
+    is profiled at a time, and as the event loop is shared, other requests
+    running meanwhile show up in its loop profile too. Image processing in the
+    process pool is seen only as the time spent waiting for it.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        store: ProfileStore,
+        admin_token: str | None = None,
+        sample_rate: float = 0.0,
+    ):
+        self.app = app
+        self.store = store
+        self.admin_token = admin_token.encode() if admin_token else None
+        self.sample_rate = sample_rate
+        self._running = False
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or self._running:
+            await self.app(scope, receive, send)
+            return
+
+        requested = self._requested(scope)
+        if not requested and random.random() >= self.sample_rate:
+            await self.app(scope, receive, send)
+            return
+
+        slug = re.sub(r"[^A-Za-z0-9]+", "-", scope["path"]).strip("-")[:60]
+        name = (
+            f"{datetime.now(timezone.utc):%Y%m%dT%H%M%S}-{scope['method']}-{slug}-"
+            f"{uuid4().hex[:8]}"
+        )
+
+        async def send_with_profile_id(message: Message) -> None:
+            if requested and message["type"] == "http.response.start":
+                MutableHeaders(scope=message)["X-Profile-Id"] = name
+            await send(message)
+
+        profile = RequestProfile()
+        context_token = _active_profile.set(profile)
+        self._running = True
+        profile.loop_profile.enable()
+        try:
+            await self.app(scope, receive, send_with_profile_id)
+        finally:
+            profile.loop_profile.disable()
+            self._running = False
+            _active_profile.reset(context_token)
+
+            try:
+                await asyncio.to_thread(self.store.save, name, profile)
+            except Exception as e:
+                logger.warning(f"Failed to save request profile {name}: {e}")
+
+    def _requested(self, scope: Scope) -> bool:
+        if self.admin_token is None:
+            return False
+        for key, value in scope["headers"]:
+            if key == b"x-profile":
+                return hmac.compare_digest(value, self.admin_token)
+        return False
+
+
+profile_store = ProfileStore(settings.PROFILING_DIR, settings.PROFILING_MAX_FILES)
@@ -0,0 +1,328 @@
+import asyncio
+import itertools
+import math
+import random
+import time
+from collections import deque
+from contextlib import aclosing, asynccontextmanager
+from typing import AsyncIterator, Awaitable, Callable, TypeVar
+
+T = TypeVar("T")
+
+
+class ServiceUnavailable(Exception):
+    """Raised when a call is refused or given up on; retry_after is in seconds."""
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = max(1, math.ceil(retry_after))
+
+
+class AdaptiveConcurrencyLimiter:
+    """
+    Caps the number of concurrent calls with an AIMD limit: the limit grows by
+    about one per round of successful calls and is cut multiplicatively when
+    the upstream throttles us or answers slower than latency_target. Cuts
+    happen at most once per cooldown so one burst of 429s counts once.
+    """
+
+    def __init__(
+        self,
+        initial_limit: int = 16,
+        min_limit: int = 1,
+        max_limit: int = 64,
+        latency_target: float = 30.0,
+        backoff_ratio: float = 0.5,
+        latency_backoff_ratio: float = 0.9,
+        cooldown: float = 5.0,
+    ):
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.latency_target = latency_target
+        self.backoff_ratio = backoff_ratio
+        self.latency_backoff_ratio = latency_backoff_ratio
+        self.cooldown = cooldown
+
+        self.limit = float(min(max(initial_limit, min_limit), max_limit))
+        self.in_flight = 0
+        self.throttled = 0
+        self._waiters: deque[asyncio.Future] = deque()
+        self._last_decrease = 0.0
+
+    @property
+    def waiting(self) -> int:
+        return len(self._waiters)
+
+    async def acquire(self, timeout: float) -> None:
+        """Waits up to timeout seconds for a slot; raises TimeoutError otherwise."""
+        if not self._waiters and self.in_flight < int(self.limit):
+            self.in_flight += 1
+            return
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await asyncio.wait_for(waiter, timeout)
+        except BaseException:
+            if waiter.done() and not waiter.cancelled():
+                # The slot was handed over just as we gave up; pass it on.
+                self.in_flight -= 1
+                self._wake()
+            elif waiter in self._waiters:
+                self._waiters.remove(waiter)
+            raise
+
+    def release(self, latency: float | None = None, throttled: bool = False) -> None:
+        """
+        Returns a slot. latency is the duration of a call that got an answer,
+        or None when the call failed without telling us anything about load.
+        """
+        self.in_flight -= 1
+
+        if throttled:
+            self.throttled += 1
+            self._decrease(self.backoff_ratio)
+        elif latency is not None and latency > self.latency_target:
+            self._decrease(self.latency_backoff_ratio)
+        elif latency is not None:
+            self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+
+        self._wake()
+
+    def _decrease(self, ratio: float) -> None:
+        now = time.monotonic()
+        if now - self._last_decrease < self.cooldown:
+            return
+        self.limit = max(self.min_limit, self.limit * ratio)
+        self._last_decrease = now
+
+    def _wake(self) -> None:
+        while self._waiters and self.in_flight < int(self.limit):
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                self.in_flight += 1
+                waiter.set_result(None)
+
+
+class CircuitBreaker:
+    """
+    Opens after failure_threshold consecutive failures and refuses calls for
+    reset_timeout seconds. After that a single probe call is let through: its
+    success closes the circuit again, its failure reopens it.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+
+        self.state = "closed"
+        self.consecutive_failures = 0
+        self.opens = 0
+        self._opened_at = 0.0
+        self._probing = False
+
+    def retry_after(self) -> float:
+        if self.state != "open":
+            return 0.0
+        return max(0.0, self._opened_at + self.reset_timeout - time.monotonic())
+
+    def before_call(self) -> None:
+        if self.state == "open":
+            remaining = self.retry_after()
+            if remaining > 0:
+                raise ServiceUnavailable("Circuit is open.", remaining)
+            self.state = "half_open"
+            self._probing = False
+
+        if self.state == "half_open":
+            if self._probing:
+                raise ServiceUnavailable("Circuit is half-open.", 1)
+            self._probing = True
+
+    def record_success(self) -> None:
+        self.state = "closed"
+        self.consecutive_failures = 0
+        self._probing = False
+
+    def record_failure(self) -> None:
+        self.consecutive_failures += 1
+        if self.state == "half_open" or self.consecutive_failures >= self.failure_threshold:
+            if self.state != "open":
+                self.opens += 1
+            self.state = "open"
+            self._opened_at = time.monotonic()
+        self._probing = False
+
+    def abandon(self) -> None:
+        """Lets another probe through if the current call ended without an outcome."""
+        self._probing = False
+
+
+class ResilientCaller:
+    """
+    Runs calls to an upstream service through an adaptive concurrency limit
+    and a circuit breaker, retrying transient errors with jittered
+    exponential backoff as long as the per-request deadline allows.
+    on_error, if given, is called with the error of every failed attempt, and
+    on_change with the caller whenever an attempt is admitted, refused or
+    ends, which is when its limit, in-flight count or circuit state change.
+    """
+
+    def __init__(
+        self,
+        limiter: AdaptiveConcurrencyLimiter,
+        breaker: CircuitBreaker,
+        is_transient: Callable[[BaseException], bool],
+        is_throttled: Callable[[BaseException], bool],
+        max_attempts: int = 4,
+        deadline: float = 90.0,
+        backoff_base: float = 0.5,
+        backoff_max: float = 8.0,
+        on_error: Callable[[Exception], None] | None = None,
+        on_change: Callable[["ResilientCaller"], None] | None = None,
+    ):
+        self.limiter = limiter
+        self.breaker = breaker
+        self.is_transient = is_transient
+        self.is_throttled = is_throttled
+        self.max_attempts = max_attempts
+        self.deadline = deadline
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.on_error = on_error
+        self.on_change = on_change
+
+        self.retries = 0
+        self.rejected = 0
+
+    async def call(self, operation: Callable[[], Awaitable[T]]) -> T:
+        deadline = time.monotonic() + self.deadline
+
+        for attempt in itertools.count():
+            try:
+                async with self.slot(deadline):
+                    async with asyncio.timeout(deadline - time.monotonic()):
+                        return await operation()
+            except Exception as e:
+                await self.backoff(e, attempt, deadline)
+
+    async def stream(self, open_stream: Callable[[], AsyncIterator[T]]) -> AsyncIterator[T]:
+        """
+        Like call() for a streaming response. The slot is held until the stream
+        ends, and an attempt is only retried if it failed before its first item.
+        Opening the stream and reading each item must finish by the deadline;
+        a stream that stalls after its first item raises ServiceUnavailable.
+        """
+        deadline = time.monotonic() + self.deadline
+
+        for attempt in itertools.count():
+            started = False
+            try:
+                async with self.slot(deadline):
+                    async with aclosing(open_stream()) as items:
+                        while True:
+                            # The timeout only covers the read: while this
+                            # generator is suspended at yield, the consumer runs.
+                            async with asyncio.timeout(deadline - time.monotonic()):
+                                try:
+                                    item = await anext(items)
+                                except StopAsyncIteration:
+                                    break
+                            started = True
+                            yield item
+                return
+            except Exception as e:
+                if not started:
+                    await self.backoff(e, attempt, deadline)
+                elif isinstance(e, TimeoutError):
+                    raise ServiceUnavailable(
+                        "The stream stalled past the deadline.", self.backoff_max
+                    ) from e
+                else:
+                    raise
+
+    @asynccontextmanager
+    async def slot(self, deadline: float) -> AsyncIterator[None]:
+        """Admits one attempt and records its outcome."""
+        try:
+            async with self._slot(deadline):
+                self._changed()
+                yield
+        finally:
+            self._changed()
+
+    @asynccontextmanager
+    async def _slot(self, deadline: float) -> AsyncIterator[None]:
+        try:
+            self.breaker.before_call()
+        except ServiceUnavailable:
+            self.rejected += 1
+            raise
+
+        try:
+            await self.limiter.acquire(max(0.0, deadline - time.monotonic()))
+        except TimeoutError:
+            self.breaker.abandon()
+            self.rejected += 1
+            raise ServiceUnavailable("Too many calls are waiting.", self.backoff_max)
+        except BaseException:
+            self.breaker.abandon()
+            raise
+
+        started = time.monotonic()
+        try:
+            yield
+        except Exception as e:
+            if self.on_error is not None:
+                self.on_error(e)
+            if self.is_transient(e):
+                self.breaker.record_failure()
+                self.limiter.release(throttled=self.is_throttled(e))
+            else:
+                # The service answered, it just did not like the request.
+                self.breaker.record_success()
+                self.limiter.release()
+            raise
+        except BaseException:
+            self.breaker.abandon()
+            self.limiter.release()
+            raise
+        else:
+            self.breaker.record_success()
+            self.limiter.release(latency=time.monotonic() - started)
+
+    async def backoff(self, error: Exception, attempt: int, deadline: float) -> None:
+        """Sleeps before the next attempt, or raises if error should not be retried."""
+        if not self.is_transient(error):
+            raise error
+
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2**attempt))
+        if (
+            attempt + 1 >= self.max_attempts
+            or self.breaker.state == "open"
+            or time.monotonic() + delay >= deadline
+        ):
+            raise ServiceUnavailable(
+                f"Giving up after {attempt + 1} attempts: {error}",
+                self.breaker.retry_after() or self.backoff_max,
+            ) from error
+
+        self.retries += 1
+        await asyncio.sleep(delay)
+
+    def _changed(self) -> None:
+        if self.on_change is not None:
+            self.on_change(self)
+
+    def stats(self) -> dict:
+        return {
+            "limit": round(self.limiter.limit, 2),
+            "in_flight": self.limiter.in_flight,
+            "waiting": self.limiter.waiting,
+            "throttled": self.limiter.throttled,
+            "retries": self.retries,
+            "rejected": self.rejected,
+            "circuit_state": self.breaker.state,
+            "consecutive_failures": self.breaker.consecutive_failures,
+            "circuit_opens": self.breaker.opens,
+        }
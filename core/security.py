@@ -0,0 +1,269 @@
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+from typing import Generic, TypeVar
+
+import jwt
+from jwt import PyJWK, PyJWKClient
+from pydantic import BaseModel
+from supabase import Client
+
+from core.config import settings
+from core.logging import logger
+from core.metrics import AUTH_CACHE_LOOKUPS, SUPABASE_AUTH_CALLS
+
+V = TypeVar("V")
+
+
+class TokenVerificationUnavailable(Exception):
+    """Raised when a token can not be checked locally (no secret or JWKS)."""
+
+
+class AuthenticatedUser(BaseModel):
+    """
+    The user an access token was issued to, as far as the token tells. The
+    full Supabase user (creation time, identities...) is only fetched by /me.
+    """
+
+    id: str
+    aud: str = ""
+    role: str | None = None
+    email: str | None = None
+    phone: str | None = None
+    app_metadata: dict = {}
+    user_metadata: dict = {}
+    is_anonymous: bool = False
+
+
+class ExpiringCache(Generic[V]):
+    """
+    A bounded LRU cache whose entries each expire at their own time. Lookups
+    are counted in auth_cache_lookups under the cache's name.
+    """
+
+    def __init__(self, name: str, max_size: int = 10000):
+        self.name = name
+        self.max_size = max_size
+        self._entries: OrderedDict[str, tuple[float, V]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> V | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] <= time.time():
+                del self._entries[key]
+                entry = None
+            if entry is None:
+                AUTH_CACHE_LOOKUPS.labels(self.name, "miss").inc()
+                return None
+
+            self._entries.move_to_end(key)
+            AUTH_CACHE_LOOKUPS.labels(self.name, "hit").inc()
+            return entry[1]
+
+    def put(self, key: str, value: V, expires_at: float) -> None:
+        with self._lock:
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+class TokenVerifier:
+    """
+    Verifies Supabase access tokens locally against the project JWT secret
+    (HS256) or the project JWKS (asymmetric keys), and keeps a bounded TTL
+    cache of the decoded users keyed by token.
+
+    The JWKS is fetched at startup and refreshed in the background. A token
+    signed with a key that is not known yet triggers a refetch off the event
+    loop, at most once every jwks_min_refetch_interval seconds.
+    """
+
+    def __init__(
+        self,
+        jwt_secret: str | None = None,
+        jwks_url: str | None = None,
+        audience: str = "authenticated",
+        cache_max_size: int = 10000,
+        cache_ttl: float = 300,
+        remote_fallback: bool = False,
+        jwks_refresh_interval: float = 600,
+        jwks_min_refetch_interval: float = 30,
+    ):
+        self.jwt_secret = jwt_secret
+        self.audience = audience
+        self.cache_max_size = cache_max_size
+        self.cache_ttl = cache_ttl
+        self.remote_fallback = remote_fallback
+        self.jwks_refresh_interval = jwks_refresh_interval
+        self.jwks_min_refetch_interval = jwks_min_refetch_interval
+        self._jwks_client = (
+            PyJWKClient(jwks_url, cache_jwk_set=False, timeout=10) if jwks_url else None
+        )
+
+        self._cache: ExpiringCache[AuthenticatedUser] = ExpiringCache("token", cache_max_size)
+
+        self._signing_keys: dict[str, PyJWK] = {}
+        self._jwks_fetched_at = float("-inf")
+        self._jwks_lock = asyncio.Lock()
+        self._jwks_task: asyncio.Task | None = None
+
+    async def start(self) -> None:
+        """Fetches the JWKS and keeps refreshing it in the background."""
+        if self._jwks_client is None or self._jwks_task is not None:
+            return
+        self._jwks_task = asyncio.create_task(self._refresh_jwks(), name="jwks-refresh")
+
+    async def stop(self) -> None:
+        if self._jwks_task is not None:
+            self._jwks_task.cancel()
+            await asyncio.gather(self._jwks_task, return_exceptions=True)
+            self._jwks_task = None
+
+    async def verify(self, token: str, supabase_client: Client) -> AuthenticatedUser | None:
+        """Returns the user for a valid token, or None if the token is rejected."""
+        user = self._cache.get(token)
+        if user is not None:
+            return user
+
+        try:
+            claims = await self._decode(token)
+        except jwt.PyJWTError:
+            return None
+        except TokenVerificationUnavailable as e:
+            if not self.remote_fallback:
+                logger.warning(f"Local token verification unavailable: {e}")
+                return None
+            return await asyncio.to_thread(self._verify_remote, token, supabase_client)
+
+        user = self._user_from_claims(claims)
+        self._put_cached(token, user, float(claims["exp"]))
+        return user
+
+    def clear(self) -> None:
+        self._cache.clear()
+
+    async def _decode(self, token: str) -> dict:
+        header = jwt.get_unverified_header(token)
+        algorithm = header.get("alg", "")
+
+        if algorithm.startswith("HS"):
+            if not self.jwt_secret:
+                raise TokenVerificationUnavailable("SUPABASE_JWT_SECRET is not set")
+            key = self.jwt_secret
+            algorithms = ["HS256"]
+        else:
+            if self._jwks_client is None:
+                raise TokenVerificationUnavailable("No JWKS URL is configured")
+            key = (await self._signing_key(header.get("kid"))).key
+            algorithms = ["RS256", "ES256"]
+
+        return jwt.decode(
+            token,
+            key,
+            algorithms=algorithms,
+            audience=self.audience,
+            options={"require": ["exp", "sub"]},
+        )
+
+    async def _signing_key(self, kid: str | None) -> PyJWK:
+        signing_key = self._signing_keys.get(kid or "")
+        if signing_key is not None:
+            return signing_key
+
+        # The project may have rotated to a new key since the last refresh.
+        # Whoever holds the lock refetches; the others then find the new key.
+        async with self._jwks_lock:
+            signing_key = self._signing_keys.get(kid or "")
+            if signing_key is not None:
+                return signing_key
+            if time.monotonic() - self._jwks_fetched_at < self.jwks_min_refetch_interval:
+                if not self._signing_keys:
+                    raise TokenVerificationUnavailable("The JWKS could not be fetched")
+                raise jwt.PyJWKClientError(f"Unknown signing key {kid!r}")
+            try:
+                await asyncio.to_thread(self._fetch_jwks)
+            except jwt.PyJWKClientError as e:
+                raise TokenVerificationUnavailable(str(e))
+
+        signing_key = self._signing_keys.get(kid or "")
+        if signing_key is None:
+            raise jwt.PyJWKClientError(f"Unknown signing key {kid!r}")
+        return signing_key
+
+    def _fetch_jwks(self) -> None:
+        assert self._jwks_client is not None
+        # Counts as an attempt even when it fails, so an unreachable JWKS is
+        # not asked again by every request.
+        self._jwks_fetched_at = time.monotonic()
+        jwk_set = self._jwks_client.get_jwk_set(refresh=True)
+        self._signing_keys = {
+            key.key_id: key
+            for key in jwk_set.keys
+            if key.key_id and key.public_key_use in ("sig", None)
+        }
+
+    async def _refresh_jwks(self) -> None:
+        while True:
+            try:
+                async with self._jwks_lock:
+                    await asyncio.to_thread(self._fetch_jwks)
+            except Exception as e:
+                logger.warning(f"Failed to fetch the JWKS: {e}")
+            await asyncio.sleep(self.jwks_refresh_interval)
+
+    def _verify_remote(self, token: str, supabase_client: Client) -> AuthenticatedUser | None:
+        SUPABASE_AUTH_CALLS.labels("verify").inc()
+        response = supabase_client.auth.get_user(token)
+        if not response or not response.user:
+            return None
+
+        user = AuthenticatedUser.model_validate(response.user.model_dump())
+
+        # The token was just accepted by Supabase Auth, so its expiry can be
+        # read without checking the signature again.
+        claims = jwt.decode(token, options={"verify_signature": False})
+        self._put_cached(token, user, float(claims.get("exp", 0)))
+        return user
+
+    def _put_cached(self, token: str, user: AuthenticatedUser, token_exp: float) -> None:
+        self._cache.put(token, user, min(time.time() + self.cache_ttl, token_exp))
+
+    @staticmethod
+    def _user_from_claims(claims: dict) -> AuthenticatedUser:
+        return AuthenticatedUser(
+            id=claims["sub"],
+            aud=claims.get("aud", ""),
+            role=claims.get("role"),
+            email=claims.get("email") or None,
+            phone=claims.get("phone") or None,
+            app_metadata=claims.get("app_metadata", {}),
+            user_metadata=claims.get("user_metadata", {}),
+            is_anonymous=claims.get("is_anonymous", False),
+        )
+
+
+def _default_jwks_url() -> str | None:
+    if settings.SUPABASE_JWKS_URL:
+        return settings.SUPABASE_JWKS_URL
+    if settings.SUPABASE_URL:
+        return f"{settings.SUPABASE_URL.rstrip('/')}/auth/v1/.well-known/jwks.json"
+    return None
+
+
+token_verifier = TokenVerifier(
+    jwt_secret=settings.SUPABASE_JWT_SECRET,
+    jwks_url=_default_jwks_url(),
+    audience=settings.SUPABASE_JWT_AUDIENCE,
+    cache_max_size=settings.JWT_CACHE_MAX_SIZE,
+    cache_ttl=settings.JWT_CACHE_TTL,
+    remote_fallback=settings.JWT_REMOTE_FALLBACK,
+    jwks_refresh_interval=settings.JWKS_REFRESH_INTERVAL,
+    jwks_min_refetch_interval=settings.JWKS_MIN_REFETCH_INTERVAL,
+)
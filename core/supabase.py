@@ -1,11 +1,24 @@
-from supabase import Client, create_client
+import httpx
+from supabase import (
+    AsyncClient,
+    AsyncClientOptions,
+    Client,
+    ClientOptions,
+    SupabaseAuthClient,
+    acreate_client,
+    create_client,
+)
 
 from core.config import settings
 
+_http_client: httpx.Client | None = None
+_supabase_client: Client | None = None
+_supabase_auth_client: SupabaseAuthClient | None = None
+_async_http_client: httpx.AsyncClient | None = None
+_async_supabase_client: AsyncClient | None = None
 
 
-def get_supabase_client() -> Client:
-
+def _get_credentials() -> tuple[str, str]:
     supabase_url: str | None = settings.SUPABASE_URL
     supabase_key: str | None = settings.SUPABASE_KEY
 
@@ -14,6 +27,131 @@ def get_supabase_client() -> Client:
     if not supabase_key:
         raise ValueError("Missing Supabase API key in environment variables.")
 
-    supabase_client = create_client(supabase_url, supabase_key)
+    return supabase_url, supabase_key
+
+
+def _pool_limits() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=settings.SUPABASE_MAX_CONNECTIONS,
+        max_keepalive_connections=settings.SUPABASE_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=settings.SUPABASE_KEEPALIVE_EXPIRY,
+    )
+
+
+def _build_http_client() -> httpx.Client:
+    """Builds the pooled keep-alive HTTP client shared by every Supabase client."""
+    return httpx.Client(
+        limits=_pool_limits(),
+        timeout=settings.SUPABASE_TIMEOUT,
+        follow_redirects=True,
+        http2=True,
+    )
+
+
+def _build_async_http_client() -> httpx.AsyncClient:
+    """Builds the pooled keep-alive HTTP client for the async Supabase client."""
+    return httpx.AsyncClient(
+        limits=_pool_limits(),
+        timeout=settings.SUPABASE_TIMEOUT,
+        follow_redirects=True,
+        http2=True,
+    )
+
+
+def init_supabase_clients() -> None:
+    """Creates the process-wide Supabase clients. Called once from the app lifespan."""
+    global _http_client, _supabase_client, _supabase_auth_client
+
+    if _supabase_client is not None:
+        return
+
+    supabase_url, supabase_key = _get_credentials()
+    _http_client = _build_http_client()
+
+    # The service client never holds a user session, so a sign-in can not
+    # swap its Authorization header for every other request.
+    _supabase_client = create_client(
+        supabase_url,
+        supabase_key,
+        ClientOptions(
+            auto_refresh_token=False,
+            persist_session=False,
+            httpx_client=_http_client,
+        ),
+    )
+
+    # Session-producing calls (sign in, sign up, refresh) go through a bare
+    # auth client that shares the connection pool but has no PostgREST or
+    # storage state attached to it.
+    _supabase_auth_client = SupabaseAuthClient(
+        url=f"{supabase_url.rstrip('/')}/auth/v1",
+        headers={"apiKey": supabase_key, "Authorization": f"Bearer {supabase_key}"},
+        auto_refresh_token=False,
+        persist_session=False,
+        http_client=_http_client,
+    )
+
+
+async def init_async_supabase_client() -> None:
+    """Creates the process-wide async Supabase client. Called once from the app lifespan."""
+    global _async_http_client, _async_supabase_client
+
+    if _async_supabase_client is not None:
+        return
+
+    supabase_url, supabase_key = _get_credentials()
+    _async_http_client = _build_async_http_client()
+
+    _async_supabase_client = await acreate_client(
+        supabase_url,
+        supabase_key,
+        AsyncClientOptions(
+            auto_refresh_token=False,
+            persist_session=False,
+            httpx_client=_async_http_client,
+        ),
+    )
+
+
+async def close_async_supabase_client() -> None:
+    """Closes the async connection pool. Called once on app shutdown."""
+    global _async_http_client, _async_supabase_client
+
+    if _async_http_client is not None:
+        await _async_http_client.aclose()
+
+    _async_http_client = None
+    _async_supabase_client = None
+
+
+def close_supabase_clients() -> None:
+    """Closes the shared connection pool. Called once on app shutdown."""
+    global _http_client, _supabase_client, _supabase_auth_client
+
+    if _http_client is not None:
+        _http_client.close()
+
+    _http_client = None
+    _supabase_client = None
+    _supabase_auth_client = None
+
+
+def get_supabase_client() -> Client:
+    """Returns the shared service-role client."""
+    if _supabase_client is None:
+        init_supabase_clients()
+    return _supabase_client  # type: ignore[return-value]
+
+
+def get_supabase_auth_client() -> SupabaseAuthClient:
+    """Returns the shared client used for user sign-in flows."""
+    if _supabase_auth_client is None:
+        init_supabase_clients()
+    return _supabase_auth_client  # type: ignore[return-value]
+
 
-    return supabase_client
+async def get_async_supabase_client() -> AsyncClient:
+    """Returns the shared async service-role client."""
+    if _async_supabase_client is None:
+        await init_async_supabase_client()
+    return _async_supabase_client  # type: ignore[return-value]
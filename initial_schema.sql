@@ -40,213 +40,224 @@ CREATE OR REPLACE FUNCTION insert_food_analysis_with_components(
     _created_at TIMESTAMPTZ,
     _food_components JSONB
 ) RETURNS VOID AS $$
-DECLARE
-    component JSONB;
 BEGIN
-    BEGIN
-        INSERT INTO food_analysis_results (
-            id,
-            user_id,
-            food_name_en,
-            food_name_th,
-            image_url,
-            created_at,
-            deleted_at
-        ) VALUES (
-            _id,
-            _user_id,
-            _food_name_en,
-            _food_name_th,
-            _image_url,
-            _created_at,
-            NULL
-        );
-
-        FOR component IN SELECT * FROM jsonb_array_elements(_food_components)
-        LOOP
-            INSERT INTO food_components (
-                id,
-                far_id,
-                name_en,
-                name_th,
-                calories,
-                protein,
-                carbohydrates,
-                fat,
-                fiber,
-                sugar,
-                deleted_at
-            ) VALUES (
-                (component ->> 'id')::UUID,
-                _id,
-                component ->> 'name_en',
-                component ->> 'name_th',
-                (component ->> 'calories')::INT,
-                (component ->> 'protein')::INT,
-                (component ->> 'carbohydrates')::INT,
-                (component ->> 'fat')::INT,
-                (component ->> 'fiber')::INT,
-                (component ->> 'sugar')::INT,
-                NULL
-            );
-        END LOOP;
-
-    EXCEPTION
-        WHEN OTHERS THEN
-            RAISE;
-    END;
+    INSERT INTO food_analysis_results (
+        id,
+        user_id,
+        food_name_en,
+        food_name_th,
+        image_url,
+        created_at,
+        deleted_at
+    ) VALUES (
+        _id,
+        _user_id,
+        _food_name_en,
+        _food_name_th,
+        _image_url,
+        _created_at,
+        NULL
+    );
+
+    INSERT INTO food_components (
+        id,
+        far_id,
+        name_en,
+        name_th,
+        calories,
+        protein,
+        carbohydrates,
+        fat,
+        fiber,
+        sugar,
+        deleted_at
+    )
+    SELECT
+        c.id,
+        _id,
+        c.name_en,
+        c.name_th,
+        c.calories,
+        c.protein,
+        c.carbohydrates,
+        c.fat,
+        c.fiber,
+        c.sugar,
+        NULL
+    FROM jsonb_to_recordset(_food_components) AS c(
+        id UUID,
+        name_en TEXT,
+        name_th TEXT,
+        calories INT,
+        protein INT,
+        carbohydrates INT,
+        fat INT,
+        fiber INT,
+        sugar INT
+    );
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION insert_food_analyses_with_components(
+    _meals JSONB
+) RETURNS VOID AS $$
+BEGIN
+    -- Batch variant of insert_food_analysis_with_components: every element of
+    -- _meals carries the same keys as that function's parameters, and all
+    -- meals are written in one transaction.
+    INSERT INTO food_analysis_results (
+        id,
+        user_id,
+        food_name_en,
+        food_name_th,
+        image_url,
+        created_at,
+        deleted_at
+    )
+    SELECT
+        m._id,
+        m._user_id,
+        m._food_name_en,
+        m._food_name_th,
+        m._image_url,
+        m._created_at,
+        NULL
+    FROM jsonb_to_recordset(_meals) AS m(
+        _id UUID,
+        _user_id UUID,
+        _food_name_en TEXT,
+        _food_name_th TEXT,
+        _image_url TEXT,
+        _created_at TIMESTAMPTZ
+    );
+
+    INSERT INTO food_components (
+        id,
+        far_id,
+        name_en,
+        name_th,
+        calories,
+        protein,
+        carbohydrates,
+        fat,
+        fiber,
+        sugar,
+        deleted_at
+    )
+    SELECT
+        c.id,
+        (meal ->> '_id')::UUID,
+        c.name_en,
+        c.name_th,
+        c.calories,
+        c.protein,
+        c.carbohydrates,
+        c.fat,
+        c.fiber,
+        c.sugar,
+        NULL
+    FROM jsonb_array_elements(_meals) AS meal
+    CROSS JOIN LATERAL jsonb_to_recordset(meal -> '_food_components') AS c(
+        id UUID,
+        name_en TEXT,
+        name_th TEXT,
+        calories INT,
+        protein INT,
+        carbohydrates INT,
+        fat INT,
+        fiber INT,
+        sugar INT
+    );
 END;
 $$ LANGUAGE plpgsql;
 
+-- The components of one meal as a JSON array, with their totals. Used through
+-- a lateral join by the read functions below; being a single stable SQL
+-- select, the planner inlines it, so each meal's components are read once via
+-- idx_fc_far_id.
+create or replace function food_components_summary(p_far_id uuid)
+returns table (
+  food_components jsonb,
+  total_calories bigint,
+  total_protein bigint,
+  total_carbohydrates bigint,
+  total_fat bigint,
+  total_fiber bigint,
+  total_sugar bigint
+)
+language sql
+stable
+as $$
+select
+  coalesce(jsonb_agg(jsonb_build_object(
+    'id', fc.id,
+    'name_en', fc.name_en,
+    'name_th', fc.name_th,
+    'calories', fc.calories,
+    'protein', fc.protein,
+    'carbohydrates', fc.carbohydrates,
+    'fat', fc.fat,
+    'fiber', fc.fiber,
+    'sugar', fc.sugar
+  )), '[]'::jsonb),
+  coalesce(sum(fc.calories), 0),
+  coalesce(sum(fc.protein), 0),
+  coalesce(sum(fc.carbohydrates), 0),
+  coalesce(sum(fc.fat), 0),
+  coalesce(sum(fc.fiber), 0),
+  coalesce(sum(fc.sugar), 0)
+from food_components fc
+where fc.far_id = p_far_id and fc.deleted_at is null;
+$$;
+
 create or replace function get_food_analysis_result(p_id uuid)
 returns jsonb
 language sql
+stable
 as $$
-with base as (
-  select
-    far.id as far_id,
-    far.user_id,
-    far.food_name_en,
-    far.food_name_th,
-    far.image_url,
-    fc.id as component_id,
-    fc.name_en,
-    fc.name_th,
-    fc.calories,
-    fc.protein,
-    fc.carbohydrates,
-    fc.fat,
-    fc.fiber,
-    fc.sugar
-  from food_analysis_results far
-  left join food_components fc on fc.far_id = far.id and fc.deleted_at is null
-  where far.id = p_id and far.deleted_at is null
-),
-aggregated as (
-  select
-    far_id,
-    jsonb_agg(jsonb_build_object(
-      'id', component_id,
-      'name_en', name_en,
-      'name_th', name_th,
-      'calories', calories,
-      'protein', protein,
-      'carbohydrates', carbohydrates,
-      'fat', fat,
-      'fiber', fiber,
-      'sugar', sugar
-    )) as food_components,
-    coalesce(sum(calories), 0) as total_calories,
-    coalesce(sum(protein), 0) as total_protein,
-    coalesce(sum(carbohydrates), 0) as total_carbohydrates,
-    coalesce(sum(fat), 0) as total_fat,
-    coalesce(sum(fiber), 0) as total_fiber,
-    coalesce(sum(sugar), 0) as total_sugar
-  from base
-  group by far_id
-)
 select jsonb_build_object(
   'id', far.id,
   'user_id', far.user_id,
   'food_name_en', far.food_name_en,
   'food_name_th', far.food_name_th,
   'image_url', far.image_url,
-  'food_components', agg.food_components,
-  'total_calories', agg.total_calories,
-  'total_protein', agg.total_protein,
-  'total_carbohydrates', agg.total_carbohydrates,
-  'total_fat', agg.total_fat,
-  'total_fiber', agg.total_fiber,
-  'total_sugar', agg.total_sugar,
+  'food_components', fc.food_components,
+  'total_calories', fc.total_calories,
+  'total_protein', fc.total_protein,
+  'total_carbohydrates', fc.total_carbohydrates,
+  'total_fat', fc.total_fat,
+  'total_fiber', fc.total_fiber,
+  'total_sugar', fc.total_sugar,
   'created_at', far.created_at
 )
 from food_analysis_results far
-join aggregated agg on agg.far_id = far.id
+cross join lateral food_components_summary(far.id) fc
 where far.id = p_id and far.deleted_at is null;
 $$;
 
 create or replace function get_food_analysis_results_by_user(p_user_id uuid)
 returns jsonb
 language sql
+stable
 as $$
-with base as (
-  select
-    far.id as far_id,
-    far.user_id,
-    far.food_name_en,
-    far.food_name_th,
-    far.image_url,
-    fc.id as component_id,
-    fc.name_en,
-    fc.name_th,
-    fc.calories,
-    fc.protein,
-    fc.carbohydrates,
-    fc.fat,
-    fc.fiber,
-    fc.sugar
-  from food_analysis_results far
-  left join food_components fc on fc.far_id = far.id and fc.deleted_at is null
-  where far.user_id = p_user_id and far.deleted_at is null
-),
-aggregated as (
-  select
-    far_id,
-    jsonb_agg(jsonb_build_object(
-      'id', component_id,
-      'name_en', name_en,
-      'name_th', name_th,
-      'calories', calories,
-      'protein', protein,
-      'carbohydrates', carbohydrates,
-      'fat', fat,
-      'fiber', fiber,
-      'sugar', sugar
-    )) as food_components,
-    coalesce(sum(calories), 0) as total_calories,
-    coalesce(sum(protein), 0) as total_protein,
-    coalesce(sum(carbohydrates), 0) as total_carbohydrates,
-    coalesce(sum(fat), 0) as total_fat,
-    coalesce(sum(fiber), 0) as total_fiber,
-    coalesce(sum(sugar), 0) as total_sugar
-  from base
-  group by far_id
-),
-final_data as (
-  select
-    far.id,
-    far.user_id,
-    far.food_name_en,
-    far.food_name_th,
-    far.image_url,
-    far.created_at,
-    agg.food_components,
-    agg.total_calories,
-    agg.total_protein,
-    agg.total_carbohydrates,
-    agg.total_fat,
-    agg.total_fiber,
-    agg.total_sugar
-  from food_analysis_results far
-  join aggregated agg on agg.far_id = far.id
-  where far.user_id = p_user_id and far.deleted_at is null
-)
 select jsonb_agg(jsonb_build_object(
-  'id', id,
-  'user_id', user_id,
-  'food_name_en', food_name_en,
-  'food_name_th', food_name_th,
-  'image_url', image_url,
-  'food_components', food_components,
-  'total_calories', total_calories,
-  'total_protein', total_protein,
-  'total_carbohydrates', total_carbohydrates,
-  'total_fat', total_fat,
-  'total_fiber', total_fiber,
-  'total_sugar', total_sugar,
-  'created_at', created_at
-))
-from final_data;
+  'id', far.id,
+  'user_id', far.user_id,
+  'food_name_en', far.food_name_en,
+  'food_name_th', far.food_name_th,
+  'image_url', far.image_url,
+  'food_components', fc.food_components,
+  'total_calories', fc.total_calories,
+  'total_protein', fc.total_protein,
+  'total_carbohydrates', fc.total_carbohydrates,
+  'total_fat', fc.total_fat,
+  'total_fiber', fc.total_fiber,
+  'total_sugar', fc.total_sugar,
+  'created_at', far.created_at
+) order by far.created_at)
+from food_analysis_results far
+cross join lateral food_components_summary(far.id) fc
+where far.user_id = p_user_id and far.deleted_at is null;
 $$;
 
 create or replace function get_food_analysis_results_by_user_and_date(
@@ -256,91 +267,540 @@ create or replace function get_food_analysis_results_by_user_and_date(
 )
 returns jsonb
 language sql
+stable
 as $$
-with base as (
-  select
-    far.id as far_id,
-    far.user_id,
-    far.food_name_en,
-    far.food_name_th,
-    far.image_url,
-    far.created_at,
-    fc.id as component_id,
-    fc.name_en,
-    fc.name_th,
-    fc.calories,
-    fc.protein,
-    fc.carbohydrates,
-    fc.fat,
-    fc.fiber,
-    fc.sugar
-  from food_analysis_results far
-  left join food_components fc on fc.far_id = far.id and fc.deleted_at is null
-  where far.user_id = p_user_id
-    and far.created_at >= p_start_date
-    and far.created_at <= p_end_date
-    and far.deleted_at is null
-),
-aggregated as (
-  select
-    far_id,
-    jsonb_agg(jsonb_build_object(
-      'id', component_id,
-      'name_en', name_en,
-      'name_th', name_th,
-      'calories', calories,
-      'protein', protein,
-      'carbohydrates', carbohydrates,
-      'fat', fat,
-      'fiber', fiber,
-      'sugar', sugar
-    )) as food_components,
-    coalesce(sum(calories), 0) as total_calories,
-    coalesce(sum(protein), 0) as total_protein,
-    coalesce(sum(carbohydrates), 0) as total_carbohydrates,
-    coalesce(sum(fat), 0) as total_fat,
-    coalesce(sum(fiber), 0) as total_fiber,
-    coalesce(sum(sugar), 0) as total_sugar
-  from base
-  group by far_id
-),
-final_data as (
-  select
-    far.id,
-    far.user_id,
-    far.food_name_en,
-    far.food_name_th,
-    far.image_url,
-    far.created_at,
-    agg.food_components,
-    agg.total_calories,
-    agg.total_protein,
-    agg.total_carbohydrates,
-    agg.total_fat,
-    agg.total_fiber,
-    agg.total_sugar
+select jsonb_agg(jsonb_build_object(
+  'id', far.id,
+  'user_id', far.user_id,
+  'food_name_en', far.food_name_en,
+  'food_name_th', far.food_name_th,
+  'image_url', far.image_url,
+  'created_at', far.created_at,
+  'food_components', fc.food_components,
+  'total_calories', fc.total_calories,
+  'total_protein', fc.total_protein,
+  'total_carbohydrates', fc.total_carbohydrates,
+  'total_fat', fc.total_fat,
+  'total_fiber', fc.total_fiber,
+  'total_sugar', fc.total_sugar
+) order by far.created_at)
+from food_analysis_results far
+cross join lateral food_components_summary(far.id) fc
+where far.user_id = p_user_id
+  and far.created_at >= p_start_date
+  and far.created_at <= p_end_date
+  and far.deleted_at is null;
+$$;
+
+-- One page of a user's meals, newest first. The cursor is the (created_at, id)
+-- of the last meal of the previous page; pass nulls for the first page. The
+-- created_at bound lets idx_far_user_created_at be scanned backwards from the
+-- cursor, so only the rows of the requested page are read.
+create or replace function get_food_analysis_results_page(
+  p_user_id uuid,
+  p_limit integer,
+  p_cursor_created_at timestamptz default null,
+  p_cursor_id uuid default null
+)
+returns jsonb
+language sql
+stable
+as $$
+with page as (
+  select far.id, far.user_id, far.food_name_en, far.food_name_th, far.image_url, far.created_at
   from food_analysis_results far
-  join aggregated agg on agg.far_id = far.id
   where far.user_id = p_user_id
-    and far.created_at >= p_start_date
-    and far.created_at <= p_end_date
     and far.deleted_at is null
+    and far.created_at <= coalesce(p_cursor_created_at, 'infinity'::timestamptz)
+    and (
+      p_cursor_created_at is null
+      or far.created_at < p_cursor_created_at
+      or far.id < p_cursor_id
+    )
+  order by far.created_at desc, far.id desc
+  limit p_limit
 )
-select jsonb_agg(jsonb_build_object(
-  'id', id,
-  'user_id', user_id,
-  'food_name_en', food_name_en,
-  'food_name_th', food_name_th,
-  'image_url', image_url,
-  'created_at', created_at,
-  'food_components', food_components,
-  'total_calories', total_calories,
-  'total_protein', total_protein,
-  'total_carbohydrates', total_carbohydrates,
-  'total_fat', total_fat,
-  'total_fiber', total_fiber,
-  'total_sugar', total_sugar
-))
-from final_data;
+select coalesce(jsonb_agg(jsonb_build_object(
+  'id', page.id,
+  'user_id', page.user_id,
+  'food_name_en', page.food_name_en,
+  'food_name_th', page.food_name_th,
+  'image_url', page.image_url,
+  'created_at', page.created_at,
+  'food_components', fc.food_components,
+  'total_calories', fc.total_calories,
+  'total_protein', fc.total_protein,
+  'total_carbohydrates', fc.total_carbohydrates,
+  'total_fat', fc.total_fat,
+  'total_fiber', fc.total_fiber,
+  'total_sugar', fc.total_sugar
+) order by page.created_at desc, page.id desc), '[]'::jsonb)
+from page
+cross join lateral food_components_summary(page.id) fc;
+$$;
+
+-- Per-day nutrition totals, kept up to date by the triggers below so that a
+-- summary over a date range reads one row per day instead of every meal.
+-- Days are local to a timezone, so totals are kept for each timezone a user
+-- has asked for; get_daily_nutrition_totals registers a timezone and fills
+-- it from the user's history the first time it is requested.
+create table if not exists public.nutrition_rollup_timezones (
+  user_id uuid not null,
+  timezone text not null,
+  created_at timestamp with time zone not null default now(),
+  constraint nutrition_rollup_timezones_pkey primary key (user_id, timezone),
+  constraint nutrition_rollup_timezones_user_id_fkey foreign KEY (user_id) references auth.users (id) on delete CASCADE
+) TABLESPACE pg_default;
+
+create table if not exists public.daily_nutrition_totals (
+  user_id uuid not null,
+  timezone text not null,
+  local_date date not null,
+  meal_count integer not null default 0,
+  total_calories bigint not null default 0,
+  total_protein bigint not null default 0,
+  total_carbohydrates bigint not null default 0,
+  total_fat bigint not null default 0,
+  total_fiber bigint not null default 0,
+  total_sugar bigint not null default 0,
+  constraint daily_nutrition_totals_pkey primary key (user_id, timezone, local_date),
+  constraint daily_nutrition_totals_user_id_fkey foreign KEY (user_id) references auth.users (id) on delete CASCADE
+) TABLESPACE pg_default;
+
+-- Adds signed deltas to the totals of every registered timezone. Each element
+-- of p_deltas has user_id and created_at (of the meal) and any of meal_count,
+-- calories, protein, carbohydrates, fat, fiber and sugar.
+--
+-- Writers hold a shared lock on each user until they commit, and registering
+-- a timezone takes it exclusively (see get_daily_nutrition_totals). Without
+-- it, a meal written while a timezone is being registered could be missed by
+-- both: the registration's backfill does not see the uncommitted meal, and
+-- the meal's deltas are applied before the new timezone is visible. Each
+-- statement of this function takes a new snapshot, so the insert sees every
+-- timezone registered before the lock was granted.
+create or replace function apply_daily_nutrition_deltas(p_deltas jsonb)
+returns void
+language sql
+as $$
+select pg_advisory_xact_lock_shared(hashtext(u.user_id::text))
+from (
+  select distinct d.user_id
+  from jsonb_to_recordset(p_deltas) as d(user_id uuid)
+  order by d.user_id
+) u;
+
+insert into daily_nutrition_totals as t (
+  user_id,
+  timezone,
+  local_date,
+  meal_count,
+  total_calories,
+  total_protein,
+  total_carbohydrates,
+  total_fat,
+  total_fiber,
+  total_sugar
+)
+select
+  d.user_id,
+  tz.timezone,
+  (d.created_at at time zone tz.timezone)::date,
+  sum(coalesce(d.meal_count, 0)),
+  sum(coalesce(d.calories, 0)),
+  sum(coalesce(d.protein, 0)),
+  sum(coalesce(d.carbohydrates, 0)),
+  sum(coalesce(d.fat, 0)),
+  sum(coalesce(d.fiber, 0)),
+  sum(coalesce(d.sugar, 0))
+from jsonb_to_recordset(p_deltas) as d(
+  user_id uuid,
+  created_at timestamptz,
+  meal_count integer,
+  calories bigint,
+  protein bigint,
+  carbohydrates bigint,
+  fat bigint,
+  fiber bigint,
+  sugar bigint
+)
+join nutrition_rollup_timezones tz on tz.user_id = d.user_id
+-- Users being deleted take their totals with them.
+join auth.users users on users.id = d.user_id
+group by 1, 2, 3
+on conflict (user_id, timezone, local_date) do update set
+  meal_count = t.meal_count + excluded.meal_count,
+  total_calories = t.total_calories + excluded.total_calories,
+  total_protein = t.total_protein + excluded.total_protein,
+  total_carbohydrates = t.total_carbohydrates + excluded.total_carbohydrates,
+  total_fat = t.total_fat + excluded.total_fat,
+  total_fiber = t.total_fiber + excluded.total_fiber,
+  total_sugar = t.total_sugar + excluded.total_sugar;
+$$;
+
+create or replace function daily_nutrition_on_meal_insert()
+returns trigger
+language plpgsql
+as $$
+begin
+  perform apply_daily_nutrition_deltas((
+    select jsonb_agg(jsonb_build_object(
+      'user_id', m.user_id,
+      'created_at', m.created_at,
+      'meal_count', 1
+    ))
+    from new_meals m
+    where m.deleted_at is null
+  ));
+  return null;
+end;
+$$;
+
+-- Soft deletes and restores, and changes of owner or time, move the whole
+-- meal out of its old day and into its new one.
+create or replace function daily_nutrition_on_meal_update()
+returns trigger
+language plpgsql
+as $$
+begin
+  perform apply_daily_nutrition_deltas((
+    with changed as (
+      select
+        o.id,
+        o.user_id as old_user_id,
+        o.created_at as old_created_at,
+        o.deleted_at is null as old_live,
+        n.user_id as new_user_id,
+        n.created_at as new_created_at,
+        n.deleted_at is null as new_live
+      from old_meals o
+      join new_meals n on n.id = o.id
+      where (o.deleted_at is null) <> (n.deleted_at is null)
+        or o.created_at <> n.created_at
+        or o.user_id <> n.user_id
+    ),
+    deltas as (
+      select c.old_user_id as user_id, c.old_created_at as created_at, -1 as sign, c.id
+      from changed c
+      where c.old_live
+      union all
+      select c.new_user_id, c.new_created_at, 1, c.id
+      from changed c
+      where c.new_live
+    )
+    select jsonb_agg(jsonb_build_object(
+      'user_id', d.user_id,
+      'created_at', d.created_at,
+      'meal_count', d.sign,
+      'calories', d.sign * fc.total_calories,
+      'protein', d.sign * fc.total_protein,
+      'carbohydrates', d.sign * fc.total_carbohydrates,
+      'fat', d.sign * fc.total_fat,
+      'fiber', d.sign * fc.total_fiber,
+      'sugar', d.sign * fc.total_sugar
+    ))
+    from deltas d
+    cross join lateral food_components_summary(d.id) fc
+  ));
+  return null;
+end;
+$$;
+
+-- Runs before the delete so the meal's components are still there to subtract;
+-- their own delete trigger then finds no live meal and does nothing.
+create or replace function daily_nutrition_on_meal_delete()
+returns trigger
+language plpgsql
+as $$
+begin
+  if old.deleted_at is null then
+    perform apply_daily_nutrition_deltas((
+      select jsonb_build_array(jsonb_build_object(
+        'user_id', old.user_id,
+        'created_at', old.created_at,
+        'meal_count', -1,
+        'calories', -fc.total_calories,
+        'protein', -fc.total_protein,
+        'carbohydrates', -fc.total_carbohydrates,
+        'fat', -fc.total_fat,
+        'fiber', -fc.total_fiber,
+        'sugar', -fc.total_sugar
+      ))
+      from food_components_summary(old.id) fc
+    ));
+  end if;
+  return old;
+end;
+$$;
+
+-- Adds (p_sign = 1) or subtracts (p_sign = -1) food_components rows, given as
+-- a jsonb array, to the totals of their meals, if those meals are live.
+create or replace function apply_daily_nutrition_components(p_components jsonb, p_sign integer)
+returns void
+language sql
+as $$
+select apply_daily_nutrition_deltas((
+  select jsonb_agg(jsonb_build_object(
+    'user_id', far.user_id,
+    'created_at', far.created_at,
+    'calories', p_sign * c.calories,
+    'protein', p_sign * c.protein,
+    'carbohydrates', p_sign * c.carbohydrates,
+    'fat', p_sign * c.fat,
+    'fiber', p_sign * c.fiber,
+    'sugar', p_sign * c.sugar
+  ))
+  from jsonb_populate_recordset(null::food_components, p_components) c
+  join food_analysis_results far on far.id = c.far_id and far.deleted_at is null
+  where c.deleted_at is null
+));
+$$;
+
+-- Component inserts, updates (including soft deletes) and deletes: subtract the
+-- old rows and add the new ones. Each transition table is only referenced in
+-- the branch of the operation that defines it.
+create or replace function daily_nutrition_on_component_change()
+returns trigger
+language plpgsql
+as $$
+begin
+  if tg_op in ('UPDATE', 'DELETE') then
+    perform apply_daily_nutrition_components(
+      (select jsonb_agg(to_jsonb(o)) from old_components o), -1
+    );
+  end if;
+  if tg_op in ('INSERT', 'UPDATE') then
+    perform apply_daily_nutrition_components(
+      (select jsonb_agg(to_jsonb(n)) from new_components n), 1
+    );
+  end if;
+  return null;
+end;
+$$;
+
+drop trigger if exists daily_nutrition_meal_insert on food_analysis_results;
+create trigger daily_nutrition_meal_insert
+  after insert on food_analysis_results
+  referencing new table as new_meals
+  for each statement execute function daily_nutrition_on_meal_insert();
+
+drop trigger if exists daily_nutrition_meal_update on food_analysis_results;
+create trigger daily_nutrition_meal_update
+  after update on food_analysis_results
+  referencing old table as old_meals new table as new_meals
+  for each statement execute function daily_nutrition_on_meal_update();
+
+drop trigger if exists daily_nutrition_meal_delete on food_analysis_results;
+create trigger daily_nutrition_meal_delete
+  before delete on food_analysis_results
+  for each row execute function daily_nutrition_on_meal_delete();
+
+drop trigger if exists daily_nutrition_component_insert on food_components;
+create trigger daily_nutrition_component_insert
+  after insert on food_components
+  referencing new table as new_components
+  for each statement execute function daily_nutrition_on_component_change();
+
+drop trigger if exists daily_nutrition_component_update on food_components;
+create trigger daily_nutrition_component_update
+  after update on food_components
+  referencing old table as old_components new table as new_components
+  for each statement execute function daily_nutrition_on_component_change();
+
+drop trigger if exists daily_nutrition_component_delete on food_components;
+create trigger daily_nutrition_component_delete
+  after delete on food_components
+  referencing old table as old_components
+  for each statement execute function daily_nutrition_on_component_change();
+
+-- Daily totals of a user between two local dates (inclusive), one element per
+-- day that has meals. The first request for a timezone builds its totals from
+-- the user's meals; every later one only reads daily_nutrition_totals. The API
+-- passes a normalized timezone name, so aliases of a zone share its totals.
+create or replace function get_daily_nutrition_totals(
+  p_user_id uuid,
+  p_timezone text,
+  p_from date,
+  p_to date
+)
+returns jsonb
+language plpgsql
+as $$
+begin
+  if not exists (
+    select 1
+    from nutrition_rollup_timezones
+    where user_id = p_user_id and timezone = p_timezone
+  ) then
+    -- Waits for the user's meal writes in progress to commit, so that the
+    -- backfill below sees them, and holds off new ones until the timezone is
+    -- visible to them.
+    perform pg_advisory_xact_lock(hashtext(p_user_id::text));
+
+    insert into nutrition_rollup_timezones (user_id, timezone)
+    values (p_user_id, p_timezone)
+    on conflict do nothing;
+
+    if found then
+      insert into daily_nutrition_totals as t (
+        user_id,
+        timezone,
+        local_date,
+        meal_count,
+        total_calories,
+        total_protein,
+        total_carbohydrates,
+        total_fat,
+        total_fiber,
+        total_sugar
+      )
+      select
+        p_user_id,
+        p_timezone,
+        (far.created_at at time zone p_timezone)::date,
+        count(*),
+        sum(fc.total_calories),
+        sum(fc.total_protein),
+        sum(fc.total_carbohydrates),
+        sum(fc.total_fat),
+        sum(fc.total_fiber),
+        sum(fc.total_sugar)
+      from food_analysis_results far
+      cross join lateral food_components_summary(far.id) fc
+      where far.user_id = p_user_id and far.deleted_at is null
+      group by 3
+      on conflict (user_id, timezone, local_date) do update set
+        meal_count = excluded.meal_count,
+        total_calories = excluded.total_calories,
+        total_protein = excluded.total_protein,
+        total_carbohydrates = excluded.total_carbohydrates,
+        total_fat = excluded.total_fat,
+        total_fiber = excluded.total_fiber,
+        total_sugar = excluded.total_sugar;
+    end if;
+  end if;
+
+  return (
+    select coalesce(jsonb_agg(jsonb_build_object(
+      'date', t.local_date,
+      'meal_count', t.meal_count,
+      'total_calories', t.total_calories,
+      'total_protein', t.total_protein,
+      'total_carbohydrates', t.total_carbohydrates,
+      'total_fat', t.total_fat,
+      'total_fiber', t.total_fiber,
+      'total_sugar', t.total_sugar
+    ) order by t.local_date), '[]'::jsonb)
+    from daily_nutrition_totals t
+    where t.user_id = p_user_id
+      and t.timezone = p_timezone
+      and t.local_date between p_from and p_to
+      and t.meal_count > 0
+  );
+end;
+$$;
+
+-- A counter per user that changes whenever any of the user's meals or
+-- components is written. The API builds meal ETags from it, so a conditional
+-- GET is answered with one primary key lookup instead of an aggregation.
+create table if not exists public.meal_versions (
+  user_id uuid not null,
+  version bigint not null default 0,
+  updated_at timestamp with time zone not null default now(),
+  constraint meal_versions_pkey primary key (user_id),
+  constraint meal_versions_user_id_fkey foreign KEY (user_id) references auth.users (id) on delete CASCADE
+) TABLESPACE pg_default;
+
+-- Users that are being deleted are skipped: their meals are deleted along
+-- with them, and a version inserted for them would fail the foreign key.
+create or replace function bump_meal_versions(p_user_ids uuid[])
+returns void
+language sql
+as $$
+insert into meal_versions as v (user_id, version, updated_at)
+select distinct u, 1, now()
+from unnest(p_user_ids) u
+join auth.users users on users.id = u
+on conflict (user_id) do update set
+  version = v.version + 1,
+  updated_at = excluded.updated_at;
 $$;
 
+-- Each transition table is only referenced in the branch of the operation
+-- that defines it.
+create or replace function meal_version_on_meal_change()
+returns trigger
+language plpgsql
+as $$
+begin
+  if tg_op in ('UPDATE', 'DELETE') then
+    perform bump_meal_versions(array(select o.user_id from old_meals o));
+  end if;
+  if tg_op = 'INSERT' then
+    perform bump_meal_versions(array(select n.user_id from new_meals n));
+  elsif tg_op = 'UPDATE' then
+    perform bump_meal_versions(
+      array(select n.user_id from new_meals n join old_meals o on o.id = n.id where n.user_id <> o.user_id)
+    );
+  end if;
+  return null;
+end;
+$$;
+
+create or replace function meal_version_on_component_change()
+returns trigger
+language plpgsql
+as $$
+begin
+  if tg_op in ('UPDATE', 'DELETE') then
+    perform bump_meal_versions(array(
+      select far.user_id
+      from old_components o
+      join food_analysis_results far on far.id = o.far_id
+    ));
+  end if;
+  if tg_op in ('INSERT', 'UPDATE') then
+    perform bump_meal_versions(array(
+      select far.user_id
+      from new_components n
+      join food_analysis_results far on far.id = n.far_id
+    ));
+  end if;
+  return null;
+end;
+$$;
+
+drop trigger if exists meal_version_meal_insert on food_analysis_results;
+create trigger meal_version_meal_insert
+  after insert on food_analysis_results
+  referencing new table as new_meals
+  for each statement execute function meal_version_on_meal_change();
+
+drop trigger if exists meal_version_meal_update on food_analysis_results;
+create trigger meal_version_meal_update
+  after update on food_analysis_results
+  referencing old table as old_meals new table as new_meals
+  for each statement execute function meal_version_on_meal_change();
+
+drop trigger if exists meal_version_meal_delete on food_analysis_results;
+create trigger meal_version_meal_delete
+  after delete on food_analysis_results
+  referencing old table as old_meals
+  for each statement execute function meal_version_on_meal_change();
+
+drop trigger if exists meal_version_component_insert on food_components;
+create trigger meal_version_component_insert
+  after insert on food_components
+  referencing new table as new_components
+  for each statement execute function meal_version_on_component_change();
+
+drop trigger if exists meal_version_component_update on food_components;
+create trigger meal_version_component_update
+  after update on food_components
+  referencing old table as old_components new table as new_components
+  for each statement execute function meal_version_on_component_change();
+
+drop trigger if exists meal_version_component_delete on food_components;
+create trigger meal_version_component_delete
+  after delete on food_components
+  referencing old table as old_components
+  for each statement execute function meal_version_on_component_change();
@@ -1,12 +1,49 @@
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
 
-from api.v1.routes import analyze, auth, meals, user
+from fastapi import FastAPI, Response
+
+from api.v1.routes import analyze, auth, debug, meals, user
+from api.v1.services.analysis_cache import analysis_cache
+from api.v1.services.analysis_jobs import analysis_job_queue
+from api.v1.services.gemini_service import system_instruction_cache
+from core.metrics import CONTENT_TYPE_LATEST, generate_metrics, mark_process_dead
 from core.middleware import add_middleware
+from core.process_pool import close_process_pool, init_process_pool
+from core.security import token_verifier
+from core.supabase import (
+    close_async_supabase_client,
+    close_supabase_clients,
+    init_async_supabase_client,
+    init_supabase_clients,
+)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    init_supabase_clients()
+    await init_async_supabase_client()
+    await token_verifier.start()
+    init_process_pool()
+    analysis_cache.open()
+    await analysis_job_queue.start()
+    try:
+        yield
+    finally:
+        await analysis_job_queue.stop()
+        await system_instruction_cache.delete()
+        analysis_cache.close()
+        close_process_pool()
+        await token_verifier.stop()
+        await close_async_supabase_client()
+        close_supabase_clients()
+        mark_process_dead()
+
 
 app = FastAPI(
     title="Food Nutritional Information",
     version="1.0",
     docs_url="/documentation",
+    lifespan=lifespan,
 )
 
 add_middleware(app)
@@ -23,8 +60,14 @@ app.include_router(
     prefix="/api/v1",
     tags=["Meal"],
 )
+app.include_router(debug.router, include_in_schema=False)
 
 
 @app.get("/health", tags=["Health Check"])
 def health():
     return {"status": "UP"}
+
+
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    return Response(generate_metrics(), media_type=CONTENT_TYPE_LATEST)
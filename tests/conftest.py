@@ -0,0 +1,15 @@
+import os
+import tempfile
+
+# Settings are read when core.config is imported, which happens while the test
+# modules are collected, so the dummy values are set here. Values already set
+# in the environment win.
+_state_dir = tempfile.mkdtemp(prefix="tests-")
+for name, value in {
+    "SUPABASE_URL": "http://supabase.local",
+    "SUPABASE_KEY": "test-service-key",
+    "SUPABASE_JWT_SECRET": "test-jwt-secret-0123456789abcdef",
+    "GEMINI_API_KEY": "test-gemini-key",
+    "ANALYSIS_JOB_DB_PATH": os.path.join(_state_dir, "analysis_jobs.db"),
+}.items():
+    os.environ.setdefault(name, value)
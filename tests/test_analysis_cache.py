@@ -0,0 +1,83 @@
+import pytest
+
+from api.v1.services.analysis_cache import AnalysisCache
+
+HASH = 0x0123_4567_89AB_CDEF
+
+
+def _flip(image_hash: int, bits: list[int]) -> int:
+    for bit in bits:
+        image_hash ^= 1 << bit
+    return image_hash
+
+
+def test_near_duplicate_with_a_flipped_bit_in_all_but_one_band_is_found():
+    cache = AnalysisCache(max_distance=7)
+    cache.put(HASH, None, {"food_name_en": "Rice"})
+
+    # One bit in each of the first seven 8-bit bands; the last band still matches.
+    assert cache.get(_flip(HASH, [0, 9, 18, 27, 36, 45, 54]), None) == {"food_name_en": "Rice"}
+    assert cache.get(_flip(HASH, [0, 9, 18, 27, 36, 45, 54, 63]), None) is None
+
+
+def test_lookup_is_bounded_by_max_distance():
+    cache = AnalysisCache(max_distance=2)
+    cache.put(HASH, None, {"food_name_en": "Rice"})
+
+    assert cache.get(_flip(HASH, [0, 20]), None) is not None
+    assert cache.get(_flip(HASH, [0, 20, 40]), None) is None
+
+
+def test_closest_entry_wins():
+    cache = AnalysisCache(max_distance=4)
+    cache.put(_flip(HASH, [1, 2, 3]), None, {"food_name_en": "Far"})
+    cache.put(_flip(HASH, [1]), None, {"food_name_en": "Near"})
+    cache.put(_flip(HASH, [1, 2]), None, {"food_name_en": "Middle"})
+
+    assert cache.get(HASH, None) == {"food_name_en": "Near"}
+
+
+def test_descriptions_are_matched_after_normalization():
+    cache = AnalysisCache()
+    cache.put(HASH, "  Fried   RICE ", {"food_name_en": "Fried rice"})
+
+    assert cache.get(HASH, "fried rice") == {"food_name_en": "Fried rice"}
+    assert cache.get(HASH, "boiled rice") is None
+    assert cache.get(HASH, None) is None
+
+
+def test_evicted_and_expired_entries_leave_the_band_index():
+    cache = AnalysisCache(max_size=1)
+    cache.put(HASH, None, {"food_name_en": "Old"})
+    cache.put(~HASH & (2**64 - 1), None, {"food_name_en": "New"})
+
+    assert cache.get(HASH, None) is None
+    assert len(cache._bands) == 8
+
+    expired = AnalysisCache(ttl=0)
+    expired.put(HASH, None, {"food_name_en": "Rice"})
+
+    assert expired.get(HASH, None) is None
+    assert expired._bands == {}
+
+
+def test_entries_survive_a_restart(tmp_path):
+    path = str(tmp_path / "analysis_cache.db")
+    high_bit_hash = HASH | 1 << 63
+
+    cache = AnalysisCache(sqlite_path=path)
+    cache.open()
+    cache.put(high_bit_hash, "rice", {"food_name_en": "Rice"})
+    cache.close()
+
+    reopened = AnalysisCache(sqlite_path=path)
+    reopened.open()
+    try:
+        assert reopened.get(_flip(high_bit_hash, [5]), "rice") == {"food_name_en": "Rice"}
+    finally:
+        reopened.close()
+
+
+def test_max_distance_must_leave_a_band_to_match():
+    with pytest.raises(ValueError):
+        AnalysisCache(max_distance=8)
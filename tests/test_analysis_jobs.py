@@ -0,0 +1,68 @@
+import asyncio
+import sqlite3
+
+from api.v1.services import analysis_jobs
+from api.v1.services.analysis_jobs import AnalysisJobQueue, _ago, _now
+from core.security import AuthenticatedUser
+
+USER = AuthenticatedUser(id="11111111-1111-1111-1111-111111111111", aud="authenticated")
+
+
+def _insert(db_path: str, job_id: str, status: str, updated_at: str, owner: str) -> None:
+    with sqlite3.connect(db_path) as db:
+        db.execute(
+            "INSERT INTO analysis_jobs (id, user_id, user_json, status, image, "
+            "created_at, updated_at, owner) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (job_id, USER.id, USER.model_dump_json(), status, b"image", updated_at, updated_at, owner),
+        )
+
+
+def _status(db_path: str, job_id: str) -> tuple:
+    with sqlite3.connect(db_path) as db:
+        return db.execute(
+            "SELECT status, owner FROM analysis_jobs WHERE id = ?", (job_id,)
+        ).fetchone()
+
+
+def test_job_is_run_by_one_claimant(tmp_path, monkeypatch):
+    db_path = str(tmp_path / "jobs.db")
+    first = AnalysisJobQueue(db_path=db_path)
+    second = AnalysisJobQueue(db_path=db_path)
+    first._open()
+    second._open()
+    _insert(db_path, "job", "queued", _now(), owner="submitter")
+
+    runs = []
+
+    async def analyze(*args):
+        runs.append(args)
+        await asyncio.sleep(0.01)
+        raise ValueError("not food")
+
+    async def client():
+        return None
+
+    monkeypatch.setattr(analysis_jobs, "process_food_analysis", analyze)
+    monkeypatch.setattr(analysis_jobs, "get_async_supabase_client", client)
+
+    async def run_both():
+        await asyncio.gather(first._run("job"), second._run("job"))
+
+    asyncio.run(run_both())
+
+    assert len(runs) == 1
+    assert _status(db_path, "job") in (("failed", first.owner), ("failed", second.owner))
+
+
+def test_only_stale_running_jobs_are_requeued(tmp_path):
+    db_path = str(tmp_path / "jobs.db")
+    AnalysisJobQueue(db_path=db_path, lease=60)._open()
+    _insert(db_path, "stale", "running", _ago(120), owner="dead")
+    _insert(db_path, "live", "running", _now(), owner="alive")
+    _insert(db_path, "queued", "queued", _now(), owner="alive")
+
+    pending = AnalysisJobQueue(db_path=db_path, lease=60)._open()
+
+    assert sorted(pending) == ["queued", "stale"]
+    assert _status(db_path, "stale") == ("queued", "dead")
+    assert _status(db_path, "live") == ("running", "alive")
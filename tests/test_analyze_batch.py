@@ -0,0 +1,148 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from fastapi import HTTPException
+
+from api.v1.schemas.analyze import FoodAnalysis
+from api.v1.services import analyze_service
+from core.security import AuthenticatedUser
+
+USER = AuthenticatedUser(id="11111111-1111-1111-1111-111111111111")
+
+MEAL = FoodAnalysis.model_validate(
+    {
+        "is_food": True,
+        "food_name_en": "Rice",
+        "food_name_th": "ข้าว",
+        "food_components": [
+            {
+                "name_en": "rice",
+                "name_th": "ข้าว",
+                "calories": 200,
+                "protein": 4,
+                "carbohydrates": 45,
+                "fat": 0,
+                "fiber": 1,
+                "sugar": 0,
+            }
+        ],
+        "total_calories": 200,
+    }
+)
+NOT_FOOD = FoodAnalysis(is_food=False, message="This is a cat.")
+
+
+class FakeSupabase:
+    def __init__(self, insert_error: Exception | None = None):
+        self.insert_error = insert_error
+        self.inserted: list[list[dict]] = []
+
+    def rpc(self, name, params):
+        assert name == "insert_food_analyses_with_components"
+
+        async def execute():
+            if self.insert_error is not None:
+                raise self.insert_error
+            self.inserted.append(params["_meals"])
+
+        return SimpleNamespace(execute=execute)
+
+
+def _upload(data: bytes, filename: str):
+    async def read():
+        return data
+
+    return SimpleNamespace(read=read, content_type="image/jpeg", filename=filename)
+
+
+def _fake_pipeline(monkeypatch) -> dict[str, list[str]]:
+    """
+    Images are named by their bytes: "bad" fails validation, "cat" is not
+    food and "down" fails at Gemini; anything else is a meal.
+    """
+    storage = {"uploaded": [], "removed": []}
+
+    async def load_image(data, content_type):
+        if data == b"bad":
+            raise HTTPException(status_code=400, detail="Invalid image file.")
+        return SimpleNamespace(name=data.decode(), extension="jpg")
+
+    async def analyze_image(image, description):
+        if image.name == "down":
+            raise RuntimeError("Gemini is down.")
+        return NOT_FOOD if image.name == "cat" else MEAL
+
+    async def upload_image(image, unique_filename, supabase_client):
+        storage["uploaded"].append(unique_filename)
+        return f"https://storage.example/{unique_filename}"
+
+    async def remove_image(unique_filename, supabase_client):
+        storage["removed"].append(unique_filename)
+
+    monkeypatch.setattr(analyze_service, "_load_image", load_image)
+    monkeypatch.setattr(analyze_service, "_analyze_image", analyze_image)
+    monkeypatch.setattr(analyze_service, "_upload_image", upload_image)
+    monkeypatch.setattr(analyze_service, "_remove_image", remove_image)
+    return storage
+
+
+def test_each_image_gets_its_own_result_or_error(monkeypatch):
+    storage = _fake_pipeline(monkeypatch)
+    supabase = FakeSupabase()
+    files = [
+        _upload(b"rice", "rice.jpg"),
+        _upload(b"bad", "bad.jpg"),
+        _upload(b"cat", "cat.jpg"),
+        _upload(b"down", "down.jpg"),
+        _upload(b"rice", "rice-again.jpg"),
+    ]
+
+    response = asyncio.run(
+        analyze_service.process_food_analysis_batch(files, USER, supabase)
+    )
+
+    results = response.results
+    assert [result.index for result in results] == [0, 1, 2, 3, 4]
+    assert [result.filename for result in results] == [file.filename for file in files]
+    assert [result.meal is not None for result in results] == [True, False, False, False, True]
+    assert results[0].error is None and results[4].error is None
+    assert (results[1].error.status_code, results[1].error.detail) == (400, "Invalid image file.")
+    assert (results[2].error.status_code, results[2].error.detail) == (400, "This is a cat.")
+    assert (results[3].error.status_code, results[3].error.detail) == (500, "Gemini is down.")
+
+    [rows] = supabase.inserted
+    assert [row["_id"] for row in rows] == [results[0].meal.id, results[4].meal.id]
+    assert len(storage["uploaded"]) == 4
+    assert len(storage["removed"]) == 2
+
+
+def test_failed_insert_fails_every_analyzed_image(monkeypatch):
+    storage = _fake_pipeline(monkeypatch)
+    supabase = FakeSupabase(insert_error=RuntimeError("Database unavailable."))
+
+    response = asyncio.run(
+        analyze_service.process_food_analysis_batch(
+            [_upload(b"rice", "rice.jpg"), _upload(b"bad", "bad.jpg")], USER, supabase
+        )
+    )
+
+    assert [result.meal for result in response.results] == [None, None]
+    assert [
+        (result.error.status_code, result.error.detail) for result in response.results
+    ] == [(500, "Database unavailable."), (400, "Invalid image file.")]
+    assert storage["removed"] == storage["uploaded"]
+
+
+def test_too_many_files_are_refused_before_any_is_read(monkeypatch):
+    monkeypatch.setattr(analyze_service.settings, "ANALYZE_BATCH_MAX_FILES", 1)
+
+    async def unread():
+        raise AssertionError("read a file of an oversized batch")
+
+    files = [SimpleNamespace(read=unread)] * 2
+
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(analyze_service.process_food_analysis_batch(files, USER, None))
+
+    assert error.value.status_code == 400
@@ -0,0 +1,103 @@
+import asyncio
+from types import SimpleNamespace
+
+from api.v1.schemas.analyze import FoodAnalysis
+from api.v1.services import analyze_service
+from core.security import AuthenticatedUser
+
+USER = AuthenticatedUser(id="11111111-1111-1111-1111-111111111111")
+
+ANALYSIS = FoodAnalysis.model_validate(
+    {
+        "is_food": True,
+        "food_name_en": "Rice",
+        "food_name_th": "ข้าว",
+        "food_components": [
+            {
+                "name_en": "rice",
+                "name_th": "ข้าว",
+                "calories": 200,
+                "protein": 4,
+                "carbohydrates": 45,
+                "fat": 0,
+                "fiber": 1,
+                "sugar": 0,
+            }
+        ],
+        "total_calories": 200,
+    }
+)
+
+
+def _fake_pipeline(monkeypatch) -> list[str]:
+    calls = []
+
+    async def load_image(data, content_type):
+        return SimpleNamespace(width=800, height=600, extension="jpg")
+
+    async def analyze_image_stream(image, description):
+        calls.append("stream")
+        await asyncio.sleep(0.05)
+        yield "is_food", True
+        for component in ANALYSIS.food_components:
+            yield "component", component
+        yield "analysis", ANALYSIS
+
+    async def upload_image(image, unique_filename, supabase_client):
+        return f"https://storage.example/{unique_filename}"
+
+    async def save_metadata_to_db(*args):
+        calls.append("insert")
+        return "2026-01-01T00:00:00+00:00"
+
+    monkeypatch.setattr(analyze_service, "_load_image", load_image)
+    monkeypatch.setattr(analyze_service, "_analyze_image_stream", analyze_image_stream)
+    monkeypatch.setattr(analyze_service, "_upload_image", upload_image)
+    monkeypatch.setattr(analyze_service, "_save_metadata_to_db", save_metadata_to_db)
+    return calls
+
+
+async def _collect(events) -> list[str]:
+    return [event async for event in events]
+
+
+def test_concurrent_streams_share_one_analysis(monkeypatch):
+    calls = _fake_pipeline(monkeypatch)
+
+    async def run():
+        return await asyncio.gather(
+            _collect(analyze_service.stream_food_analysis(b"image", "image/jpeg", USER, None)),
+            _collect(analyze_service.stream_food_analysis(b"image", "image/jpeg", USER, None)),
+        )
+
+    first, second = asyncio.run(run())
+
+    assert calls == ["stream", "insert"]
+    assert [event.split("\n")[0] for event in first] == [
+        "event: validated",
+        "event: is_food",
+        "event: component",
+        "event: meal",
+    ]
+    assert [event.split("\n")[0] for event in second] == [
+        "event: is_food",
+        "event: component",
+        "event: meal",
+    ]
+    assert first[-1] == second[-1]
+    assert analyze_service._in_flight == {}
+
+
+def test_request_joins_a_stream_in_progress(monkeypatch):
+    calls = _fake_pipeline(monkeypatch)
+
+    async def run():
+        return await asyncio.gather(
+            _collect(analyze_service.stream_food_analysis(b"image", "image/jpeg", USER, None)),
+            analyze_service.process_food_analysis(b"image", "image/jpeg", USER, None),
+        )
+
+    events, meal = asyncio.run(run())
+
+    assert calls == ["stream", "insert"]
+    assert meal.id in events[-1]
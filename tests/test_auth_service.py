@@ -0,0 +1,51 @@
+from types import SimpleNamespace
+
+import pytest
+from supabase import AuthApiError
+
+from api.exceptions import InvalidCredentialsException
+from api.v1.services import auth_service
+from core.security import AuthenticatedUser
+
+USER = AuthenticatedUser(id="11111111-1111-1111-1111-111111111111", aud="authenticated")
+
+
+class FakeAuth:
+    def __init__(self, error: Exception | None = None):
+        self.error = error
+        self.calls = 0
+
+    def get_user(self, jwt_token: str):
+        self.calls += 1
+        if self.error is not None:
+            raise self.error
+        return SimpleNamespace(user={"id": USER.id, "email": "a@example.com"})
+
+
+@pytest.fixture(autouse=True)
+def clear_users():
+    auth_service._full_users.clear()
+    yield
+    auth_service._full_users.clear()
+
+
+def test_full_user_is_fetched_once_per_user():
+    auth = FakeAuth()
+    client = SimpleNamespace(auth=auth)
+
+    first = auth_service.get_user(client, USER, "token-1")
+    second = auth_service.get_user(client, USER, "token-2")
+
+    assert first == second == {"id": USER.id, "email": "a@example.com"}
+    assert auth.calls == 1
+
+
+def test_rejected_token_is_not_cached():
+    auth = FakeAuth(AuthApiError("invalid JWT", 401, None))
+    client = SimpleNamespace(auth=auth)
+
+    for _ in range(2):
+        with pytest.raises(InvalidCredentialsException):
+            auth_service.get_user(client, USER, "token")
+
+    assert auth.calls == 2
@@ -0,0 +1,73 @@
+import json
+
+import pytest
+
+from api.v1.schemas.meals import AnalyzedFoodComponent
+from api.v1.services.gemini_service import AnalysisStreamParser
+
+COMPONENTS = [
+    {"name_en": "Rice {plain}", "name_th": "ข้าว \"สวย\"", "calories": 200,
+     "protein": 4, "carbohydrates": 45, "fat": 0, "fiber": 1, "sugar": 0},
+    {"name_en": "Egg [fried]", "name_th": "ไข่ดาว", "calories": 90,
+     "protein": 6, "carbohydrates": 1, "fat": 7, "fiber": 0, "sugar": 0},
+]
+ANALYSIS = json.dumps(
+    {
+        "is_food": True,
+        "message": "food_components: {not an array}",
+        "food_name_en": "Rice with egg",
+        "food_name_th": "ข้าวไข่ดาว",
+        "food_components": COMPONENTS,
+        "total_calories": 290,
+    },
+    ensure_ascii=False,
+)
+
+
+def _feed_in_chunks(parser: AnalysisStreamParser, text: str, size: int) -> list:
+    events = []
+    for start in range(0, len(text), size):
+        events.extend(parser.feed(text[start : start + size]))
+    return events
+
+
+@pytest.mark.parametrize("size", [1, 7, len(ANALYSIS)])
+def test_reports_is_food_then_each_component_however_the_text_is_split(size):
+    parser = AnalysisStreamParser()
+
+    events = _feed_in_chunks(parser, ANALYSIS, size)
+
+    assert events == [
+        ("is_food", True),
+        ("component", AnalyzedFoodComponent.model_validate(COMPONENTS[0])),
+        ("component", AnalyzedFoodComponent.model_validate(COMPONENTS[1])),
+    ]
+    result = parser.result()
+    assert result.is_food
+    assert result.food_components == [event[1] for event in events[1:]]
+
+
+def test_component_is_reported_as_soon_as_it_closes():
+    parser = AnalysisStreamParser()
+    end_of_first = ANALYSIS.index("}", ANALYSIS.index('"sugar"')) + 1
+
+    assert parser.feed(ANALYSIS[:end_of_first - 1]) == [("is_food", True)]
+    assert parser.feed(ANALYSIS[end_of_first - 1 : end_of_first]) == [
+        ("component", AnalyzedFoodComponent.model_validate(COMPONENTS[0]))
+    ]
+
+
+def test_non_food_answer_reports_only_the_flag():
+    parser = AnalysisStreamParser()
+
+    events = _feed_in_chunks(
+        parser, '{"is_food": false, "message": "This is a cat."}', 5
+    )
+
+    assert events == [("is_food", False)]
+    assert parser.result().message == "This is a cat."
+
+
+def test_empty_response_is_an_error():
+    with pytest.raises(ValueError):
+        AnalysisStreamParser().result()
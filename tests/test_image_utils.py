@@ -0,0 +1,34 @@
+from io import BytesIO
+
+from PIL import Image
+
+from utils.image_utils import load_image
+
+
+def _encode(image_format: str) -> bytes:
+    buffer = BytesIO()
+    Image.new("RGB", (640, 480), (200, 120, 40)).save(buffer, format=image_format)
+    return buffer.getvalue()
+
+
+def test_stored_type_follows_the_detected_format():
+    image = load_image(_encode("PNG"), "image/jpeg")
+
+    assert image is not None
+    assert image.content_type == "image/png"
+    assert image.extension == "png"
+    assert Image.open(BytesIO(image.thumbnail)).format == "PNG"
+
+
+def test_upload_in_a_format_that_is_not_allowed_is_rejected():
+    assert load_image(_encode("GIF"), "image/png") is None
+    assert load_image(_encode("JPEG"), "image/gif") is None
+
+
+def test_jpeg_is_downscaled_for_the_model():
+    image = load_image(_encode("JPEG"), "image/jpeg", model_max_edge=320)
+
+    assert image is not None
+    assert (image.width, image.height) == (640, 480)
+    assert Image.open(BytesIO(image.model_data)).size == (320, 240)
+    assert image.extension == "jpg"
@@ -0,0 +1,41 @@
+import threading
+
+from api.v1.services.meal_cache import MealReadCache
+
+
+def test_read_started_before_invalidate_is_not_stored():
+    cache = MealReadCache()
+    started, release = threading.Event(), threading.Event()
+
+    def stale_read():
+        started.set()
+        release.wait()
+        return "stale"
+
+    reader = threading.Thread(target=cache.get_or_load, args=("user", "meals", stale_read))
+    reader.start()
+    started.wait()
+    cache.invalidate("user")
+    release.set()
+    reader.join()
+
+    assert cache.get_or_load("user", "meals", lambda: "fresh") == "fresh"
+    assert cache.get_or_load("user", "meals", lambda: "reloaded") == "fresh"
+
+
+def test_generations_are_only_kept_for_loads_in_progress():
+    cache = MealReadCache()
+    for index in range(100):
+        cache.get_or_load(f"user-{index}", "meals", lambda: [])
+        cache.invalidate(f"user-{index}")
+
+    assert cache._generations == {}
+    assert cache._loads == {}
+
+
+def test_clear_drops_entries():
+    cache = MealReadCache()
+    cache.get_or_load("user", "meals", lambda: "old")
+    cache.clear()
+
+    assert cache.get_or_load("user", "meals", lambda: "new") == "new"
@@ -0,0 +1,79 @@
+from types import SimpleNamespace
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from api.dependencies import get_current_user
+from api.v1.models.user_model import CurrentUserModel
+from api.v1.routes import meals
+from api.v1.services import meals_service
+from api.v1.services.meal_cache import meal_cache
+from core.security import AuthenticatedUser
+from core.supabase import get_supabase_client
+
+USER = AuthenticatedUser(id="11111111-1111-1111-1111-111111111111")
+
+ETAG = meals_service.get_meals_etag(USER, 7)
+
+
+class FakeSupabase:
+    """Answers the meal version lookup, and counts the meal reads."""
+
+    def __init__(self):
+        self.reads = 0
+
+    def table(self, name):
+        result = SimpleNamespace(data=[{"version": 7}])
+        query = SimpleNamespace(execute=lambda: result)
+        query.select = query.eq = query.limit = lambda *args: query
+        return query
+
+    def rpc(self, name, params):
+        self.reads += 1
+        return SimpleNamespace(execute=lambda: SimpleNamespace(data=[]))
+
+
+@pytest.fixture
+def client():
+    app = FastAPI()
+    app.include_router(meals.router)
+    supabase = FakeSupabase()
+    app.dependency_overrides[get_current_user] = lambda: CurrentUserModel(
+        user=USER, jwt_token="token"
+    )
+    app.dependency_overrides[get_supabase_client] = lambda: supabase
+    meal_cache.clear()
+    yield TestClient(app), supabase
+    meal_cache.clear()
+
+
+@pytest.mark.parametrize(
+    "url",
+    [
+        "/meals/summary?from=2026-01-01&to=2026-01-07&timezone=Nope/Bad",
+        "/meals/summary?from=2026-01-07&to=2026-01-01&timezone=UTC",
+        "/meals?date=2026-01-01&timezone=Nope/Bad",
+        "/meals?date=01/01/2026&timezone=UTC",
+        "/meals?cursor=not-a-cursor",
+    ],
+)
+def test_invalid_parameters_are_rejected_before_the_etag_check(client, url):
+    client, _ = client
+
+    response = client.get(url, headers={"If-None-Match": ETAG})
+
+    assert response.status_code == 400
+
+
+def test_current_etag_gets_304_without_a_read(client):
+    client, supabase = client
+
+    response = client.get(
+        "/meals/summary?from=2026-01-01&to=2026-01-07&timezone=UTC",
+        headers={"If-None-Match": ETAG},
+    )
+
+    assert response.status_code == 304
+    assert response.headers["etag"] == ETAG
+    assert supabase.reads == 0
@@ -0,0 +1,123 @@
+import base64
+from types import SimpleNamespace
+
+import pytest
+from fastapi import HTTPException
+
+from api.v1.services.meal_cache import meal_cache
+from api.v1.services.meals_service import (
+    _rollup_timezone,
+    decode_cursor,
+    encode_cursor,
+    get_meals_page,
+    parse_summary_range,
+)
+from core.security import AuthenticatedUser
+
+USER = AuthenticatedUser(id="11111111-1111-1111-1111-111111111111")
+
+
+def test_timezone_aliases_share_a_rollup():
+    assert _rollup_timezone("Asia/Saigon") == "Asia/Ho_Chi_Minh"
+    assert _rollup_timezone("asia/ho_chi_minh") == "Asia/Ho_Chi_Minh"
+    assert _rollup_timezone("US/Eastern") == "America/New_York"
+    assert _rollup_timezone("Asia/Bangkok") == "Asia/Bangkok"
+
+
+def test_summary_rejects_unknown_timezone():
+    with pytest.raises(HTTPException) as error:
+        parse_summary_range("2026-01-01", "2026-01-07", "Mars/Base")
+
+    assert error.value.status_code == 400
+
+
+class FakeSupabase:
+    """Serves get_food_analysis_results_page from a list of meals, newest first."""
+
+    def __init__(self, count: int):
+        # Pairs of meals share a timestamp, so pages must break ties on id.
+        self.meals = sorted(
+            (
+                {
+                    "id": f"00000000-0000-0000-0000-{index:012d}",
+                    "image_url": f"https://storage.example/{index}.jpg",
+                    "food_name_en": f"Meal {index}",
+                    "food_name_th": "อาหาร",
+                    "food_components": [],
+                    "created_at": f"2026-01-{1 + index // 2:02d}T12:00:00+00:00",
+                }
+                for index in range(count)
+            ),
+            key=lambda meal: (meal["created_at"], meal["id"]),
+            reverse=True,
+        )
+        self.limits = []
+
+    def rpc(self, name, params):
+        assert name == "get_food_analysis_results_page"
+        self.limits.append(params["p_limit"])
+        cursor = (params["p_cursor_created_at"], params["p_cursor_id"])
+        meals = [
+            meal
+            for meal in self.meals
+            if cursor == (None, None) or (meal["created_at"], meal["id"]) < cursor
+        ]
+        return SimpleNamespace(
+            execute=lambda: SimpleNamespace(data=meals[: params["p_limit"]])
+        )
+
+
+def _pages(supabase: FakeSupabase, limit: int) -> list[list[str]]:
+    meal_cache.clear()
+    pages, cursor = [], None
+    while True:
+        page = get_meals_page(USER, supabase, 1, limit, cursor)
+        pages.append([meal.id for meal in page.meals])
+        if page.next_cursor is None:
+            return pages
+        cursor = decode_cursor(page.next_cursor)
+
+
+def test_cursor_round_trips():
+    cursor = encode_cursor("2026-01-01T12:00:00.123+07:00", USER.id)
+
+    assert "=" not in cursor
+    assert decode_cursor(cursor) == ("2026-01-01T12:00:00.123+07:00", USER.id)
+
+
+@pytest.mark.parametrize(
+    "cursor",
+    [
+        "not base64!",
+        base64.urlsafe_b64encode(b"2026-01-01|not-a-uuid").decode(),
+        base64.urlsafe_b64encode(f"yesterday|{USER.id}".encode()).decode(),
+        base64.urlsafe_b64encode(f"2026-01-01|{USER.id}|extra".encode()).decode(),
+    ],
+)
+def test_invalid_cursor_is_a_bad_request(cursor):
+    with pytest.raises(HTTPException) as error:
+        decode_cursor(cursor)
+
+    assert error.value.status_code == 400
+
+
+def test_pages_cover_every_meal_once_in_order():
+    supabase = FakeSupabase(count=5)
+
+    pages = _pages(supabase, limit=2)
+
+    assert [len(page) for page in pages] == [2, 2, 1]
+    assert sum(pages, []) == [meal["id"] for meal in supabase.meals]
+    assert supabase.limits == [3, 3, 3]
+
+
+def test_full_last_page_has_no_next_cursor():
+    supabase = FakeSupabase(count=4)
+
+    pages = _pages(supabase, limit=2)
+
+    assert [len(page) for page in pages] == [2, 2]
+
+
+def test_empty_listing_has_no_next_cursor():
+    assert _pages(FakeSupabase(count=0), limit=2) == [[]]
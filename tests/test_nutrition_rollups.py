@@ -0,0 +1,97 @@
+"""
+Runs against a throwaway Postgres database named by TEST_DATABASE_URL, into
+which initial_schema.sql is installed, and is skipped without one.
+"""
+
+import json
+import os
+import threading
+import time
+import uuid
+from pathlib import Path
+
+import pytest
+
+psycopg = pytest.importorskip("psycopg")
+
+DSN = os.environ.get("TEST_DATABASE_URL")
+SCHEMA = Path(__file__).resolve().parent.parent / "initial_schema.sql"
+
+pytestmark = pytest.mark.skipif(DSN is None, reason="TEST_DATABASE_URL is not set")
+
+TIMEZONE = "Asia/Bangkok"
+COMPONENTS = [
+    {"name_en": "Rice", "name_th": "ข้าว", "calories": 300, "protein": 6,
+     "carbohydrates": 65, "fat": 1, "fiber": 1, "sugar": 0},
+    {"name_en": "Pork", "name_th": "หมู", "calories": 250, "protein": 20,
+     "carbohydrates": 0, "fat": 18, "fiber": 0, "sugar": 0},
+]
+
+
+@pytest.fixture
+def user_id():
+    user_id = str(uuid.uuid4())
+    with psycopg.connect(DSN, autocommit=True) as conn:
+        conn.execute(
+            "create schema if not exists auth;"
+            "create table if not exists auth.users (id uuid primary key);"
+        )
+        conn.execute(SCHEMA.read_text())
+        conn.execute("insert into auth.users (id) values (%s)", (user_id,))
+    yield user_id
+    with psycopg.connect(DSN, autocommit=True) as conn:
+        conn.execute("delete from auth.users where id = %s", (user_id,))
+
+
+def _insert_meal(conn, user_id: str) -> None:
+    conn.execute(
+        "select insert_food_analysis_with_components("
+        "%s, %s, 'Fried rice', 'ข้าวผัด', 'https://example.com/x.jpg', "
+        "timestamptz '2026-03-01 12:00+07', %s::jsonb)",
+        (
+            str(uuid.uuid4()),
+            user_id,
+            json.dumps([{"id": str(uuid.uuid4()), **c} for c in COMPONENTS]),
+        ),
+    )
+
+
+def _totals(conn, user_id: str) -> list[dict]:
+    return conn.execute(
+        "select get_daily_nutrition_totals(%s, %s, '2026-03-01', '2026-03-01')",
+        (user_id, TIMEZONE),
+    ).fetchone()[0]
+
+
+def _in_thread(target, *args) -> threading.Thread:
+    thread = threading.Thread(target=target, args=args)
+    thread.start()
+    # Long enough for the other transaction to reach its lock.
+    time.sleep(0.5)
+    return thread
+
+
+def test_meal_committed_during_registration_is_counted(user_id):
+    with psycopg.connect(DSN) as writer, psycopg.connect(DSN, autocommit=True) as reader:
+        _insert_meal(writer, user_id)
+        registration = _in_thread(_totals, reader, user_id)
+        writer.commit()
+        registration.join()
+
+        [day] = _totals(reader, user_id)
+
+    assert day["meal_count"] == 1
+    assert day["total_calories"] == 550
+
+
+def test_meal_written_while_registration_is_uncommitted_is_counted(user_id):
+    with psycopg.connect(DSN) as registrar, psycopg.connect(DSN, autocommit=True) as writer:
+        assert _totals(registrar, user_id) == []
+        meal = _in_thread(_insert_meal, writer, user_id)
+        registrar.commit()
+        meal.join()
+
+        [day] = _totals(registrar, user_id)
+
+    assert day["meal_count"] == 1
+    assert day["total_calories"] == 550
@@ -0,0 +1,49 @@
+import asyncio
+import os
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+
+import pytest
+
+from core import process_pool
+from core.config import settings
+
+
+def _crash_once(marker: str) -> str:
+    # Runs in a pool worker; the first call kills it like an OOM kill would.
+    if not Path(marker).exists():
+        Path(marker).touch()
+        os._exit(1)
+    return "done"
+
+
+def _crash() -> None:
+    os._exit(1)
+
+
+def _square(value: int) -> int:
+    return value * value
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    monkeypatch.setattr(settings, "IMAGE_PROCESS_WORKERS", 1)
+    process_pool.init_process_pool()
+    yield
+    process_pool.close_process_pool()
+
+
+def test_work_is_retried_on_a_new_pool_after_a_worker_dies(pool, tmp_path):
+    broken = process_pool._process_pool
+
+    result = asyncio.run(process_pool.run_cpu_bound(_crash_once, str(tmp_path / "crashed")))
+
+    assert result == "done"
+    assert process_pool._process_pool is not broken
+
+
+def test_pool_is_usable_after_work_that_always_crashes(pool):
+    with pytest.raises(BrokenProcessPool):
+        asyncio.run(process_pool.run_cpu_bound(_crash))
+
+    assert asyncio.run(process_pool.run_cpu_bound(_square, 7)) == 49
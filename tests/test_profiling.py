@@ -0,0 +1,50 @@
+import asyncio
+import pstats
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from core.profiling import ProfileStore, ProfilingMiddleware, to_thread
+
+
+def _threaded_work() -> int:
+    return sum(range(10000))
+
+
+def _client(tmp_path) -> tuple[TestClient, ProfileStore]:
+    app = FastAPI()
+
+    @app.get("/work")
+    async def work():
+        return {"result": await to_thread(_threaded_work)}
+
+    store = ProfileStore(str(tmp_path), max_files=5)
+    app.add_middleware(ProfilingMiddleware, store=store, admin_token="secret")
+    return TestClient(app), store
+
+
+def test_profiles_request_that_uses_to_thread(tmp_path):
+    client, store = _client(tmp_path)
+
+    response = client.get("/work", headers={"X-Profile": "secret"})
+
+    assert response.status_code == 200
+    assert response.json() == {"result": sum(range(10000))}
+    path = store.path(response.headers["X-Profile-Id"])
+    assert path is not None
+    functions = {name for _, _, name in pstats.Stats(str(path)).stats}
+    assert "_threaded_work" in functions
+
+
+def test_does_not_profile_without_token(tmp_path):
+    client, _ = _client(tmp_path)
+
+    response = client.get("/work", headers={"X-Profile": "wrong"})
+
+    assert response.status_code == 200
+    assert "X-Profile-Id" not in response.headers
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_to_thread_without_profile():
+    assert asyncio.run(to_thread(_threaded_work)) == sum(range(10000))
@@ -0,0 +1,233 @@
+import asyncio
+
+import pytest
+
+from core.resilience import AdaptiveConcurrencyLimiter, CircuitBreaker, ResilientCaller, ServiceUnavailable
+
+
+def _caller(**kwargs) -> ResilientCaller:
+    options = {
+        "limiter": AdaptiveConcurrencyLimiter(initial_limit=2, max_limit=4, cooldown=0),
+        "breaker": CircuitBreaker(failure_threshold=3, reset_timeout=60),
+        "is_transient": lambda e: isinstance(e, (TimeoutError, ConnectionError)),
+        "is_throttled": lambda e: False,
+        "max_attempts": 3,
+        "deadline": 5,
+        "backoff_base": 0.001,
+        "backoff_max": 0.01,
+    }
+    return ResilientCaller(**{**options, **kwargs})
+
+
+async def _collect(stream) -> list:
+    return [item async for item in stream]
+
+
+def test_limiter_queues_calls_beyond_the_limit_in_order():
+    limiter = AdaptiveConcurrencyLimiter(initial_limit=1, cooldown=0)
+    admitted = []
+
+    async def run():
+        await limiter.acquire(1)
+
+        async def wait(name):
+            await limiter.acquire(1)
+            admitted.append(name)
+
+        waiters = [asyncio.create_task(wait(name)) for name in ("first", "second")]
+        await asyncio.sleep(0)
+        assert (limiter.in_flight, limiter.waiting) == (1, 2)
+
+        # Releases without a latency leave the limit at one.
+        limiter.release()
+        await waiters[0]
+        assert admitted == ["first"] and not waiters[1].done()
+
+        limiter.release()
+        await waiters[1]
+
+    asyncio.run(run())
+
+    assert admitted == ["first", "second"]
+    assert (limiter.in_flight, limiter.waiting) == (1, 0)
+
+
+def test_limiter_gives_up_waiting_after_the_timeout():
+    limiter = AdaptiveConcurrencyLimiter(initial_limit=1)
+
+    async def run():
+        await limiter.acquire(1)
+        with pytest.raises(TimeoutError):
+            await limiter.acquire(0.01)
+
+    asyncio.run(run())
+
+    assert (limiter.in_flight, limiter.waiting) == (1, 0)
+
+
+def test_limiter_grows_on_success_and_shrinks_on_throttling_or_slow_answers():
+    limiter = AdaptiveConcurrencyLimiter(
+        initial_limit=4, min_limit=2, latency_target=1, cooldown=0
+    )
+
+    limiter.in_flight = 1
+    limiter.release(latency=0.1)
+    assert limiter.limit == 4.25
+
+    limiter.in_flight = 1
+    limiter.release(latency=2)
+    assert limiter.limit == pytest.approx(3.825)
+
+    for _ in range(3):
+        limiter.in_flight = 1
+        limiter.release(throttled=True)
+    assert limiter.limit == 2
+    assert limiter.throttled == 3
+
+
+def test_limiter_cuts_at_most_once_per_cooldown():
+    limiter = AdaptiveConcurrencyLimiter(initial_limit=16, cooldown=60)
+
+    for _ in range(5):
+        limiter.in_flight = 1
+        limiter.release(throttled=True)
+
+    assert limiter.limit == 8
+
+
+def test_breaker_opens_after_consecutive_failures_and_refuses_calls():
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=60)
+
+    for _ in range(2):
+        breaker.before_call()
+        breaker.record_failure()
+    breaker.before_call()
+    breaker.record_success()
+    for _ in range(3):
+        breaker.before_call()
+        breaker.record_failure()
+
+    assert breaker.state == "open"
+    with pytest.raises(ServiceUnavailable) as refused:
+        breaker.before_call()
+    assert refused.value.retry_after == 60
+
+
+def test_breaker_lets_one_probe_through_once_the_reset_timeout_passes():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0)
+    breaker.record_failure()
+
+    breaker.before_call()
+    assert breaker.state == "half_open"
+    with pytest.raises(ServiceUnavailable):
+        breaker.before_call()
+
+    breaker.record_failure()
+    assert (breaker.state, breaker.opens) == ("open", 2)
+
+    breaker.before_call()
+    breaker.record_success()
+    assert breaker.state == "closed"
+    breaker.before_call()
+
+
+def test_transient_errors_are_retried_until_the_call_succeeds():
+    caller = _caller()
+    attempts = []
+
+    async def flaky():
+        attempts.append(True)
+        if len(attempts) < 3:
+            raise ConnectionError("reset")
+        return "answer"
+
+    assert asyncio.run(caller.call(flaky)) == "answer"
+    assert (len(attempts), caller.retries) == (3, 2)
+    assert caller.breaker.consecutive_failures == 0
+    assert caller.limiter.in_flight == 0
+
+
+def test_other_errors_are_raised_without_a_retry():
+    caller = _caller()
+    attempts = []
+
+    async def rejected():
+        attempts.append(True)
+        raise ValueError("bad request")
+
+    with pytest.raises(ValueError):
+        asyncio.run(caller.call(rejected))
+
+    assert (len(attempts), caller.retries) == (1, 0)
+    assert caller.breaker.consecutive_failures == 0
+
+
+def test_call_gives_up_after_max_attempts():
+    caller = _caller(max_attempts=2, breaker=CircuitBreaker(failure_threshold=10))
+    attempts = []
+
+    async def down():
+        attempts.append(True)
+        raise TimeoutError
+
+    with pytest.raises(ServiceUnavailable):
+        asyncio.run(caller.call(down))
+
+    assert len(attempts) == 2
+    assert caller.limiter.in_flight == 0
+
+
+def test_open_circuit_stops_retries_and_refuses_new_calls():
+    caller = _caller(max_attempts=5, breaker=CircuitBreaker(failure_threshold=2, reset_timeout=60))
+    attempts = []
+
+    async def down():
+        attempts.append(True)
+        raise ConnectionError("refused")
+
+    with pytest.raises(ServiceUnavailable):
+        asyncio.run(caller.call(down))
+    with pytest.raises(ServiceUnavailable) as refused:
+        asyncio.run(caller.call(down))
+
+    assert len(attempts) == 2
+    assert caller.rejected == 1
+    assert refused.value.retry_after == 60
+
+
+def test_stream_that_stalls_before_its_first_item_is_given_up_on():
+    caller = _caller(deadline=0.2)
+    opened = []
+
+    async def stalled():
+        opened.append(True)
+        await asyncio.sleep(10)
+        yield "never"
+
+    with pytest.raises(ServiceUnavailable):
+        asyncio.run(_collect(caller.stream(stalled)))
+
+    assert opened == [True]
+    assert caller.limiter.in_flight == 0
+
+
+def test_stream_that_stalls_after_its_first_item_releases_its_slot():
+    caller = _caller(deadline=0.2)
+
+    async def stalled():
+        yield "first"
+        await asyncio.sleep(10)
+        yield "never"
+
+    items = []
+
+    async def run():
+        async for item in caller.stream(stalled):
+            items.append(item)
+
+    with pytest.raises(ServiceUnavailable):
+        asyncio.run(run())
+
+    assert items == ["first"]
+    assert caller.limiter.in_flight == 0
+    assert caller.breaker.consecutive_failures == 1
@@ -0,0 +1,92 @@
+import asyncio
+import json
+import time
+
+import jwt
+from cryptography.hazmat.primitives.asymmetric import rsa
+from jwt import PyJWKSet
+from jwt.algorithms import RSAAlgorithm
+
+from core.security import TokenVerifier
+
+
+def _jwk_set(*keys: tuple[str, rsa.RSAPrivateKey]) -> PyJWKSet:
+    jwks = []
+    for kid, private_key in keys:
+        jwk = json.loads(RSAAlgorithm.to_jwk(private_key.public_key()))
+        jwks.append({**jwk, "kid": kid, "use": "sig", "alg": "RS256"})
+    return PyJWKSet.from_dict({"keys": jwks})
+
+
+def _token(kid: str, private_key: rsa.RSAPrivateKey) -> str:
+    now = int(time.time())
+    return jwt.encode(
+        {
+            "sub": "user-1",
+            "aud": "authenticated",
+            "email": "a@example.com",
+            "iat": now,
+            "exp": now + 600,
+        },
+        private_key,
+        algorithm="RS256",
+        headers={"kid": kid},
+    )
+
+
+def _verifier(jwk_sets: list[PyJWKSet]) -> tuple[TokenVerifier, list[bool]]:
+    verifier = TokenVerifier(
+        jwks_url="https://example.supabase.co/auth/v1/.well-known/jwks.json",
+        jwks_min_refetch_interval=60,
+    )
+    fetches = []
+
+    def get_jwk_set(refresh: bool = False) -> PyJWKSet:
+        fetches.append(refresh)
+        return jwk_sets[min(len(fetches), len(jwk_sets)) - 1]
+
+    verifier._jwks_client.get_jwk_set = get_jwk_set
+    return verifier, fetches
+
+
+def test_verifies_with_prefetched_jwks():
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    verifier, fetches = _verifier([_jwk_set(("old", key))])
+
+    async def run():
+        await verifier.start()
+        await asyncio.sleep(0.1)
+        user = await verifier.verify(_token("old", key), supabase_client=None)
+        await verifier.stop()
+        return user
+
+    user = asyncio.run(run())
+
+    assert fetches == [True]
+    assert user.id == "user-1"
+    assert user.email == "a@example.com"
+    assert "created_at" not in user.model_dump()
+
+
+def test_refetches_unknown_keys_at_most_once_per_interval():
+    old_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    new_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    other_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    verifier, fetches = _verifier(
+        [_jwk_set(("old", old_key)), _jwk_set(("old", old_key), ("new", new_key))]
+    )
+
+    verifier._fetch_jwks()
+    # The keys were fetched longer than the minimum interval ago.
+    verifier._jwks_fetched_at -= 120
+
+    async def run():
+        rotated = await verifier.verify(_token("new", new_key), supabase_client=None)
+        unknown = await verifier.verify(_token("other", other_key), supabase_client=None)
+        return rotated, unknown
+
+    rotated, unknown = asyncio.run(run())
+
+    assert rotated.id == "user-1"
+    assert unknown is None
+    assert fetches == [True, True]
@@ -0,0 +1,26 @@
+import hashlib
+
+
+def make_etag(*parts: object) -> str:
+    """Builds a strong ETag from the values that determine a representation."""
+    digest = hashlib.blake2b(
+        "\x1f".join(str(part) for part in parts).encode(), digest_size=12
+    ).hexdigest()
+    return f'"{digest}"'
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    """
+    Evaluates an If-None-Match header against the current ETag. The header
+    may list several tags or be "*"; tags are compared weakly, as RFC 9110
+    requires for If-None-Match.
+    """
+    if not if_none_match:
+        return False
+
+    if if_none_match.strip() == "*":
+        return True
+
+    return any(
+        tag.strip().removeprefix("W/") == etag for tag in if_none_match.split(",")
+    )
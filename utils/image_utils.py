@@ -1,51 +1,120 @@
+from dataclasses import dataclass
 from io import BytesIO
-import os
-import shutil
-import tempfile
 
-from fastapi import HTTPException, UploadFile
-from PIL import Image
+from PIL import Image, ImageOps
 
+ALLOWED_IMAGE_TYPES = ["image/jpeg", "image/png"]
 
-def isImage(file: UploadFile) -> str | None:
-    """Check if the uploaded file is a valid image."""
-    if file.content_type is None or file.content_type not in [
-        "image/jpeg",
-        "image/png",
-    ]:
+# The formats Pillow may detect in an upload; the thumbnail keeps the format.
+UPLOAD_IMAGE_FORMATS = {"JPEG": "image/jpeg", "PNG": "image/png"}
+
+IMAGE_EXTENSIONS = {"image/jpeg": "jpg", "image/png": "png"}
+
+MODEL_IMAGE_FORMATS = {"JPEG": "image/jpeg", "WEBP": "image/webp"}
+
+
+@dataclass
+class ImagePayload:
+    """
+    What the analysis needs from an uploaded image, decoded exactly once. The
+    uploaded bytes themselves are not kept: the payload is pickled back from
+    the image process pool. content_type is that of the detected format, in
+    which the thumbnail is encoded, whatever the client declared.
+    """
+
+    content_type: str
+    width: int
+    height: int
+    model_data: bytes
+    model_content_type: str
+    thumbnail: bytes
+    perceptual_hash: int
+
+    @property
+    def extension(self) -> str:
+        return IMAGE_EXTENSIONS[self.content_type]
+
+
+def load_image(
+    data: bytes,
+    content_type: str | None,
+    model_max_edge: int = 768,
+    model_format: str = "JPEG",
+    model_quality: int = 85,
+    thumbnail_size: tuple[int, int] = (256, 256),
+) -> ImagePayload | None:
+    """
+    Decodes the uploaded bytes once and derives everything the analysis needs
+    from that single decode: the downscaled, EXIF-free copy sent to the model
+    and the reduced copy used for storage. Returns None if the declared
+    content type is not allowed or the upload is not a valid JPEG or PNG
+    image; a PNG declared as a JPEG is still stored as the PNG it is.
+
+    Runs in the image process pool, so it must stay a picklable top-level
+    function.
+    """
+    if content_type is None or content_type not in ALLOWED_IMAGE_TYPES:
         return None
     try:
-        file.file.seek(0)
-        image = Image.open(BytesIO(file.file.read()))
-        image.verify()
-        file.file.seek(0)
-        return file.content_type
+        with Image.open(BytesIO(data)) as img:
+            image_format = img.format
+            if image_format not in UPLOAD_IMAGE_FORMATS:
+                return None
+            width, height = img.size
+
+            if image_format == "JPEG":
+                # Let libjpeg decode at 1/2, 1/4 or 1/8 scale directly instead
+                # of decoding full resolution and throwing most of it away.
+                img.draft("RGB", _scaled_size(width, height, model_max_edge))
+            img.load()
+
+            image = ImageOps.exif_transpose(img) or img
+            image.thumbnail((model_max_edge, model_max_edge))
+            image_hash = perceptual_hash(image)
+
+            model_image = image if image.mode == "RGB" else image.convert("RGB")
+            model_buffer = BytesIO()
+            model_image.save(
+                model_buffer, format=model_format, quality=model_quality, optimize=True
+            )
+
+            image.thumbnail(thumbnail_size)
+            thumbnail_buffer = BytesIO()
+            image.save(thumbnail_buffer, format=image_format)
     except Exception:
         return None
 
+    return ImagePayload(
+        content_type=UPLOAD_IMAGE_FORMATS[image_format],
+        width=width,
+        height=height,
+        model_data=model_buffer.getvalue(),
+        model_content_type=MODEL_IMAGE_FORMATS[model_format],
+        thumbnail=thumbnail_buffer.getvalue(),
+        perceptual_hash=image_hash,
+    )
 
-def save_temp_file(file: UploadFile, image_type: str) -> str:
-    """Saves the uploaded file to a temporary location."""
-    try:
-        with tempfile.NamedTemporaryFile(
-            delete=False, suffix=".jpg" if image_type == "image/jpeg" else ".png"
-        ) as temp_file:
-            shutil.copyfileobj(file.file, temp_file)
-            return temp_file.name
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error saving the image: {str(e)}")
-
-
-def cleanup_temp_file(temp_file_path: str):
-    """Removes the temporary file."""
-    if os.path.exists(temp_file_path):
-        os.remove(temp_file_path)
-
-def reduce_image_size(image_path: str, max_size: tuple[int, int] = (256, 256)):
-    """Reduces the image size to the specified dimensions."""
-    try:
-        with Image.open(image_path) as img:
-            img.thumbnail(max_size)
-            img.save(image_path)
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error reducing image size: {str(e)}")
+
+def perceptual_hash(image: Image.Image, hash_size: int = 8) -> int:
+    """
+    Returns a 64-bit difference hash (dHash) of the image. Near-duplicate
+    photos differ in only a few bits, so they can be matched by Hamming distance.
+    """
+    pixels = list(
+        image.convert("L")
+        .resize((hash_size + 1, hash_size), Image.Resampling.LANCZOS)
+        .getdata()
+    )
+
+    value = 0
+    for row in range(hash_size):
+        offset = row * (hash_size + 1)
+        for col in range(hash_size):
+            value = (value << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+    return value
+
+
+def _scaled_size(width: int, height: int, max_edge: int) -> tuple[int, int]:
+    """Returns the size that fits max_edge on the long side, keeping the aspect ratio."""
+    scale = min(1.0, max_edge / max(width, height))
+    return max(1, round(width * scale)), max(1, round(height * scale))
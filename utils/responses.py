@@ -0,0 +1,16 @@
+from pydantic import BaseModel
+from starlette.responses import Response
+
+
+class ModelJSONResponse(Response):
+    """
+    JSON response rendered straight to bytes by pydantic-core, like an orjson
+    response but without building an intermediate dict first. Returning it
+    from a route also skips FastAPI's validation against response_model, so
+    the model must already be validated.
+    """
+
+    media_type = "application/json"
+
+    def render(self, content: BaseModel) -> bytes:
+        return content.__pydantic_serializer__.to_json(content)
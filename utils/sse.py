@@ -0,0 +1,12 @@
+import json
+
+from pydantic import BaseModel
+
+
+def format_sse(event: str, data: BaseModel | dict) -> str:
+    """Formats one Server-Sent Event with a JSON payload."""
+    if isinstance(data, BaseModel):
+        payload = data.model_dump_json()
+    else:
+        payload = json.dumps(data, ensure_ascii=False)
+    return f"event: {event}\ndata: {payload}\n\n"